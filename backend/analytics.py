@@ -0,0 +1,220 @@
+# backend/analytics.py
+"""Materialized aggregates behind /analytics_data.
+
+Subscribed to the AttendanceLog, so counters are updated once per appended
+record instead of re-scanning the whole history on every dashboard poll:
+  - totals, per-date and per-student counts
+  - an exact top-k of students (counts only grow between resets, so a
+    student can only enter the top-k by overtaking its current minimum)
+  - a bounded ring buffer of the most recent records
+Per-department counts depend on students.json, so they are rebuilt from the
+per-student counts whenever the StudentDirectory reloads and updated
+incrementally otherwise. Archived days are loaded in one go by seed().
+
+range_analytics() answers date-range questions (/analytics_range) from the
+columnar AttendanceColumns with numpy bincounts instead of per-record loops.
+"""
+import json
+import heapq
+import hashlib
+import threading
+from collections import deque
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+PRESENCE_GRID_CELLS = 1 << 26   # students x days above which range_analytics dedupes with np.unique
+
+
+class AttendanceAggregates:
+    def __init__(self, directory, top_k: int = 10, recent_size: int = 50):
+        self.directory = directory            # StudentDirectory (reg_no -> dept)
+        self.top_k = top_k
+        self._lock = threading.RLock()
+        self.recent = deque(maxlen=recent_size)
+        self.reset()
+
+    # -------------------------
+    # Log listener
+    # -------------------------
+    def reset(self):
+        with self._lock:
+            self.total = 0
+            self.by_date: Dict[str, int] = {}
+            self.by_student: Dict[str, int] = {}
+            self.recent.clear()
+            self._top: List[Tuple[str, int]] = []
+            self._by_dept: Dict[str, int] = {}
+            self._dept_version = None
+
+    def seed(self, archive):
+        """Load the archived history's counters in one step (columnar bincounts)."""
+        total, by_date, by_student = archive.counts()
+        recent = archive.tail(self.recent.maxlen)
+        with self._lock:
+            self.total = total
+            self.by_date = by_date
+            self.by_student = {r: c for r, c in by_student.items() if r}
+            self.recent.extend(recent)
+            self._top = heapq.nlargest(self.top_k, self.by_student.items(), key=lambda x: x[1])
+            self._dept_version = None
+
+    def apply(self, records: List[dict]):
+        with self._lock:
+            reg_to_dept = self.directory.reg_to_dept()
+            dept_valid = self._dept_version == self.directory.version
+            for a in records:
+                self.total += 1
+                self.recent.append(a)
+                date = a.get("date")
+                reg = a.get("reg_no")
+                if date:
+                    self.by_date[date] = self.by_date.get(date, 0) + 1
+                if reg:
+                    count = self.by_student.get(reg, 0) + 1
+                    self.by_student[reg] = count
+                    self._bump_top(reg, count)
+                    if dept_valid:
+                        dept = reg_to_dept.get(reg, "Unknown")
+                        self._by_dept[dept] = self._by_dept.get(dept, 0) + 1
+
+    def _bump_top(self, reg: str, count: int):
+        top = self._top
+        for i, (r, _) in enumerate(top):
+            if r == reg:
+                top[i] = (reg, count)
+                break
+        else:
+            if len(top) < self.top_k:
+                top.append((reg, count))
+            elif count > top[-1][1]:
+                top[-1] = (reg, count)
+            else:
+                return
+        top.sort(key=lambda x: x[1], reverse=True)
+
+    # -------------------------
+    # Read
+    # -------------------------
+    def by_dept(self) -> Dict[str, int]:
+        with self._lock:
+            reg_to_dept = self.directory.reg_to_dept()
+            if self._dept_version != self.directory.version:
+                by_dept: Dict[str, int] = {}
+                for reg, count in self.by_student.items():
+                    dept = reg_to_dept.get(reg, "Unknown")
+                    by_dept[dept] = by_dept.get(dept, 0) + count
+                self._by_dept = by_dept
+                self._dept_version = self.directory.version
+            return dict(self._by_dept)
+
+    def etag(self, log_offset: int) -> str:
+        """Content tag that is identical across workers for the same log + students.json."""
+        with self._lock:
+            last = json.dumps(self.recent[-1], sort_keys=True) if self.recent else ""
+            key = f"{log_offset}:{self.total}:{last}:{self.directory.stamp}"
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+    def delta(self, records: List[dict]) -> dict:
+        """Current (absolute) counters for the keys touched by `records`, for live-feed clients."""
+        reg_to_dept = self.directory.reg_to_dept()
+        by_dept = self.by_dept()
+        with self._lock:
+            dates = {a.get("date") for a in records if a.get("date")}
+            regs = {a.get("reg_no") for a in records if a.get("reg_no")}
+            depts = {reg_to_dept.get(r, "Unknown") for r in regs}
+            return {
+                "total_students": len(self.directory.all()),
+                "total_attendance": self.total,
+                "attendance_by_date": {d: self.by_date.get(d, 0) for d in dates},
+                "attendance_by_dept": {d: by_dept.get(d, 0) for d in depts},
+                "top_students": [[r, c] for r, c in self._top],
+            }
+
+    def snapshot(self) -> dict:
+        """Payload for /analytics_data (format 'A')."""
+        students = self.directory.all()
+        by_dept = self.by_dept()
+        with self._lock:
+            return {
+                "total_students": len(students),
+                "total_attendance": self.total,
+                "attendance_by_date": sorted([[d, c] for d, c in self.by_date.items()]),
+                "top_students": [[r, c] for r, c in self._top],
+                "attendance_by_dept": sorted([[d, c] for d, c in by_dept.items()]),
+                "recent": list(reversed(self.recent)),
+            }
+
+
+def range_analytics(columns, directory, date_from: Optional[str] = None, date_to: Optional[str] = None,
+                    dept: Optional[str] = None, top_k: int = 10) -> dict:
+    """Payload for /analytics_range: counts and attendance rates over [date_from, date_to].
+
+    `columns` is an AttendanceColumns (archive + log tail). A class day is a date with at
+    least one mark in the range; a student's rate is days present / class days. With `dept`,
+    only that department's students and marks count. Raises ValueError for bad dates.
+    """
+    first = date.fromisoformat(date_from).toordinal() if date_from else None
+    last = date.fromisoformat(date_to).toordinal() if date_to else None
+    (day, secs, reg), regs = columns.select(first, last)
+
+    reg_to_dept = directory.reg_to_dept()
+    students = [s.get("reg_no") for s in directory.all() if s.get("reg_no")]
+    depts = sorted(set(reg_to_dept.values()) | {"Unknown"})
+    dept_ids = {d: i for i, d in enumerate(depts)}
+    reg_dept = np.array([dept_ids[reg_to_dept.get(r, "Unknown")] for r in regs], np.int64)
+
+    if dept:
+        if len(reg):
+            keep = reg_dept[reg] == dept_ids.get(dept, -1)
+            day, secs, reg = day[keep], secs[keep], reg[keep]
+        students = [r for r in students if reg_to_dept.get(r, "Unknown") == dept]
+
+    payload = {"from": date_from, "to": date_to, "dept": dept, "total_attendance": int(len(day)),
+               "class_days": 0, "attendance_by_date": [], "attendance_by_dept": [], "attendance_by_hour": [],
+               "top_students": [], "attendance_rate": 0.0, "rate_by_dept": [], "students": []}
+    if not len(day):
+        return payload
+
+    day0 = int(day.min())
+    day_idx = (day - day0).astype(np.int64)
+    reg = reg.astype(np.int64)
+    per_date = np.bincount(day_idx)
+    dates = np.flatnonzero(per_date)
+    class_days = len(dates)
+    per_reg = np.bincount(reg, minlength=len(regs))
+    per_dept = np.bincount(reg_dept[reg], minlength=len(depts))
+    timed = secs >= 0
+    per_hour = np.bincount(secs[timed] // 3600, minlength=24)
+
+    # days present: distinct (student, day) pairs, via a presence grid unless it would be huge
+    span = len(per_date)
+    keys = reg * span + day_idx
+    if len(regs) * span <= PRESENCE_GRID_CELLS:
+        grid = np.zeros(len(regs) * span, bool)
+        grid[keys] = True
+        days_present = grid.reshape(len(regs), span).sum(axis=1)
+    else:
+        days_present = np.bincount(np.unique(keys) // span, minlength=len(regs))
+    reg_ids = {r: i for i, r in enumerate(regs)}
+
+    present = [(r, int(days_present[reg_ids[r]]) if r in reg_ids else 0) for r in students]
+    dept_days: Dict[str, List[int]] = {}   # dept -> [students, days present]
+    for r, p in present:
+        acc = dept_days.setdefault(reg_to_dept.get(r, "Unknown"), [0, 0])
+        acc[0] += 1
+        acc[1] += p
+
+    top = np.argsort(-per_reg, kind="stable")[:top_k]
+    payload.update({
+        "class_days": class_days,
+        "attendance_by_date": [[date.fromordinal(day0 + int(i)).isoformat(), int(per_date[i])] for i in dates],
+        "attendance_by_dept": [[depts[i], int(per_dept[i])] for i in np.flatnonzero(per_dept)],
+        "attendance_by_hour": [[int(h), int(per_hour[h])] for h in np.flatnonzero(per_hour)],
+        "top_students": [[regs[i], int(per_reg[i])] for i in top if per_reg[i]],
+        "attendance_rate": round(sum(p for _, p in present) / (len(students) * class_days), 4) if students else 0.0,
+        "rate_by_dept": [[d, round(p / (n * class_days), 4)] for d, (n, p) in sorted(dept_days.items())],
+        "students": [[r, p, round(p / class_days, 4)] for r, p in present],
+    })
+    return payload
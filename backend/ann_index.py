@@ -0,0 +1,129 @@
+# backend/ann_index.py
+"""Inverted-file (IVF) approximate nearest-neighbour index, pure NumPy.
+
+Gallery rows are bucketed under their nearest k-means centroid. A query only
+scans the rows of its `nprobe` nearest buckets; the caller re-ranks those
+candidates with exact distances, so a match is still confirmed against the
+real tolerance. Rows are added/removed/moved incrementally as FaceGallery
+changes, and the centroids are retrained once the gallery has doubled since
+the last training.
+"""
+import math
+from typing import Dict, List, Optional, Set
+
+import numpy as np
+
+
+def _sq_dists(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Squared euclidean distances between rows of a (m x d) and b (n x d)."""
+    return (np.einsum("ij,ij->i", a, a)[:, None]
+            + np.einsum("ij,ij->i", b, b)[None, :]
+            - 2.0 * (a @ b.T))
+
+
+def kmeans(data: np.ndarray, k: int, iters: int = 10, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centroids = data[rng.choice(data.shape[0], size=k, replace=False)].copy()
+    for _ in range(iters):
+        labels = np.argmin(_sq_dists(data, centroids), axis=1)
+        counts = np.bincount(labels, minlength=k)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, data)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+        # re-seed empty clusters from random points
+        empty = np.flatnonzero(~filled)
+        if len(empty):
+            centroids[empty] = data[rng.choice(data.shape[0], size=len(empty))]
+    return centroids
+
+
+class IVFIndex:
+    def __init__(self, dim: int = 128, nlist: Optional[int] = None, nprobe: int = 8,
+                 min_size: int = 2048, iters: int = 10, train_sample: int = 64, seed: int = 0):
+        self.dim = dim
+        self.nlist = nlist            # None -> ~4*sqrt(N) at training time
+        self.nprobe = nprobe
+        self.min_size = min_size      # below this an exact scan is cheaper
+        self.iters = iters
+        self.train_sample = train_sample   # training points per centroid
+        self.seed = seed
+        self.centroids: Optional[np.ndarray] = None
+        self.trained_size = 0
+        self._lists: List[Set[int]] = []
+        self._arrays: Dict[int, np.ndarray] = {}   # cached np views of _lists
+        self._assign: Dict[int, int] = {}          # row -> list id
+
+    @property
+    def ready(self) -> bool:
+        return self.centroids is not None
+
+    def needs_rebuild(self, size: int) -> bool:
+        if size < self.min_size:
+            return False
+        return not self.ready or size >= 2 * self.trained_size
+
+    # -------------------------
+    # Build / incremental maintenance
+    # -------------------------
+    def build(self, matrix: np.ndarray):
+        n = matrix.shape[0]
+        self._lists, self._arrays, self._assign = [], {}, {}
+        self.centroids = None
+        self.trained_size = n
+        if n < self.min_size:
+            return
+        k = min(n, self.nlist or max(1, int(4 * math.sqrt(n))))
+        rng = np.random.default_rng(self.seed)
+        sample = matrix
+        if n > k * self.train_sample:
+            sample = matrix[rng.choice(n, size=k * self.train_sample, replace=False)]
+        self.centroids = kmeans(np.asarray(sample, dtype=np.float32), k, self.iters, self.seed)
+        self._lists = [set() for _ in range(k)]
+        for start in range(0, n, 4096):
+            chunk = np.asarray(matrix[start:start + 4096], dtype=np.float32)
+            labels = np.argmin(_sq_dists(chunk, self.centroids), axis=1)
+            for offset, label in enumerate(labels.tolist()):
+                self._lists[label].add(start + offset)
+                self._assign[start + offset] = label
+
+    def add(self, row: int, vec: np.ndarray):
+        if not self.ready:
+            return
+        label = int(np.argmin(_sq_dists(vec.reshape(1, -1), self.centroids)[0]))
+        self._lists[label].add(row)
+        self._assign[row] = label
+        self._arrays.pop(label, None)
+
+    def remove(self, row: int):
+        label = self._assign.pop(row, None)
+        if label is not None:
+            self._lists[label].discard(row)
+            self._arrays.pop(label, None)
+
+    def move(self, src: int, dst: int):
+        """Row `src` now lives at `dst` (gallery swap-delete)."""
+        label = self._assign.pop(src, None)
+        if label is None:
+            return
+        self._lists[label].discard(src)
+        self._lists[label].add(dst)
+        self._assign[dst] = label
+        self._arrays.pop(label, None)
+
+    # -------------------------
+    # Search
+    # -------------------------
+    def _list_array(self, label: int) -> np.ndarray:
+        arr = self._arrays.get(label)
+        if arr is None:
+            arr = np.fromiter(self._lists[label], dtype=np.int64, count=len(self._lists[label]))
+            self._arrays[label] = arr
+        return arr
+
+    def candidates(self, queries: np.ndarray) -> List[np.ndarray]:
+        """Candidate gallery rows for each query (union of its nprobe nearest lists)."""
+        nprobe = min(self.nprobe, self.centroids.shape[0])
+        d2 = _sq_dists(queries, self.centroids)
+        probes = np.argpartition(d2, nprobe - 1, axis=1)[:, :nprobe]
+        return [np.concatenate([self._list_array(int(l)) for l in row]) for row in probes]
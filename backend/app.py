@@ -1,23 +1,50 @@
 # backend/app.py  — full corrected version (matches analytics frontend format)
+import time
+IMPORT_STARTED = time.perf_counter()   # import time and time-to-ready are measured from here
+
 import os
 import json
 import io
 import csv
 import base64
+import zipfile
+import queue
 import threading
+import multiprocessing
 from datetime import datetime
-from typing import Tuple, List, Dict
+from functools import wraps
+from typing import Tuple, List
 
 from flask import (
-    Flask, request, jsonify, send_from_directory, session, send_file, redirect
+    Flask, request, jsonify, send_from_directory, session, redirect,
+    Response, stream_with_context, make_response, send_file, abort
 )
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 
-import face_recognition
 import cv2
 import numpy as np
 
+from face_store import backend_store
+from gallery import FaceGallery
+from ann_index import IVFIndex
+from attendance_store import AttendanceLog, AttendanceIndex
+from attendance_archive import AttendanceArchive, AttendanceColumns
+from student_directory import StudentDirectory
+from analytics import AttendanceAggregates, range_analytics
+from live_feed import LiveFeed
+from recognition import (
+    RecognitionBatcher, ProcessRecognitionEngine, configure_backend, detect_and_encode, detect_and_encode_group
+)
+from embeddings import backend_class, get_backend, spec_from_env
+from frame_gate import FrameGate, FrameProbe
+from recognition_cache import RecognitionCache, frame_hash
+from enrollment import (
+    encode_image_bytes, encode_entries, read_roster_zip, read_roster_csv, commit_enrollment
+)
+from metrics import Metrics, TimedLock, stage, add_stages
+from thumbnails import ThumbnailCache
+
 # -------------------------
 # Paths & config
 # -------------------------
@@ -25,15 +52,65 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 FRONTEND_DIR = os.path.abspath(os.path.join(BASE_DIR, "../frontend"))
 
 KNOWN_FACES_DIR = os.path.join(BASE_DIR, "known_faces")
-ATTENDANCE_FILE = os.path.join(BASE_DIR, "attendance.json")
+ATTENDANCE_FILE = os.path.join(BASE_DIR, "attendance.json")   # legacy, migrated once into ATTENDANCE_LOG
+ATTENDANCE_LOG = os.path.join(BASE_DIR, "attendance.jsonl")
+ATTENDANCE_ARCHIVE_DIR = os.path.join(BASE_DIR, "archive")   # closed days, see archive_attendance.py
 STUDENTS_FILE = os.path.join(BASE_DIR, "students.json")
 ADMIN_FILE = os.path.join(BASE_DIR, "admin.json")
+ENCODINGS_DIR = os.path.join(BASE_DIR, "encodings")
+THUMB_CACHE_DIR = os.path.join(BASE_DIR, "thumb_cache")
+
+# Embedding backend ("dlib" or "insightface") and its detector settings, see embeddings.spec_from_env;
+# only the class is looked up here, its models load during warm-up
+EMBEDDING = spec_from_env(BASE_DIR)
+EMBEDDING_BACKEND = backend_class(EMBEDDING["name"])
+MATCH_TOLERANCE = float(os.environ.get("MATCH_TOLERANCE", EMBEDDING_BACKEND.default_tolerance))
+# Approximate nearest-neighbour index for large galleries: "" (exact scan) or "ivf"
+ANN_INDEX = os.environ.get("ANN_INDEX", "").lower()
+ANN_NPROBE = int(os.environ.get("ANN_NPROBE", "8"))
+ANN_MIN_SIZE = int(os.environ.get("ANN_MIN_SIZE", "2048"))
+ANN_EXACT_ON_MISS = os.environ.get("ANN_EXACT_ON_MISS", "0") == "1"
+
+# Cross-request micro-batching of detection/encoding/matching
+RECOGNITION_MAX_BATCH = int(os.environ.get("RECOGNITION_MAX_BATCH", "8"))
+RECOGNITION_MAX_WAIT_MS = float(os.environ.get("RECOGNITION_MAX_WAIT_MS", "20"))
+RECOGNITION_QUEUE_SIZE = int(os.environ.get("RECOGNITION_QUEUE_SIZE", "64"))
+RECOGNITION_THREADS = int(os.environ.get("RECOGNITION_THREADS", "0"))   # 0 = 1, or 2 with a process pool
+RECOGNITION_TIMEOUT = float(os.environ.get("RECOGNITION_TIMEOUT", "15"))
+# Recognition process pool: "0" = run in this process, "auto" = one process per core, or a count
+_processes = os.environ.get("RECOGNITION_PROCESSES", "0").lower()
+RECOGNITION_PROCESSES = (os.cpu_count() or 1) if _processes == "auto" else int(_processes)
+# Enrollment: photos are shrunk to ENROLL_MAX_SIDE px before encoding (0 = as uploaded);
+# bulk imports encode across BULK_IMPORT_PROCESSES processes ("auto" = one per core)
+ENROLL_MAX_SIDE = int(os.environ.get("ENROLL_MAX_SIDE", "1024"))
+_bulk_processes = os.environ.get("BULK_IMPORT_PROCESSES", "auto").lower()
+BULK_IMPORT_PROCESSES = (os.cpu_count() or 1) if _bulk_processes == "auto" else int(_bulk_processes)
+# Per-kiosk gating ahead of detection: replay the last answer for unchanged frames and
+# answer recently identified faces from a short-lived track cache ("0" disables)
+FRAME_GATE = os.environ.get("FRAME_GATE", "1") == "1"
+FRAME_GATE_MOTION = float(os.environ.get("FRAME_GATE_MOTION", "6.0"))      # largest per-block grey-level diff
+FRAME_GATE_REPLAY_TTL = float(os.environ.get("FRAME_GATE_REPLAY_TTL", "10"))
+FRAME_GATE_TRACK_DIFF = float(os.environ.get("FRAME_GATE_TRACK_DIFF", "10.0"))
+FRAME_GATE_TRACK_TTL = float(os.environ.get("FRAME_GATE_TRACK_TTL", "30"))
+# Recognition result cache keyed by (kiosk, perceptual frame hash); "0" disables
+RECOGNITION_CACHE = os.environ.get("RECOGNITION_CACHE", "1") == "1"
+RECOGNITION_CACHE_SIZE = int(os.environ.get("RECOGNITION_CACHE_SIZE", "1024"))
+RECOGNITION_CACHE_TTL = float(os.environ.get("RECOGNITION_CACHE_TTL", "30"))
+RECOGNITION_CACHE_MAX_DISTANCE = int(os.environ.get("RECOGNITION_CACHE_MAX_DISTANCE", "0"))   # bits of 64
+RECOGNITION_CACHE_FACE_DISTANCE = int(os.environ.get("RECOGNITION_CACHE_FACE_DISTANCE", "4"))  # per face crop
+# Log instrumented requests slower than this with their per-stage breakdown (0 = off)
+SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_MS", "0"))
+# /student_photo?size=N thumbnails: size buckets (px), JPEG quality and browser cache lifetime (s)
+THUMB_SIZES = [int(v) for v in os.environ.get("THUMB_SIZES", "64,128,256").split(",") if v.strip()]
+THUMB_QUALITY = int(os.environ.get("THUMB_QUALITY", "80"))
+THUMB_MAX_AGE = int(os.environ.get("THUMB_MAX_AGE", "86400"))
+# Models + gallery load: "background" (serve immediately, /readyz flips when done) or "sync" (block the import)
+STARTUP_WARMUP = os.environ.get("STARTUP_WARMUP", "background").lower()
 
 os.makedirs(KNOWN_FACES_DIR, exist_ok=True)
 
 # Ensure JSON files exist
 for path, default in [
-    (ATTENDANCE_FILE, []),
     (STUDENTS_FILE, []),
     (ADMIN_FILE, [{"username": "admin", "password": "admin"}])
 ]:
@@ -45,14 +122,61 @@ app = Flask(__name__, static_folder=FRONTEND_DIR, static_url_path="")
 CORS(app)
 app.secret_key = "replace_this_with_a_random_secret_key"
 
-# Thread-safety
-attendance_lock = threading.Lock()
-students_lock = threading.Lock()
-known_lock = threading.Lock()
+# Per-stage request timings and lock wait/hold times, served at /metrics
+request_metrics = Metrics(slow_threshold=SLOW_REQUEST_MS / 1000.0, slow_log=app.logger.warning)
+
+def instrumented(endpoint: str):
+    """Run a view inside request_metrics.request(endpoint), recording its status code."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            with request_metrics.request(endpoint) as trace:
+                resp = make_response(view(*args, **kwargs))
+                trace.status = resp.status_code
+                return resp
+        return wrapper
+    return decorator
+
+# Thread-safety (attendance writes are serialized inside AttendanceLog)
+students_lock = TimedLock("students", request_metrics.observe_lock)
+known_lock = TimedLock("gallery", request_metrics.observe_lock)
+
+# In-memory face database: names are reg_no (preferred) or filename key fallback
+gallery = FaceGallery(
+    dim=EMBEDDING_BACKEND.dim,
+    index=IVFIndex(dim=EMBEDDING_BACKEND.dim, nprobe=ANN_NPROBE, min_size=ANN_MIN_SIZE) if ANN_INDEX == "ivf" else None,
+    exact_on_miss=ANN_EXACT_ON_MISS,
+)
 
-# In-memory face database
-known_encodings: List[np.ndarray] = []
-known_names: List[str] = []   # stores reg_no (preferred) or filename key fallback
+# Append-only attendance store (replaces read/write of ATTENDANCE_FILE)
+attendance_log = AttendanceLog(
+    ATTENDANCE_LOG, legacy_path=ATTENDANCE_FILE,
+    fsync_every=int(os.environ.get("ATTENDANCE_FSYNC_EVERY", "32")),
+    fsync_interval=float(os.environ.get("ATTENDANCE_FSYNC_INTERVAL", "1.0")),
+    lock_observer=lambda wait, hold: request_metrics.observe_lock("attendance", wait, hold),
+    archive=AttendanceArchive(ATTENDANCE_ARCHIVE_DIR),
+)
+# (date -> reg_nos) index for the duplicate-mark check, kept current from the log
+attendance_index = AttendanceIndex()
+attendance_log.subscribe(attendance_index)
+attendance_log.refresh()
+
+# Persistent encoding cache per backend (only new/changed photos are re-encoded at startup;
+# encode_faces.py can fill it offline)
+encoding_store = backend_store(ENCODINGS_DIR, EMBEDDING_BACKEND.name, EMBEDDING_BACKEND.dim)
+
+# Optional recognition process pool; it matches against memory-mapped gallery snapshots.
+# (Pool children are spawned; when run as `python app.py` they re-import this module as
+# __mp_main__, so only the parent process creates a pool.)
+recognition_engine = None
+if RECOGNITION_PROCESSES > 0 and multiprocessing.parent_process() is None:
+    recognition_engine = ProcessRecognitionEngine(
+        os.path.join(ENCODINGS_DIR, "snapshots"), RECOGNITION_PROCESSES, MATCH_TOLERANCE, EMBEDDING)
+
+def publish_gallery():
+    """Push the current gallery to the recognition processes (call with known_lock held)."""
+    if recognition_engine is not None:
+        recognition_engine.publish(gallery.names, gallery.matrix)
 
 # -------------------------
 # JSON helpers
@@ -86,39 +210,78 @@ def clean_name_from_filename(filename: str) -> str:
         break
     return name
 
+# Cached students.json lookups (recognition never re-parses the file)
+student_directory = StudentDirectory(STUDENTS_FILE, clean_name_from_filename)
+
+# Incrementally maintained /analytics_data counters, fed by the attendance log
+analytics_aggregates = AttendanceAggregates(student_directory)
+attendance_log.subscribe(analytics_aggregates)
+# Archive + recent records as columns, for /analytics_range
+attendance_columns = AttendanceColumns()
+attendance_log.subscribe(attendance_columns)
+
+# Wakes /attendance_stream (SSE) clients on every append
+live_feed = LiveFeed()
+
+# Resized enrollment photos for the admin tables (invalidated on register/delete)
+thumbnails = ThumbnailCache(KNOWN_FACES_DIR, THUMB_CACHE_DIR, THUMB_SIZES, THUMB_QUALITY)
+attendance_log.subscribe(live_feed)
+
+def encode_photo(img_path: str):
+    """Return the encoding of the largest face in an image file, or None."""
+    try:
+        with open(img_path, "rb") as f:
+            enc, error = encode_image_bytes(f.read(), get_backend(EMBEDDING), ENROLL_MAX_SIDE)
+    except OSError as e:
+        enc, error = None, str(e)
+    if enc is None:
+        app.logger.warning(f"[encode_photo] skipping {os.path.basename(img_path)}: {error}")
+    return enc
+
 def load_known_faces():
-    """Load face encodings from KNOWN_FACES_DIR into memory and map to reg_no if possible."""
-    global known_encodings, known_names
+    """Load face encodings from the encoding store (re-encoding only new/changed photos) and map to reg_no if possible."""
     with known_lock:
-        known_encodings = []
-        known_names = []
+        photo_to_reg = student_directory.photo_to_reg()
 
-        students = read_json(STUDENTS_FILE)
-        photo_to_reg = {}
-        for s in students:
-            photo = s.get("photo")
-            reg = s.get("reg_no")
-            if photo and reg:
-                photo_to_reg[clean_name_from_filename(photo)] = reg
-
-        for file in sorted(os.listdir(KNOWN_FACES_DIR)):
-            if not file.lower().endswith((".jpg", ".jpeg", ".png")):
-                continue
-            key = clean_name_from_filename(file)
-            img_path = os.path.join(KNOWN_FACES_DIR, file)
-            try:
-                image = face_recognition.load_image_file(img_path)
-                encs = face_recognition.face_encodings(image)
-                if not encs:
-                    app.logger.warning(f"[load_known_faces] skipping {file}: no encodings")
-                    continue
-                known_encodings.append(encs[0])
-                known_names.append(photo_to_reg.get(key, key))
-            except Exception as e:
-                app.logger.warning(f"[load_known_faces] failed {file}: {e}")
+        encoded = encoding_store.sync(KNOWN_FACES_DIR, encode_photo)
+        if encoded:
+            app.logger.info(f"[load_known_faces] encoded {encoded} new/changed photo(s)")
 
-# initial load
-load_known_faces()
+        items = encoding_store.items()
+        names = [photo_to_reg.get(clean_name_from_filename(f), clean_name_from_filename(f)) for f, _ in items]
+        encodings = np.array([enc for _, enc in items], dtype=np.float32).reshape(-1, gallery.dim)
+        gallery.load(names, encodings)
+        publish_gallery()
+
+# -------------------------
+# Warm-up (models + gallery load off the import path) & health probes
+# -------------------------
+gallery_ready = threading.Event()
+startup = {"import_seconds": None, "ready_seconds": None, "error": None}
+
+def warm_up():
+    """Load the embedding models and the gallery and start the recognition processes, then flag readiness."""
+    try:
+        configure_backend(EMBEDDING).warm_up()
+        load_known_faces()
+        if recognition_engine is not None:
+            recognition_engine.warm_up()
+    except Exception as e:
+        startup["error"] = str(e)
+        app.logger.exception("warm-up failed")
+        return
+    startup["ready_seconds"] = round(time.perf_counter() - IMPORT_STARTED, 3)
+    gallery_ready.set()
+    app.logger.info(f"[warm_up] ready {startup['ready_seconds']}s after start ({len(gallery)} faces)")
+
+@app.route("/healthz", methods=["GET"])
+def healthz():
+    return jsonify({"status": "ok"})
+
+@app.route("/readyz", methods=["GET"])
+def readyz():
+    ready = gallery_ready.is_set()
+    return jsonify({"ready": ready, "gallery_size": len(gallery), **startup}), 200 if ready else 503
 
 # -------------------------
 # Admin protection & pages
@@ -161,8 +324,22 @@ def is_logged_in():
     return jsonify({"logged_in": bool(session.get("admin_logged_in", False))})
 
 # -------------------------
-# Image decode helper
+# Image decode helpers
 # -------------------------
+RAW_IMAGE_MIMETYPES = ("image/jpeg", "image/png", "application/octet-stream")
+
+def decode_image_bytes(img_bytes) -> Tuple[bool, np.ndarray or str]:
+    """Decode encoded image bytes without copying them first. Return (ok, frame or error_message)"""
+    if not img_bytes:
+        return False, "No image"
+    try:
+        frame = cv2.imdecode(np.frombuffer(img_bytes, np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            return False, "Failed to decode image"
+        return True, frame
+    except Exception as e:
+        return False, f"Decode error: {e}"
+
 def decode_base64_image(data_url: str) -> Tuple[bool, np.ndarray or str]:
     """Return (ok, frame or error_message)"""
     if not data_url or "," not in data_url:
@@ -170,106 +347,318 @@ def decode_base64_image(data_url: str) -> Tuple[bool, np.ndarray or str]:
     try:
         header, b64 = data_url.split(",", 1)
         img_bytes = base64.b64decode(b64)
-        np_arr = np.frombuffer(img_bytes, np.uint8)
-        frame = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
-        if frame is None:
-            return False, "Failed to decode image"
-        return True, frame
     except Exception as e:
         return False, f"Decode error: {e}"
+    return decode_image_bytes(img_bytes)
+
+def read_request_frame() -> Tuple[bool, np.ndarray or str]:
+    """Frame from the request body: raw image/jpeg (preferred), multipart field "image", or legacy JSON data URL."""
+    if request.mimetype in RAW_IMAGE_MIMETYPES:
+        return decode_image_bytes(request.get_data(cache=False))
+    upload = request.files.get("image")
+    if upload is not None:
+        return decode_image_bytes(upload.stream.read())
+    payload = request.get_json(silent=True) or {}
+    image_data = payload.get("image")
+    if not image_data:
+        return False, "No image"
+    return decode_base64_image(image_data)
+
+# -------------------------
+# Recognition stage (micro-batched across requests)
+# -------------------------
+def recognize_frames(frames: List[np.ndarray]) -> List[dict]:
+    """Detect + encode each frame, then match every face of the batch in one gallery pass."""
+    if recognition_engine is not None:
+        # detection, encoding and matching run in the process pool
+        return recognition_engine.recognize(frames)
+    results = [detect_and_encode(frame) for frame in frames]
+    encodings = [enc for r in results if r["status"] == "ok" for enc in r["encodings"]]
+    if encodings:
+        started = time.perf_counter()
+        with known_lock:
+            matches = gallery.match_names(encodings, tolerance=MATCH_TOLERANCE)
+        elapsed = time.perf_counter() - started   # one gallery pass serves the whole batch
+        pos = 0
+        for r in results:
+            if r["status"] == "ok":
+                n = len(r["encodings"])
+                r["matches"] = matches[pos:pos + n]
+                r.setdefault("timings", {})["match"] = elapsed
+                pos += n
+    return results
+
+recognizer = RecognitionBatcher(
+    recognize_frames,
+    max_batch=RECOGNITION_MAX_BATCH,
+    max_wait_ms=RECOGNITION_MAX_WAIT_MS,
+    queue_size=RECOGNITION_QUEUE_SIZE,
+    workers=RECOGNITION_THREADS or (2 if recognition_engine is not None else 1),
+)
+
+@app.route("/recognition_stats", methods=["GET"])
+def recognition_stats():
+    stats = recognizer.stats()
+    if frame_gate is not None:
+        stats["gate"] = frame_gate.stats()
+    if recognition_cache is not None:
+        stats["cache"] = recognition_cache.stats()
+    return jsonify(stats)
+
+# -------------------------
+# Frame gating (per kiosk, before the recognition queue)
+# -------------------------
+frame_gate = FrameGate(
+    motion_threshold=FRAME_GATE_MOTION, replay_ttl=FRAME_GATE_REPLAY_TTL,
+    track_threshold=FRAME_GATE_TRACK_DIFF, track_ttl=FRAME_GATE_TRACK_TTL,
+) if FRAME_GATE else None
+
+def kiosk_key(kiosk_header, kiosk_arg, remote_addr) -> str:
+    """Kiosk identity for gating: X-Kiosk-Id header, ?kiosk= or the client address."""
+    return (kiosk_header or kiosk_arg or remote_addr or "default")[:128]
+
+def is_marked_today(reg_no: str) -> bool:
+    attendance_log.refresh()
+    return attendance_index.has(reg_no, datetime.now().strftime("%Y-%m-%d"))
+
+def gate_frame(kiosk: str, frame: np.ndarray):
+    """(probe, payload): payload is the answer when detection can be skipped, else None."""
+    if frame_gate is None:
+        return None, None
+    with stage("gate"):
+        probe = FrameProbe(frame)
+        return probe, frame_gate.lookup(kiosk, probe, is_marked_today)
+
+# -------------------------
+# Recognition result cache (near-duplicate frames reuse the previous match)
+# -------------------------
+recognition_cache = RecognitionCache(
+    max_entries=RECOGNITION_CACHE_SIZE, ttl=RECOGNITION_CACHE_TTL,
+    max_distance=RECOGNITION_CACHE_MAX_DISTANCE, face_max_distance=RECOGNITION_CACHE_FACE_DISTANCE,
+) if RECOGNITION_CACHE else None
+
+def cached_recognition(kiosk: str, frame: np.ndarray):
+    """(cache key, cached recognition result or None); the key goes back to remember_recognition."""
+    if recognition_cache is None:
+        return None, None
+    with stage("cache_lookup"):
+        h = frame_hash(frame)
+        return (h, frame), recognition_cache.get(kiosk, h, frame)
+
+def remember_recognition(kiosk: str, key, result: dict):
+    """Add the recognizer's stage timings to the current request, then cache the result."""
+    add_stages(result.pop("timings", None))
+    if recognition_cache is not None and key is not None:
+        h, frame = key
+        recognition_cache.put(kiosk, h, frame, result)
+
+# -------------------------
+# Metrics (Prometheus text format)
+# -------------------------
+request_metrics.collect("gallery_size", "Faces in the in-memory gallery", lambda: len(gallery))
+request_metrics.collect("ready", "1 once the models and gallery are loaded", lambda: int(gallery_ready.is_set()))
+request_metrics.collect("import_seconds", "Time to import app.py", lambda: startup["import_seconds"])
+request_metrics.collect("time_to_ready_seconds", "Time from start of import to ready", lambda: startup["ready_seconds"])
+request_metrics.collect("log_bytes", "Attendance log bytes consumed by this worker", lambda: attendance_log.offset)
+request_metrics.collect("archived_rows", "Attendance records in the columnar archive", lambda: attendance_log.archive.rows)
+request_metrics.collect("recognition_queue_depth", "Frames waiting for recognition",
+                        lambda: recognizer.stats()["queue_depth"])
+request_metrics.collect("recognition_frames_total", "Frames recognized", lambda: recognizer.stats()["frames"], "counter")
+request_metrics.collect("recognition_batches_total", "Recognition batches run",
+                        lambda: recognizer.stats()["batches"], "counter")
+request_metrics.collect("recognition_rejected_total", "Frames rejected with a full queue",
+                        lambda: recognizer.stats()["rejected"], "counter")
+request_metrics.collect(
+    "frame_gate_total", "Kiosk frames by frame-gate outcome",
+    lambda: frame_gate and {k: v for k, v in frame_gate.stats().items() if k in ("unchanged_hits", "track_hits", "misses")},
+    "counter", "outcome")
+request_metrics.collect("thumbnails_total", "Thumbnail requests by outcome",
+                        lambda: {k: v for k, v in thumbnails.stats().items() if k != "sizes"}, "counter", "outcome")
+request_metrics.collect(
+    "recognition_cache_total", "Recognition cache lookups by outcome",
+    lambda: recognition_cache and {k: v for k, v in recognition_cache.stats().items()
+                                 if k in ("hits", "near_hits", "misses", "face_mismatches")},
+    "counter", "outcome")
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(request_metrics.render(), mimetype="text/plain; version=0.0.4")
 
 # -------------------------
 # Mark attendance
 # -------------------------
+BUSY_RESPONSE = ({"status": "busy", "message": "Recognition queue full, retry shortly"}, 503)
+WARMING_UP_RESPONSE = ({"status": "warming_up", "message": "Recognition is warming up, retry shortly"}, 503)
+
+def commit_recognition(result: dict, kiosk: str = None, probe: FrameProbe = None) -> Tuple[dict, int]:
+    """Turn a recognition result into the /mark_attendance (payload, status code), marking the first new match."""
+    with stage("commit"):
+        payload, code = _commit_recognition(result)
+    if probe is not None and frame_gate is not None:
+        faces = zip(result.get("locations", ()), (reg for reg, _ in result.get("matches", ())))
+        frame_gate.record(kiosk, probe, payload, list(faces))
+    return payload, code
+
+def _commit_recognition(result: dict) -> Tuple[dict, int]:
+    if result["status"] == "error":
+        if "detail" in result:
+            app.logger.warning(f"face_locations error: {result['detail']}")
+            return {"status": "error", "message": result["message"]}, 500
+        return {"status": "error", "message": result["message"]}, 200
+
+    if result["status"] == "no_face":
+        return {"status": "no_face", "message": "No face detected"}, 200
+
+    for reg_no, _distance in result["matches"]:
+        if reg_no is None:
+            continue
+
+        display_name = student_directory.display_name(reg_no)
+
+        now = datetime.now()
+        today = now.strftime("%Y-%m-%d")
+        with attendance_log.transaction():
+            # Prevent multiple marks same day (index is caught up with every worker's appends)
+            if attendance_index.has(reg_no, today):
+                return {"status": "exists", "message": "Attendance already marked today",
+                        "name": display_name, "reg_no": reg_no}, 200
+
+            # Add entry
+            entry = {
+                "name": display_name,
+                "reg_no": reg_no,
+                "date": today,
+                "time": now.strftime("%H:%M:%S")
+            }
+            attendance_log.append(entry)
+
+        return {"status": "success", "name": display_name, "reg_no": reg_no}, 200
+
+    return {"status": "unknown", "message": "Face not recognized"}, 200
+
 @app.route("/mark_attendance", methods=["POST"])
+@instrumented("mark_attendance")
 def mark_attendance():
+    if not gallery_ready.is_set():
+        payload, code = WARMING_UP_RESPONSE
+        return jsonify(payload), code, {"Retry-After": "2"}
     try:
-        payload = request.get_json(silent=True) or {}
-        image_data = payload.get("image")
-        if not image_data:
-            return jsonify({"status": "error", "message": "No image"}), 400
-
-        ok, frame_or_err = decode_base64_image(image_data)
+        with stage("decode"):
+            ok, frame_or_err = read_request_frame()
         if not ok:
             return jsonify({"status": "error", "message": frame_or_err}), 400
         frame = frame_or_err
 
-        # resize (keep faces large enough)
-        h, w = frame.shape[:2]
-        scale = 0.6 if max(h, w) < 800 else 0.5
-        small = cv2.resize(frame, (0, 0), fx=scale, fy=scale)
-        rgb_small = cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
-
-        # detect faces (HOG for compatibility)
-        try:
-            locations = face_recognition.face_locations(rgb_small, model="hog")
-        except Exception as e:
-            app.logger.warning(f"face_locations error: {e}")
-            return jsonify({"status": "error", "message": "Face detection error"}), 500
-
-        if not locations:
-            return jsonify({"status": "no_face", "message": "No face detected"})
-
-        encodings = face_recognition.face_encodings(rgb_small, locations)
-        if not encodings:
-            return jsonify({"status": "error", "message": "Encoding failed"})
-
-        with attendance_lock:
-            attendance = read_json(ATTENDANCE_FILE)
-
-        today = datetime.now().strftime("%Y-%m-%d")
-
-        # compare each found face
-        for enc in encodings:
-            with known_lock:
-                if not known_encodings:
-                    continue
-                matches = face_recognition.compare_faces(known_encodings, enc, tolerance=0.5)
-                distances = face_recognition.face_distance(known_encodings, enc)
-            best_idx = int(np.argmin(distances)) if len(distances) else None
-
-            if best_idx is not None and matches[best_idx]:
-                reg_no = known_names[best_idx]
-
-                students = read_json(STUDENTS_FILE)
-                display_name = next((s.get("name") for s in students if s.get("reg_no") == reg_no), None)
-                if not display_name:
-                    # try photo key match
-                    display_name = next((s.get("name") for s in students
-                                         if clean_name_from_filename(s.get("photo", "")) == str(reg_no)), None)
-                if not display_name:
-                    display_name = clean_name_from_filename(str(reg_no))
-
-                # Prevent multiple marks same day
-                if any(a.get("reg_no") == reg_no and a.get("date") == today for a in attendance):
-                    return jsonify({"status": "exists", "message": "Attendance already marked today",
-                                    "name": display_name, "reg_no": reg_no})
-
-                # Add entry
-                now = datetime.now()
-                entry = {
-                    "name": display_name,
-                    "reg_no": reg_no,
-                    "date": now.strftime("%Y-%m-%d"),
-                    "time": now.strftime("%H:%M:%S")
-                }
-
-                with attendance_lock:
-                    attendance = read_json(ATTENDANCE_FILE)
-                    attendance.append(entry)
-                    write_json(ATTENDANCE_FILE, attendance)
-
-                return jsonify({"status": "success", "name": display_name, "reg_no": reg_no})
-
-        return jsonify({"status": "unknown", "message": "Face not recognized"})
+        kiosk = kiosk_key(request.headers.get("X-Kiosk-Id"), request.args.get("kiosk"), request.remote_addr)
+        probe, gated = gate_frame(kiosk, frame)
+        if gated is not None:
+            return jsonify(gated), 200
+
+        h, result = cached_recognition(kiosk, frame)
+        if result is None:
+            try:
+                with stage("recognize"):
+                    result = recognizer.submit(frame).result(timeout=RECOGNITION_TIMEOUT)
+            except queue.Full:
+                payload, code = BUSY_RESPONSE
+                return jsonify(payload), code
+            remember_recognition(kiosk, h, result)
+
+        payload, code = commit_recognition(result, kiosk, probe)
+        return jsonify(payload), code
     except Exception as e:
         app.logger.exception("mark_attendance error")
         return jsonify({"status": "error", "error": str(e)}), 500
 
+# -------------------------
+# Group photo (a whole class in one high-resolution frame)
+# -------------------------
+def recognize_group(frame: np.ndarray) -> dict:
+    """Detect + encode every face of a group photo and match them all in one gallery pass."""
+    if recognition_engine is not None:
+        return recognition_engine.recognize_group(frame)
+    result = detect_and_encode_group(frame)
+    if result["status"] == "ok":
+        started = time.perf_counter()
+        with known_lock:
+            result["matches"] = gallery.match_names(result["encodings"], tolerance=MATCH_TOLERANCE)
+        result.setdefault("timings", {})["match"] = time.perf_counter() - started
+    return result
+
+def face_report(location, distance: float) -> dict:
+    top, right, bottom, left = (int(v) for v in location)
+    return {"box": {"top": top, "right": right, "bottom": bottom, "left": left},
+            "distance": round(distance, 4) if np.isfinite(distance) else None}
+
+def commit_group(result: dict) -> dict:
+    """Mark every newly recognized student of a group photo with one append; report each face's outcome."""
+    matches = result["matches"]
+    # a student appears once per photo: only their closest face counts
+    best = {}
+    for i, (reg_no, distance) in enumerate(matches):
+        if reg_no is not None and (reg_no not in best or distance < matches[best[reg_no]][1]):
+            best[reg_no] = i
+
+    recognized, unknown = [], []
+    for i, (location, (reg_no, distance)) in enumerate(zip(result["locations"], matches)):
+        face = face_report(location, distance)
+        if reg_no is None:
+            unknown.append(face)
+        elif best[reg_no] != i:
+            unknown.append({**face, "duplicate_of": reg_no})
+        else:
+            recognized.append({**face, "reg_no": reg_no, "name": student_directory.display_name(reg_no)})
+
+    now = datetime.now()
+    today = now.strftime("%Y-%m-%d")
+    marked, already_marked = [], []
+    with attendance_log.transaction():
+        for face in recognized:
+            (already_marked if attendance_index.has(face["reg_no"], today) else marked).append(face)
+        if marked:
+            attendance_log.append_many([
+                {"name": f["name"], "reg_no": f["reg_no"], "date": today, "time": now.strftime("%H:%M:%S")}
+                for f in marked
+            ])
+    return {"status": "ok", "date": today, "faces": len(matches),
+            "marked": marked, "already_marked": already_marked, "unknown": unknown}
+
+@app.route("/group_attendance", methods=["POST"])
+@instrumented("group_attendance")
+def group_attendance():
+    if not session.get("admin_logged_in"):
+        return jsonify({"status": "error", "message": "login required"}), 401
+    if not gallery_ready.is_set():
+        payload, code = WARMING_UP_RESPONSE
+        return jsonify(payload), code, {"Retry-After": "2"}
+    try:
+        with stage("decode"):
+            ok, frame_or_err = read_request_frame()
+        if not ok:
+            return jsonify({"status": "error", "message": frame_or_err}), 400
+
+        with stage("recognize"):
+            result = recognize_group(frame_or_err)
+        add_stages(result.pop("timings", None))
+        if result["status"] == "error":
+            app.logger.warning(f"group_attendance: {result.get('detail', result['message'])}")
+            return jsonify({"status": "error", "message": result["message"]}), 500
+        if result["status"] == "no_face":
+            return jsonify({"status": "no_face", "message": "No face detected", "faces": 0,
+                            "marked": [], "already_marked": [], "unknown": []})
+
+        with stage("commit"):
+            payload = commit_group(result)
+        return jsonify(payload)
+    except Exception as e:
+        app.logger.exception("group_attendance error")
+        return jsonify({"status": "error", "error": str(e)}), 500
+
 # -------------------------
 # Register student (upload file OR blob from canvas)
 # -------------------------
 @app.route("/register_student", methods=["POST"])
+@instrumented("register_student")
 def register_student():
     try:
         name = request.form.get("name")
@@ -286,27 +675,31 @@ def register_student():
             ext = ".jpg"
         filename = f"{reg_no}{ext.lower()}"
         path = os.path.join(KNOWN_FACES_DIR, filename)
-        file.save(path)
-
-        # verify face in uploaded image
-        try:
-            image = face_recognition.load_image_file(path)
-            enc = face_recognition.face_encodings(image)
-        except Exception:
-            enc = []
 
-        if not enc:
-            if os.path.exists(path):
-                os.remove(path)
+        # verify face in the uploaded bytes before anything is written
+        with stage("read"):
+            data = file.read()
+        with stage("encode"):
+            enc, _error = encode_image_bytes(data, get_backend(EMBEDDING), ENROLL_MAX_SIDE)
+        if enc is None:
             return jsonify({"message": "No face detected in uploaded photo"}), 400
-
-        # append to in-memory lists
-        with known_lock:
-            known_encodings.append(enc[0])
-            known_names.append(reg_no)
+        with stage("write_photo"), open(path, "wb") as f:
+            f.write(data)
+        thumbnails.invalidate(filename)
+
+        # add to in-memory gallery + persist in the encoding store
+        with stage("gallery"), known_lock:
+            gallery.add(reg_no, enc)
+            publish_gallery()
+            if recognition_cache is not None:
+                recognition_cache.clear()
+            encoding_store.put(filename, enc, path)
+            encoding_store.save()
+        if frame_gate is not None:
+            frame_gate.forget_unmatched()
 
         # add to students.json
-        with students_lock:
+        with stage("students"), students_lock:
             students = read_json(STUDENTS_FILE)
             students.append({
                 "name": name,
@@ -316,83 +709,222 @@ def register_student():
                 "registered_on": datetime.utcnow().isoformat()
             })
             write_json(STUDENTS_FILE, students)
+            student_directory.invalidate()
 
         return jsonify({"ok": True, "message": f"{name} registered"})
     except Exception as e:
         app.logger.exception("register_student error")
         return jsonify({"message": str(e)}), 500
 
+# -------------------------
+# Bulk import (ZIP with roster CSV + photos, or CSV + "photos" files)
+# -------------------------
+def bulk_enroll(entries: List[dict]) -> Tuple[List[dict], List[dict]]:
+    """Encode roster entries in parallel, then commit them and update the gallery once."""
+    failures = encode_entries(entries, EMBEDDING, BULK_IMPORT_PROCESSES, ENROLL_MAX_SIDE)
+    with students_lock, known_lock:
+        added, skipped = commit_enrollment(entries, KNOWN_FACES_DIR, STUDENTS_FILE, encoding_store)
+        for e in added:
+            thumbnails.invalidate(e["filename"])
+        if added:
+            gallery.add_many([e["reg_no"] for e in added], np.stack([e["encoding"] for e in added]))
+            publish_gallery()
+            if recognition_cache is not None:
+                recognition_cache.clear()
+        student_directory.invalidate()
+    if added and frame_gate is not None:
+        frame_gate.forget_unmatched()
+    return added, failures + skipped
+
+@app.route("/bulk_import", methods=["POST"])
+def bulk_import():
+    if not session.get("admin_logged_in"):
+        return jsonify({"ok": False, "message": "login required"}), 401
+
+    roster = request.files.get("roster")
+    if roster is None:
+        return jsonify({"ok": False, "message": "roster file required"}), 400
+    try:
+        if (roster.filename or "").lower().endswith(".zip"):
+            entries, failures = read_roster_zip(roster.stream)
+        else:
+            photos = {secure_filename(p.filename or ""): p.read() for p in request.files.getlist("photos")}
+            entries, failures = read_roster_csv(roster.read().decode("utf-8-sig"), photos)
+    except (ValueError, UnicodeDecodeError, zipfile.BadZipFile) as e:
+        return jsonify({"ok": False, "message": str(e)}), 400
+
+    try:
+        added, failed = bulk_enroll(entries)
+    except Exception as e:
+        app.logger.exception("bulk_import error")
+        return jsonify({"ok": False, "message": str(e)}), 500
+
+    failed = sorted(failures + failed, key=lambda f: f["row"] or 0)
+    return jsonify({"ok": True, "rows": len(entries) + len(failures),
+                    "imported": len(added), "failed": failed})
+
 # -------------------------
 # Analytics endpoint (format 'A' requested)
 # Returns: total_students, total_attendance, attendance_by_date, top_students, attendance_by_dept, recent
 # -------------------------
+def analytics_etag() -> Tuple[str, int]:
+    """(etag, log cursor) for the current aggregates, after picking up other workers' appends."""
+    with stage("refresh"):
+        attendance_log.refresh()
+    cursor = attendance_log.offset
+    return analytics_aggregates.etag(cursor), cursor
+
 @app.route("/analytics_data", methods=["GET"])
+@instrumented("analytics_data")
 def analytics_data():
-    attendance = read_json(ATTENDANCE_FILE)
-    students = read_json(STUDENTS_FILE)
-
-    total_students = len(students)
-    total_attendance = len(attendance)
-
-    # attendance_by_date: {date: count}
-    by_date: Dict[str, int] = {}
-    # by_student: {reg_no: count}
-    by_student: Dict[str, int] = {}
-    # by_dept: {dept: count}
-    reg_to_dept = {s.get("reg_no"): s.get("dept", "Unknown") for s in students}
-    by_dept: Dict[str, int] = {}
-
-    for a in attendance:
-        date = a.get("date")
-        reg = a.get("reg_no")
-        if date:
-            by_date[date] = by_date.get(date, 0) + 1
-        if reg:
-            by_student[reg] = by_student.get(reg, 0) + 1
-            dept = reg_to_dept.get(reg, "Unknown")
-            by_dept[dept] = by_dept.get(dept, 0) + 1
-
-    # convert to required arrays
-    attendance_by_date = sorted([[d, c] for d, c in by_date.items()])
-    top_students = sorted([[r, c] for r, c in by_student.items()], key=lambda x: x[1], reverse=True)[:10]
-    attendance_by_dept = sorted([[d, c] for d, c in by_dept.items()])
-
-    recent = list(reversed(attendance))[:50]
-
-    return jsonify({
-        "total_students": total_students,
-        "total_attendance": total_attendance,
-        "attendance_by_date": attendance_by_date,
-        "top_students": top_students,
-        "attendance_by_dept": attendance_by_dept,
-        "recent": recent
-    })
-
-# -------------------------
-# Download CSV
+    # answer from the materialized counters
+    etag, cursor = analytics_etag()
+    if request.if_none_match.contains(etag):
+        resp = app.response_class(status=304)
+    else:
+        with stage("snapshot"):
+            resp = jsonify(analytics_aggregates.snapshot())
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Attendance-Cursor"] = str(cursor)
+    return resp
+
+@app.route("/analytics_range", methods=["GET"])
+@instrumented("analytics_range")
+def analytics_range():
+    """Counts and attendance rates over ?from=&to= (YYYY-MM-DD, inclusive), optionally for one ?dept=."""
+    with stage("refresh"):
+        attendance_log.refresh()
+    try:
+        with stage("aggregate"):
+            payload = range_analytics(attendance_columns, student_directory,
+                                      request.args.get("from"), request.args.get("to"), request.args.get("dept"))
+    except ValueError:
+        return jsonify({"message": "from and to must be YYYY-MM-DD"}), 400
+    return jsonify(payload)
+
 # -------------------------
-@app.route("/download_attendance", methods=["GET"])
-def download_attendance():
-    attendance = read_json(ATTENDANCE_FILE)
+# Live feed (Server-Sent Events)
+# Streams `attendance` events (id = log cursor) and `aggregates` deltas;
+# resume with ?cursor=<id> or the Last-Event-ID header.
+# -------------------------
+def stream_cursor(last_event_id, cursor_arg) -> int:
+    """Resume point for the live feed (default: now). Raises ValueError if not an integer."""
+    attendance_log.refresh()
+    raw = last_event_id or cursor_arg
+    return max(0, int(raw)) if raw is not None else attendance_log.offset
+
+@app.route("/attendance_stream", methods=["GET"])
+def attendance_stream():
+    try:
+        cursor = stream_cursor(request.headers.get("Last-Event-ID"), request.args.get("cursor"))
+    except ValueError:
+        return jsonify({"message": "invalid cursor"}), 400
+
+    resp = Response(stream_with_context(live_feed.stream(attendance_log, analytics_aggregates, cursor)),
+                    mimetype="text/event-stream")
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"
+    return resp
+
+# -------------------------
+# Attendance filters (shared by /get_attendance and /download_attendance)
+# Query args: from, to (YYYY-MM-DD, inclusive), reg_no, dept
+# -------------------------
+def attendance_filter(args):
+    date_from = args.get("from")
+    date_to = args.get("to")
+    reg_no = args.get("reg_no")
+    dept = args.get("dept")
+    reg_to_dept = student_directory.reg_to_dept() if dept else {}
+
+    def keep(a: dict) -> bool:
+        date = a.get("date", "")
+        if date_from and date < date_from:
+            return False
+        if date_to and date > date_to:
+            return False
+        if reg_no and a.get("reg_no") != reg_no:
+            return False
+        if dept and reg_to_dept.get(a.get("reg_no"), "Unknown") != dept:
+            return False
+        return True
+
+    return keep
+
+# -------------------------
+# Download CSV (streamed, constant memory)
+# -------------------------
+def attendance_csv(args, batch_rows: int = 500):
+    """Yield the filtered attendance CSV in chunks of `batch_rows` rows."""
+    keep = attendance_filter(args)
     si = io.StringIO()
     writer = csv.writer(si)
     writer.writerow(["Name", "Reg No", "Date", "Time"])
-    for a in attendance:
+    rows = 0
+    for _, a in attendance_log.iter_records():
+        if not keep(a):
+            continue
         writer.writerow([a.get("name", ""), a.get("reg_no", ""), a.get("date", ""), a.get("time", "")])
-    mem = io.BytesIO(si.getvalue().encode("utf-8"))
-    mem.seek(0)
-    return send_file(mem, mimetype="text/csv", as_attachment=True, download_name="attendance.csv")
+        rows += 1
+        if rows % batch_rows == 0:
+            yield si.getvalue()
+            si.seek(0)
+            si.truncate(0)
+    yield si.getvalue()
+
+@app.route("/download_attendance", methods=["GET"])
+def download_attendance():
+    return Response(stream_with_context(attendance_csv(request.args)), mimetype="text/csv",
+                    headers={"Content-Disposition": "attachment; filename=attendance.csv"})
 
 # -------------------------
 # Get students & attendance APIs
 # -------------------------
 @app.route("/get_students", methods=["GET"])
 def get_students():
-    return jsonify(read_json(STUDENTS_FILE))
+    return jsonify(student_directory.all())
+
+def attendance_page(args) -> Tuple[object, int]:
+    """(payload, log cursor) for /get_attendance. With limit and/or cursor args the payload is one
+    page {"items": [...], "next_cursor": <cursor or null>}; otherwise the full (filtered) list.
+    Raises ValueError for non-integer cursor/limit."""
+    keep = attendance_filter(args)
+    paged = "limit" in args or "cursor" in args
+    start = max(0, int(args.get("cursor", 0)))
+    limit = int(args.get("limit", 500))
+    limit = max(1, min(limit, 5000))
+
+    records, cursor, more = [], start, False
+    for offset, record in attendance_log.iter_records(start):
+        if paged and len(records) >= limit:
+            more = True
+            break
+        cursor = offset
+        if keep(record):
+            records.append(record)
+
+    if paged:
+        return {"items": records, "next_cursor": cursor if more else None}, cursor
+    return records, cursor
 
 @app.route("/get_attendance", methods=["GET"])
 def get_attendance():
-    return jsonify(read_json(ATTENDANCE_FILE))
+    try:
+        payload, cursor = attendance_page(request.args)
+    except ValueError:
+        return jsonify({"message": "cursor and limit must be integers"}), 400
+    resp = jsonify(payload)
+    resp.headers["X-Attendance-Cursor"] = str(cursor)
+    return resp
+
+@app.route("/reset_attendance", methods=["POST"])
+def reset_attendance():
+    if not session.get("admin_logged_in"):
+        return jsonify({"ok": False, "message": "login required"}), 401
+    # empties the log and the archive; aggregates, marks and live feeds reset through the log listeners
+    attendance_log.reset()
+    return jsonify({"ok": True})
 
 # -------------------------
 # Delete student
@@ -412,6 +944,7 @@ def delete_student():
         students = read_json(STUDENTS_FILE)
         students = [s for s in students if s.get("reg_no") != reg_no]
         write_json(STUDENTS_FILE, students)
+        student_directory.invalidate()
 
     # remove image file (any extension)
     for ext in (".jpg", ".jpeg", ".png"):
@@ -421,22 +954,45 @@ def delete_student():
                 os.remove(path)
             except Exception:
                 pass
+        thumbnails.invalidate(f"{reg_no}{ext}")
 
-    # remove from in-memory lists
+    # remove from in-memory gallery + encoding store
     with known_lock:
-        for i in range(len(known_names) - 1, -1, -1):
-            if known_names[i] == reg_no:
-                known_names.pop(i)
-                known_encodings.pop(i)
+        removed = [encoding_store.remove(f"{reg_no}{ext}") for ext in (".jpg", ".jpeg", ".png")]
+        if any(removed):
+            encoding_store.save()
+        gallery.remove(reg_no)
+        publish_gallery()
+        if recognition_cache is not None:
+            recognition_cache.clear()
+    if frame_gate is not None:
+        frame_gate.forget(reg_no)
 
     return jsonify({"ok": True})
 
 # -------------------------
 # Serve student photos + static pages
 # -------------------------
+def photo_thumbnail(filename: str, size_arg: str):
+    """(path, etag) of the ?size= thumbnail, or None if the photo is missing; ValueError for a bad size."""
+    size = int(size_arg)
+    if size <= 0:
+        raise ValueError(size_arg)
+    return thumbnails.get(filename, size)
+
 @app.route("/student_photo/<path:filename>")
 def student_photo(filename):
-    return send_from_directory(KNOWN_FACES_DIR, filename)
+    size = request.args.get("size")
+    if not size:
+        return send_from_directory(KNOWN_FACES_DIR, filename)
+    try:
+        found = photo_thumbnail(filename, size)
+    except ValueError:
+        return jsonify({"message": "size must be a positive integer"}), 400
+    if found is None:
+        abort(404)
+    path, etag = found
+    return send_file(path, mimetype="image/jpeg", etag=etag, max_age=THUMB_MAX_AGE)
 
 @app.route("/")
 def index():
@@ -454,6 +1010,16 @@ def register_page():
 def analytics_page():
     return app.send_static_file("analytics.html")
 
+# -------------------------
+# Startup
+# -------------------------
+startup["import_seconds"] = round(time.perf_counter() - IMPORT_STARTED, 3)
+if multiprocessing.parent_process() is None:   # not in spawned recognition processes
+    if STARTUP_WARMUP == "sync":
+        warm_up()
+    else:
+        threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+
 # -------------------------
 # Run
 # -------------------------
@@ -0,0 +1,46 @@
+# backend/archive_attendance.py
+"""Move closed days from attendance.jsonl into the columnar archive.
+
+    python archive_attendance.py                       # everything before the 1st of this month
+    python archive_attendance.py --before 2024-06-01
+
+Safe to run while the server is up: the log is compacted under its write
+lock, and workers switch to the rewritten file on their next refresh. Log
+cursors (live feed ids, /get_attendance paging) stay valid.
+"""
+import os
+import argparse
+from datetime import date
+
+from attendance_archive import AttendanceArchive
+from attendance_store import AttendanceLog
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ATTENDANCE_LOG = os.path.join(BASE_DIR, "attendance.jsonl")
+ATTENDANCE_FILE = os.path.join(BASE_DIR, "attendance.json")   # legacy, migrated on first open
+ATTENDANCE_ARCHIVE_DIR = os.path.join(BASE_DIR, "archive")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--before", default=date.today().replace(day=1).isoformat(),
+                        help="archive records dated before this day (YYYY-MM-DD, at most today)")
+    args = parser.parse_args()
+
+    log = AttendanceLog(ATTENDANCE_LOG, legacy_path=ATTENDANCE_FILE,
+                        archive=AttendanceArchive(ATTENDANCE_ARCHIVE_DIR))
+    try:
+        segment = log.compact(args.before)
+    except ValueError as e:
+        parser.error(str(e))
+    finally:
+        log.close()
+    if segment is None:
+        print(f"Nothing to archive before {args.before}")
+    else:
+        print(f"Archived {segment['rows']} record(s) into {segment['file']}; "
+              f"archive holds {log.archive.rows} record(s) in {len(log.archive.segments)} segment(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+# backend/asgi.py
+"""Asyncio (ASGI) serving mode.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000 --workers 1
+
+Kiosk and dashboard endpoints run natively on the event loop, sharing all
+state (gallery, attendance log, aggregates, student directory, recognizer)
+with app.py:
+  - /get_students, /analytics_data answer from in-memory caches
+  - /student_photo streams files without holding a thread (?size= thumbnails
+    are built in the threadpool on a cache miss)
+  - /get_attendance, /download_attendance scan the log in the threadpool
+  - /attendance_stream is an async SSE generator
+  - /mark_attendance awaits the recognition batcher; decode and the
+    attendance commit run in executor threads, so CPU-heavy work never
+    blocks the loop
+Every other route (admin login/session, register/delete, attendance reset,
+static pages) is served by the Flask app mounted through a WSGI adapter.
+"""
+import os
+import json
+import queue
+import asyncio
+import functools
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool, iterate_in_threadpool
+from starlette.requests import Request
+from starlette.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+from werkzeug.security import safe_join
+
+import app as flask_app
+from metrics import stage
+
+# -------------------------
+# Metrics
+# -------------------------
+def instrumented(endpoint: str):
+    """Async counterpart of app.instrumented (threadpool calls inherit the request trace)."""
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(request: Request):
+            with flask_app.request_metrics.request(endpoint) as trace:
+                response = await handler(request)
+                trace.status = response.status_code
+                return response
+        return wrapper
+    return decorator
+
+# -------------------------
+# Kiosk
+# -------------------------
+async def read_frame(request: Request):
+    """Async counterpart of app.read_request_frame(); decoding runs in the threadpool."""
+    mimetype = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if mimetype in flask_app.RAW_IMAGE_MIMETYPES:
+        data = await request.body()
+        return await run_in_threadpool(flask_app.decode_image_bytes, data)
+    if mimetype == "multipart/form-data":
+        form = await request.form()
+        upload = form.get("image")
+        data = await upload.read() if upload is not None and hasattr(upload, "read") else b""
+        return await run_in_threadpool(flask_app.decode_image_bytes, data)
+    try:
+        payload = json.loads(await request.body() or b"{}")
+    except ValueError:
+        payload = {}
+    image_data = payload.get("image") if isinstance(payload, dict) else None
+    if not image_data:
+        return False, "No image"
+    return await run_in_threadpool(flask_app.decode_base64_image, image_data)
+
+
+@instrumented("mark_attendance")
+async def mark_attendance(request: Request):
+    if not flask_app.gallery_ready.is_set():
+        payload, code = flask_app.WARMING_UP_RESPONSE
+        return JSONResponse(payload, status_code=code, headers={"Retry-After": "2"})
+    try:
+        with stage("decode"):
+            ok, frame_or_err = await read_frame(request)
+        if not ok:
+            return JSONResponse({"status": "error", "message": frame_or_err}, status_code=400)
+
+        kiosk = flask_app.kiosk_key(request.headers.get("x-kiosk-id"), request.query_params.get("kiosk"),
+                                    request.client.host if request.client else None)
+        probe, gated = await run_in_threadpool(flask_app.gate_frame, kiosk, frame_or_err)
+        if gated is not None:
+            return JSONResponse(gated)
+
+        h, result = await run_in_threadpool(flask_app.cached_recognition, kiosk, frame_or_err)
+        if result is None:
+            try:
+                future = flask_app.recognizer.submit(frame_or_err)
+            except queue.Full:
+                payload, code = flask_app.BUSY_RESPONSE
+                return JSONResponse(payload, status_code=code)
+            with stage("recognize"):
+                result = await asyncio.wait_for(asyncio.wrap_future(future), flask_app.RECOGNITION_TIMEOUT)
+            flask_app.remember_recognition(kiosk, h, result)
+
+        payload, code = await run_in_threadpool(flask_app.commit_recognition, result, kiosk, probe)
+        return JSONResponse(payload, status_code=code)
+    except Exception as e:
+        flask_app.app.logger.exception("mark_attendance error")
+        return JSONResponse({"status": "error", "error": str(e)}, status_code=500)
+
+# -------------------------
+# Dashboards
+# -------------------------
+async def get_students(request: Request):
+    students = await run_in_threadpool(flask_app.student_directory.all)   # may stat/re-read students.json
+    return JSONResponse(students)
+
+
+def etag_matches(request: Request, quoted: str) -> bool:
+    if_none_match = request.headers.get("if-none-match", "")
+    return quoted in [t.strip() for t in if_none_match.split(",")] or if_none_match.strip() == "*"
+
+
+async def student_photo(request: Request):
+    filename = request.path_params["filename"]
+    size = request.query_params.get("size")
+    if size:
+        try:
+            found = await run_in_threadpool(flask_app.photo_thumbnail, filename, size)
+        except ValueError:
+            return JSONResponse({"message": "size must be a positive integer"}, status_code=400)
+        if found is None:
+            return Response(status_code=404)
+        path, etag = found
+        headers = {"ETag": f'"{etag}"', "Cache-Control": f"public, max-age={flask_app.THUMB_MAX_AGE}"}
+        if etag_matches(request, headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+        return FileResponse(path, media_type="image/jpeg", headers=headers)
+
+    path = safe_join(flask_app.KNOWN_FACES_DIR, filename)
+    if path is None or not await asyncio.to_thread(os.path.isfile, path):
+        return Response(status_code=404)
+    return FileResponse(path)
+
+
+@instrumented("analytics_data")
+async def analytics_data(request: Request):
+    etag, cursor = await run_in_threadpool(flask_app.analytics_etag)
+    quoted = f'"{etag}"'
+    headers = {"ETag": quoted, "Cache-Control": "no-cache", "X-Attendance-Cursor": str(cursor)}
+    if etag_matches(request, quoted):
+        return Response(status_code=304, headers=headers)
+    with stage("snapshot"):
+        return JSONResponse(flask_app.analytics_aggregates.snapshot(), headers=headers)
+
+
+async def get_attendance(request: Request):
+    try:
+        payload, cursor = await run_in_threadpool(flask_app.attendance_page, request.query_params)
+    except ValueError:
+        return JSONResponse({"message": "cursor and limit must be integers"}, status_code=400)
+    return JSONResponse(payload, headers={"X-Attendance-Cursor": str(cursor)})
+
+
+async def download_attendance(request: Request):
+    rows = flask_app.attendance_csv(request.query_params)
+    return StreamingResponse(iterate_in_threadpool(rows), media_type="text/csv",
+                             headers={"Content-Disposition": "attachment; filename=attendance.csv"})
+
+
+async def attendance_stream(request: Request):
+    try:
+        cursor = await run_in_threadpool(flask_app.stream_cursor, request.headers.get("last-event-id"),
+                                         request.query_params.get("cursor"))
+    except ValueError:
+        return JSONResponse({"message": "invalid cursor"}, status_code=400)
+    events = flask_app.live_feed.astream(flask_app.attendance_log, flask_app.analytics_aggregates, cursor)
+    return StreamingResponse(events, media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+app = Starlette(routes=[
+    Route("/mark_attendance", mark_attendance, methods=["POST"]),
+    Route("/get_students", get_students, methods=["GET"]),
+    Route("/student_photo/{filename:path}", student_photo, methods=["GET"]),
+    Route("/analytics_data", analytics_data, methods=["GET"]),
+    Route("/get_attendance", get_attendance, methods=["GET"]),
+    Route("/download_attendance", download_attendance, methods=["GET"]),
+    Route("/attendance_stream", attendance_stream, methods=["GET"]),
+    # everything else (admin session, register/delete, static pages) stays on Flask
+    Mount("/", app=WSGIMiddleware(flask_app.app)),
+], middleware=[
+    # the native routes get the same policy as CORS(app) in app.py: any origin, method and header
+    Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"]),
+])
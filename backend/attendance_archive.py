@@ -0,0 +1,309 @@
+# backend/attendance_archive.py
+"""Columnar archive of closed attendance days.
+
+AttendanceLog.compact() moves the oldest records of the JSON Lines log into
+a new archive segment. These records are a prefix of the log, all dated
+before a cutoff. The log is then rewritten without them. A segment is one
+.npz file of parallel columns:
+  offset  int64   log cursor after the record, so cursors stay valid across compaction
+  day     int32   date ordinal (date.toordinal())
+  secs    int32   seconds since midnight (-1 = no time)
+  reg     uint32  index into the interned reg_no table
+  name    uint32  index into the interned name table
+manifest.json lists the segments with their day and offset ranges. It also
+holds the intern tables and `base`, the log offset the archive covers up to.
+The manifest is replaced atomically and is the commit point of a compaction.
+Segments are never rewritten, so they stay in log order.
+
+AttendanceColumns keeps the same columns for the live log tail. Range
+analytics (analytics.range_analytics) therefore see archive and recent
+records as one set of arrays.
+"""
+import os
+import json
+import threading
+from array import array
+from datetime import date
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+MANIFEST = "manifest.json"
+COLUMNS = ("offset", "day", "secs", "reg", "name")
+FIELDS = {"name", "reg_no", "date", "time"}
+Columns = Tuple[np.ndarray, np.ndarray, np.ndarray]   # (day, secs, reg)
+
+
+def day_ordinal(value) -> Optional[int]:
+    try:
+        return date.fromisoformat(value).toordinal()
+    except (TypeError, ValueError):
+        return None
+
+
+def time_secs(value) -> int:
+    try:
+        h, m, s = (int(v) for v in str(value).split(":"))
+    except ValueError:
+        return -1
+    return h * 3600 + m * 60 + s
+
+
+def format_secs(secs: int) -> str:
+    return "" if secs < 0 else f"{secs // 3600:02d}:{secs % 3600 // 60:02d}:{secs % 60:02d}"
+
+
+def archivable(record: dict, before: int) -> bool:
+    """True if `record` is dated before ordinal `before` and is rebuilt exactly from the columns."""
+    if set(record) != FIELDS or not all(isinstance(v, str) for v in record.values()):
+        return False
+    day = day_ordinal(record["date"])
+    if day is None or day >= before or date.fromordinal(day).isoformat() != record["date"]:
+        return False
+    return format_secs(time_secs(record["time"])) == record["time"]
+
+
+def _empty_columns() -> Columns:
+    return np.zeros(0, np.int32), np.zeros(0, np.int32), np.zeros(0, np.uint32)
+
+
+def _write_atomic(path: str, write):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class AttendanceArchive:
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, MANIFEST)
+        self.lock = threading.RLock()
+        self._stamp = None
+        self._load({})
+        self.refresh()
+
+    def _load(self, manifest: dict):
+        self.base = manifest.get("base", 0)             # log offset covered by the archive
+        self.segments: List[dict] = manifest.get("segments", [])
+        self.regs: List[str] = manifest.get("regs", [])
+        self.names: List[str] = manifest.get("names", [])
+        self._cache: Dict[str, Columns] = {}
+
+    @property
+    def rows(self) -> int:
+        return sum(seg["rows"] for seg in self.segments)
+
+    def refresh(self) -> bool:
+        """Reload the manifest if it changed (e.g. another worker compacted); True if it did."""
+        try:
+            st = os.stat(self.manifest_path)
+            stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+        except OSError:
+            stamp = None
+        with self.lock:
+            if stamp == self._stamp:
+                return False
+            manifest = {}
+            if stamp is not None:
+                with open(self.manifest_path, "r", encoding="utf-8") as f:
+                    manifest = json.load(f)
+            self._load(manifest)
+            self._stamp = stamp
+            return True
+
+    # -------------------------
+    # Read
+    # -------------------------
+    def _segment(self, seg: dict) -> Dict[str, np.ndarray]:
+        with np.load(os.path.join(self.directory, seg["file"])) as npz:
+            return {k: npz[k] for k in COLUMNS}
+
+    def columns(self, first_day: Optional[int] = None, last_day: Optional[int] = None,
+                segments: Optional[List[dict]] = None) -> Columns:
+        """(day, secs, reg) of archived records with first_day <= day <= last_day (ordinals, None = open).
+
+        `segments` restricts the scan to a snapshot of the segment list (default: all).
+        """
+        with self.lock:
+            parts = []
+            for seg in self.segments if segments is None else segments:
+                if first_day is not None and seg["last_day"] < first_day:
+                    continue
+                if last_day is not None and seg["first_day"] > last_day:
+                    continue
+                cols = self._cache.get(seg["file"])
+                if cols is None:
+                    s = self._segment(seg)
+                    cols = self._cache[seg["file"]] = (s["day"], s["secs"], s["reg"])
+                parts.append(cols)
+        if not parts:
+            return _empty_columns()
+        day, secs, reg = (np.concatenate(c) if len(c) > 1 else c[0] for c in zip(*parts))
+        if first_day is not None or last_day is not None:
+            mask = np.ones(len(day), bool)
+            if first_day is not None:
+                mask &= day >= first_day
+            if last_day is not None:
+                mask &= day <= last_day
+            day, secs, reg = day[mask], secs[mask], reg[mask]
+        return day, secs, reg
+
+    def counts(self) -> Tuple[int, Dict[str, int], Dict[str, int]]:
+        """(total, per-date counts, per-reg_no counts) over the whole archive."""
+        day, _, reg = self.columns()
+        if not len(day):
+            return 0, {}, {}
+        first = int(day.min())
+        per_day = np.bincount(day - first)
+        per_reg = np.bincount(reg, minlength=len(self.regs))
+        by_date = {date.fromordinal(first + i).isoformat(): int(per_day[i]) for i in np.flatnonzero(per_day).tolist()}
+        by_reg = {self.regs[i]: int(per_reg[i]) for i in np.flatnonzero(per_reg).tolist()}
+        return len(day), by_date, by_reg
+
+    def _records(self, seg: dict, start: int = 0, last_rows: Optional[int] = None) -> Iterator[Tuple[int, dict]]:
+        """Decode one segment's records after cursor `start` (or only its last `last_rows`)."""
+        s = self._segment(seg)
+        regs, names = self.regs, self.names
+        row = int(np.searchsorted(s["offset"], start, side="right"))
+        if last_rows is not None:
+            row = max(row, len(s["offset"]) - last_rows)
+        iso = {d: date.fromordinal(d).isoformat() for d in np.unique(s["day"][row:]).tolist()}
+        for offset, day, secs, reg, name in zip(*(s[k][row:].tolist() for k in COLUMNS)):
+            yield offset, {"name": names[name], "reg_no": regs[reg], "date": iso[day], "time": format_secs(secs)}
+
+    def iter_records(self, start: int = 0) -> Iterator[Tuple[int, dict]]:
+        """(offset, record) for archived records after log cursor `start`, in log order."""
+        for seg in list(self.segments):
+            if seg["last_offset"] > start:
+                yield from self._records(seg, start)
+
+    def tail(self, n: int) -> List[dict]:
+        """The last `n` archived records, oldest first."""
+        out: List[dict] = []
+        for seg in reversed(self.segments):
+            if len(out) >= n:
+                break
+            out[:0] = [r for _, r in self._records(seg, last_rows=n - len(out))]
+        return out
+
+    # -------------------------
+    # Write (called by AttendanceLog.compact() under the log's write lock)
+    # -------------------------
+    def add_segment(self, records: Sequence[Tuple[int, dict]]) -> dict:
+        """Archive (offset, record) pairs that directly follow `base`; returns the new segment's entry."""
+        with self.lock:
+            self.refresh()
+            regs, names = list(self.regs), list(self.names)
+            reg_ids = {r: i for i, r in enumerate(regs)}
+            name_ids = {n: i for i, n in enumerate(names)}
+            cols = {"offset": array("q"), "day": array("i"), "secs": array("i"), "reg": array("I"), "name": array("I")}
+            for offset, a in records:
+                reg, name = str(a.get("reg_no", "")), str(a.get("name", ""))
+                if reg not in reg_ids:
+                    reg_ids[reg] = len(regs)
+                    regs.append(reg)
+                if name not in name_ids:
+                    name_ids[name] = len(names)
+                    names.append(name)
+                cols["offset"].append(offset)
+                cols["day"].append(day_ordinal(a.get("date")))
+                cols["secs"].append(time_secs(a.get("time")))
+                cols["reg"].append(reg_ids[reg])
+                cols["name"].append(name_ids[name])
+            arrays = {
+                "offset": np.frombuffer(cols["offset"], np.int64), "day": np.frombuffer(cols["day"], np.int32),
+                "secs": np.frombuffer(cols["secs"], np.int32), "reg": np.frombuffer(cols["reg"], np.uint32),
+                "name": np.frombuffer(cols["name"], np.uint32),
+            }
+            first_day, last_day = int(arrays["day"].min()), int(arrays["day"].max())
+            fname = (f"segment-{len(self.segments) + 1:06d}_{date.fromordinal(first_day).isoformat()}"
+                     f"_{date.fromordinal(last_day).isoformat()}.npz")
+            os.makedirs(self.directory, exist_ok=True)
+            _write_atomic(os.path.join(self.directory, fname), lambda f: np.savez(f, **arrays))
+
+            seg = {"file": fname, "rows": len(arrays["day"]), "first_day": first_day, "last_day": last_day,
+                   "first_offset": int(arrays["offset"][0]), "last_offset": int(arrays["offset"][-1])}
+            manifest = {"version": 1, "base": seg["last_offset"], "segments": self.segments + [seg],
+                        "regs": regs, "names": names}
+            _write_atomic(self.manifest_path,
+                          lambda f: f.write(json.dumps(manifest, ensure_ascii=False).encode("utf-8")))
+            self.refresh()
+            return seg
+
+    def clear(self):
+        """Drop everything (the attendance log was reset)."""
+        with self.lock:
+            self.refresh()
+            files = [seg["file"] for seg in self.segments]
+            if self._stamp is not None:
+                _write_atomic(self.manifest_path, lambda f: f.write(b'{"version": 1, "base": 0}'))
+            for fname in files:
+                try:
+                    os.remove(os.path.join(self.directory, fname))
+                except OSError:
+                    pass
+            self.refresh()
+
+
+class AttendanceColumns:
+    """Archive + log tail as (day, secs, reg) columns for range analytics; subscribe it to the AttendanceLog.
+
+    seed() pins the archive's segment list and reg_no table, so a compaction by another
+    worker is only picked up when the log restarts its listeners (the tail is then rebuilt too).
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.archive: Optional[AttendanceArchive] = None
+        self._segments: List[dict] = []
+        self._archived_regs: List[str] = []
+        self.reset()
+
+    def seed(self, archive: AttendanceArchive):
+        with self._lock:
+            self.archive = archive
+            self._segments = list(archive.segments)
+            self._archived_regs = list(archive.regs)
+            self.regs = list(self._archived_regs)
+            self._reg_ids = {r: i for i, r in enumerate(self.regs)}
+
+    def reset(self):
+        with self._lock:
+            self.archive, self._segments, self._archived_regs = None, [], []
+            self.regs: List[str] = []
+            self._reg_ids: Dict[str, int] = {}
+            self._day, self._secs, self._reg = array("i"), array("i"), array("I")
+
+    def apply(self, records: List[dict]):
+        with self._lock:
+            for a in records:
+                day = day_ordinal(a.get("date"))
+                if day is None:
+                    continue
+                reg = str(a.get("reg_no", ""))
+                idx = self._reg_ids.get(reg)
+                if idx is None:
+                    idx = self._reg_ids[reg] = len(self.regs)
+                    self.regs.append(reg)
+                self._day.append(day)
+                self._secs.append(time_secs(a.get("time")))
+                self._reg.append(idx)
+
+    def select(self, first_day: Optional[int] = None, last_day: Optional[int] = None) -> Tuple[Columns, List[str]]:
+        """((day, secs, reg) columns of records in the range, the reg_no table the reg ids index)."""
+        with self._lock:
+            archive, segments = self.archive, self._segments
+            recent = (np.frombuffer(self._day, np.int32).copy(), np.frombuffer(self._secs, np.int32).copy(),
+                      np.frombuffer(self._reg, np.uint32).copy())
+            regs = list(self.regs)
+        archived = archive.columns(first_day, last_day, segments) if archive and segments else _empty_columns()
+        if first_day is not None or last_day is not None:
+            mask = np.ones(len(recent[0]), bool)
+            if first_day is not None:
+                mask &= recent[0] >= first_day
+            if last_day is not None:
+                mask &= recent[0] <= last_day
+            recent = tuple(c[mask] for c in recent)
+        return tuple(np.concatenate([a, r]) for a, r in zip(archived, recent)), regs
@@ -0,0 +1,389 @@
+# backend/attendance_store.py
+"""Append-only attendance storage (JSON Lines).
+
+Each record is one line of JSON, so marking attendance is a single O(1)
+append instead of re-reading and rewriting the whole history. Appends are
+written straight to the OS; fsync is batched (every `fsync_every` records or
+`fsync_interval` seconds, whichever comes first). Writers in different
+processes (gunicorn workers) are serialized with an advisory file lock.
+
+Listeners (e.g. AttendanceIndex) are fed every record exactly once: records
+appended by this process directly, records appended by other workers when
+refresh() reads the log tail past the last consumed offset. A log that shrank
+or was replaced (reset) makes listeners reset and replay from the start.
+
+With an AttendanceArchive, compact() moves closed days at the head of the log
+into columnar archive segments and rewrites the log as a header line
+{"_archived_offset": N} plus the remaining records. Offsets are logical: the
+archive covers [0, N) and the file continues at N, so cursors handed out before
+a compaction stay valid. iter_records() reads through both transparently.
+
+The legacy attendance.json is migrated once, on first start, and left in place.
+"""
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from datetime import date
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from attendance_archive import AttendanceArchive, archivable, day_ordinal
+
+try:
+    import fcntl
+except ImportError:   # Windows: in-process locking only
+    fcntl = None
+
+HEADER_PREFIX = b'{"_archived_offset":'
+
+
+class AttendanceLog:
+    def __init__(self, path: str, legacy_path: Optional[str] = None,
+                 fsync_every: int = 32, fsync_interval: float = 1.0,
+                 lock_observer: Optional[Callable[[float, float], None]] = None,
+                 archive: Optional[AttendanceArchive] = None):
+        self.path = path
+        self.archive = archive
+        self.legacy_path = legacy_path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.lock_observer = lock_observer   # called with (wait, hold) seconds of each outermost write lock
+        self._lock = threading.RLock()
+        self._lock_depth = 0       # re-entrant flock: only the outermost holder locks the file
+        self._pending = 0          # appended records not yet fsync'd
+        self._offset = 0           # bytes of the log already fed to listeners
+        self._listeners = []
+        self._layout = (None, 0, 0)  # (inode, archived offset, header bytes) of the last file seen
+        self._closed = threading.Event()
+
+        self._migrate()
+        self._fh = open(self.path, "ab", buffering=0)
+        self._ino = os.fstat(self._fh.fileno()).st_ino   # file the listeners were fed from
+        self._flusher = threading.Thread(target=self._flush_loop, name="attendance-fsync", daemon=True)
+        self._flusher.start()
+
+    # -------------------------
+    # Locking / durability
+    # -------------------------
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive lock across threads and processes."""
+        requested = time.perf_counter()
+        with self._lock:
+            outermost = self._lock_depth == 0
+            if fcntl is not None and outermost:
+                fcntl.flock(self._fh.fileno(), fcntl.LOCK_EX)
+                while os.fstat(self._fh.fileno()).st_ino != os.stat(self.path).st_ino:
+                    # replaced (compacted or reset) by another worker while we waited
+                    self._reopen()
+            acquired = time.perf_counter()
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                if fcntl is not None and self._lock_depth == 0:
+                    fcntl.flock(self._fh.fileno(), fcntl.LOCK_UN)
+                if outermost and self.lock_observer is not None:
+                    self.lock_observer(acquired - requested, time.perf_counter() - acquired)
+
+    @contextmanager
+    def transaction(self):
+        """Hold the write lock with listeners caught up to the end of the log.
+
+        Check-then-append sequences (e.g. the duplicate-mark check) run inside
+        this so no other thread or worker can append in between.
+        """
+        with self._file_lock():
+            self.refresh()
+            yield
+
+    def flush(self):
+        with self._lock:
+            if self._pending:
+                os.fsync(self._fh.fileno())
+                self._pending = 0
+
+    def _flush_loop(self):
+        while not self._closed.wait(self.fsync_interval):
+            try:
+                self.flush()
+            except Exception:
+                pass
+
+    def close(self):
+        self._closed.set()
+        self.flush()
+        self._fh.close()
+
+    def _reopen(self):
+        """Switch the append handle to the file now at `path`, taking over the flock (lock held)."""
+        fh = open(self.path, "ab", buffering=0)
+        if fcntl is not None:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+        old, self._fh = self._fh, fh
+        old.close()
+
+    def _replace(self, data: bytes):
+        """Atomically swap the log file for `data` (call with the file lock held)."""
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self._reopen()
+        self._pending = 0
+
+    # -------------------------
+    # Migration
+    # -------------------------
+    def _migrate(self):
+        if os.path.exists(self.path):
+            return
+        records = []
+        if self.legacy_path and os.path.exists(self.legacy_path):
+            try:
+                with open(self.legacy_path, "r", encoding="utf-8") as f:
+                    records = json.load(f)
+            except Exception:
+                records = []
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(b"".join(self._encode(r) for r in records))
+            f.flush()
+            os.fsync(f.fileno())
+        # link() fails if another worker migrated first; keep whichever landed
+        try:
+            os.link(tmp, self.path)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(tmp)
+
+    # -------------------------
+    # Write
+    # -------------------------
+    @staticmethod
+    def _encode(record: dict) -> bytes:
+        return (json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+    def append(self, record: dict):
+        self.append_many([record])
+
+    def append_many(self, records: Iterable[dict]):
+        """Append records with a single write() so they land contiguously."""
+        records = list(records)
+        data = b"".join(self._encode(r) for r in records)
+        if not data:
+            return
+        with self._file_lock():
+            self.refresh()
+            size = self.size()
+            if size != self._offset:
+                # torn line left by a crashed writer: terminate it so readers skip it
+                data = b"\n" + data
+            self._fh.write(data)
+            self._offset = size + len(data)
+            self._pending += len(records)
+            if self._pending >= self.fsync_every:
+                self.flush()
+            self._notify(records)
+
+    def reset(self):
+        with self._file_lock():
+            if self.archive is not None:
+                self.archive.clear()
+            self._replace(b"")
+            self._restart()
+
+    def compact(self, before: str) -> Optional[dict]:
+        """Move the records dated before `before` (YYYY-MM-DD, at most today) at the head of the
+        log into a new archive segment and drop them from the log.
+
+        Stops at the first record that is on/after `before` or would not round-trip through the
+        archive columns, so the log stays one contiguous tail. Returns the segment entry, or
+        None if there was nothing to archive. Raises ValueError for a bad or future `before`.
+        """
+        if self.archive is None:
+            raise ValueError("no archive configured")
+        cutoff = day_ordinal(before)
+        if cutoff is None:
+            raise ValueError("before must be YYYY-MM-DD")
+        if cutoff > date.today().toordinal():
+            raise ValueError("only closed days (before today) can be archived")
+        with self._file_lock():
+            self.refresh()
+            self.archive.refresh()
+            moved = []
+            for offset, record in self.iter_records(self.archive.base):
+                if not archivable(record, cutoff):
+                    break
+                moved.append((offset, record))
+            if not moved:
+                return None
+            segment = self.archive.add_segment(moved)
+            base = segment["last_offset"]
+            with open(self.path, "rb") as f:
+                _, file_base, header = self._read_layout(f)
+                f.seek(header + base - file_base)
+                rest = f.read()
+            self._replace(HEADER_PREFIX + b"%d}\n" % base + rest)
+            self._restart()
+        return segment
+
+    # -------------------------
+    # Listeners / tail
+    # -------------------------
+    def subscribe(self, listener):
+        """Register an object with apply(records) and reset(); it is replayed up to the current offset.
+
+        Listeners that also define seed(archive) are handed the archive once and then replayed
+        only the log tail; others are replayed every archived record too. seed() is called on a
+        fresh or just-reset listener.
+        """
+        with self._lock:
+            self.refresh()
+            self._load(listener)
+            self._listeners.append(listener)
+
+    def _load(self, listener):
+        start = 0
+        if self.archive is not None and hasattr(listener, "seed"):
+            with self.archive.lock:
+                self.archive.refresh()
+                listener.seed(self.archive)
+                start = self.archive.base
+            if start > self._offset:
+                # compacted by another worker just now: bring the others up to `start` first
+                self._catch_up()
+        records = [r for off, r in self.iter_records(start) if off <= self._offset]
+        if records:
+            listener.apply(records)
+
+    def _restart(self):
+        """Reset every listener and rebuild it from the archive and the current log file."""
+        listeners, self._listeners = self._listeners, []
+        self._ino = os.stat(self.path).st_ino
+        self._offset = 0
+        self._catch_up()
+        for listener in listeners:
+            listener.reset()
+            self._load(listener)
+            self._listeners.append(listener)
+
+    def _notify(self, records: List[dict]):
+        if records:
+            for listener in self._listeners:
+                listener.apply(records)
+
+    def _catch_up(self):
+        start = self._offset
+        if not self._listeners and self.archive is not None:
+            start = max(start, self.archive.base)   # nobody to feed: skip the archive
+        records = []
+        for offset, record in self.iter_records(start):
+            if self._listeners:
+                records.append(record)
+            self._offset = offset
+        self._notify(records)
+
+    def refresh(self):
+        """Feed listeners any records other workers appended since the last call (one stat() if none)."""
+        with self._lock:
+            ino, size = self._stat()
+            if ino == self._ino and size == self._offset:
+                return
+            if ino != self._ino or size < self._offset:
+                # reset or compacted by another worker: rebuild from scratch
+                self._restart()
+            else:
+                self._catch_up()
+
+    @property
+    def offset(self) -> int:
+        return self._offset
+
+    # -------------------------
+    # Read
+    # -------------------------
+    def _read_layout(self, f) -> Tuple[int, int, int]:
+        """(inode, archived offset, header bytes) of an open log file."""
+        ino = os.fstat(f.fileno()).st_ino
+        f.seek(0)
+        line = f.readline()
+        base = header = 0
+        if line.startswith(HEADER_PREFIX) and line.endswith(b"\n"):
+            base, header = json.loads(line)["_archived_offset"], len(line)
+        self._layout = (ino, base, header)
+        return self._layout
+
+    def _stat(self) -> Tuple[int, int]:
+        """(inode, logical size) of the file at `path`; the header is only re-read for a new file."""
+        st = os.stat(self.path)
+        ino, base, header = self._layout
+        if st.st_ino != ino:
+            with open(self.path, "rb") as f:
+                ino, base, header = self._read_layout(f)
+                st = os.fstat(f.fileno())
+        return ino, base + st.st_size - header
+
+    def iter_records(self, start: int = 0) -> Iterator[Tuple[int, dict]]:
+        """Stream (offset_after_record, record) from logical offset `start`.
+
+        Archived records come first, then the log file. Only complete lines are returned;
+        a torn trailing write is skipped.
+        """
+        with open(self.path, "rb") as f:
+            _, base, header = self._read_layout(f)
+            if self.archive is not None and start < base:
+                self.archive.refresh()
+                for offset, record in self.archive.iter_records(start):
+                    start = offset
+                    yield offset, record
+            f.seek(header + max(0, start - base))
+            offset = max(start, base)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                offset += len(line)
+                try:
+                    yield offset, json.loads(line)
+                except ValueError:
+                    continue
+
+    def all(self) -> List[dict]:
+        return [r for _, r in self.iter_records()]
+
+    def size(self) -> int:
+        """Logical end of the log (archived bytes included)."""
+        return self._stat()[1]
+
+
+class AttendanceIndex:
+    """date -> set of reg_no marked that day; O(1) duplicate-mark checks.
+
+    Subscribed to an AttendanceLog, so it is loaded once and then updated on
+    every append (local or from another worker's log tail).
+    """
+    def __init__(self):
+        self.by_date: Dict[str, Set[str]] = {}
+
+    def apply(self, records: List[dict]):
+        for r in records:
+            reg, date = r.get("reg_no"), r.get("date")
+            if reg and date:
+                self.by_date.setdefault(date, set()).add(reg)
+
+    def reset(self):
+        self.by_date = {}
+
+    def seed(self, archive):
+        """Archived (closed) days take no new marks, so only the log tail is indexed."""
+
+    def has(self, reg_no: str, date: str) -> bool:
+        return reg_no in self.by_date.get(date, ())
+
+    def marked_on(self, date: str) -> Set[str]:
+        return set(self.by_date.get(date, ()))
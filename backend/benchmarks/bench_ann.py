@@ -0,0 +1,99 @@
+# backend/benchmarks/bench_ann.py
+"""Recall/latency of the IVF index against the exact gallery scan.
+
+Usage (from backend/):
+    python benchmarks/bench_ann.py --sizes 10000 50000 --nprobe 4 8 16
+
+Synthetic 128-d encodings are drawn around random identity centres (dlib-like
+scale: same person ~0.3 apart, different people ~1.0+). Each query is a noisy
+copy of an enrolled face, so the exact scan always finds its identity; recall
+is the fraction of queries for which the ANN path returns the same row and
+still confirms it within the tolerance.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gallery import FaceGallery   # noqa: E402
+from ann_index import IVFIndex    # noqa: E402
+
+
+def synthetic_gallery(n: int, dim: int = 128, clusters: int = 64, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(0, 0.07, size=(clusters, dim))
+    labels = rng.integers(0, clusters, size=n)
+    return (centres[labels] + rng.normal(0, 0.06, size=(n, dim))).astype(np.float32)
+
+
+def percentile_ms(samples, q):
+    return round(float(np.percentile(samples, q)) * 1000.0, 3)
+
+
+def run(size: int, nprobes, queries: int, tolerance: float, seed: int = 0):
+    rng = np.random.default_rng(seed + 1)
+    data = synthetic_gallery(size, seed=seed)
+    names = [str(i) for i in range(size)]
+    picks = rng.choice(size, size=queries, replace=False)
+    probes = (data[picks] + rng.normal(0, 0.025, size=(queries, data.shape[1]))).astype(np.float32)
+
+    exact = FaceGallery()
+    exact.load(names, data)
+    exact_times = []
+    exact_best = []
+    for q in probes:
+        t = time.perf_counter()
+        best, _ = exact.match(q[None])
+        exact_times.append(time.perf_counter() - t)
+        exact_best.append(int(best[0]))
+
+    results = {"size": size, "queries": queries,
+               "exact": {"p50_ms": percentile_ms(exact_times, 50), "p99_ms": percentile_ms(exact_times, 99)},
+               "ivf": []}
+    for nprobe in nprobes:
+        index = IVFIndex(nprobe=nprobe, min_size=1)
+        ann = FaceGallery(index=index)
+        t = time.perf_counter()
+        ann.load(names, data)
+        build_s = time.perf_counter() - t
+        times, hits = [], 0
+        for q, truth in zip(probes, exact_best):
+            t = time.perf_counter()
+            best, dist = ann.match(q[None])
+            times.append(time.perf_counter() - t)
+            hits += int(best[0] == truth and dist[0] <= tolerance)
+        results["ivf"].append({
+            "nprobe": nprobe,
+            "nlist": int(index.centroids.shape[0]),
+            "build_s": round(build_s, 3),
+            "recall_at_1": round(hits / queries, 4),
+            "p50_ms": percentile_ms(times, 50),
+            "p99_ms": percentile_ms(times, 99),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 50000])
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 8, 16])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--tolerance", type=float, default=0.5)
+    parser.add_argument("--out", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    report = [run(size, args.nprobe, args.queries, args.tolerance) for size in args.sizes]
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
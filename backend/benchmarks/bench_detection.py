@@ -0,0 +1,140 @@
+# backend/benchmarks/bench_detection.py
+"""Accuracy vs latency of detection pipeline settings on the known_faces images.
+
+Usage (from backend/):
+    python benchmarks/bench_detection.py --models hog haar --widths 160 240 320 480 0 --upsample 0 1
+
+The reference gallery is encoded from the full-resolution known_faces photos
+(as at registration). Each photo is then turned into 640x480 kiosk frames
+with the face at several sizes (and mirrored), and every setting is scored on:
+  - detection rate: frames where at least one face was found
+  - identification rate: frames whose best match is the right student within
+    the tolerance
+  - mean distance to the student's reference encoding
+  - per-frame latency (p50/p95 ms)
+Settings whose detector cannot be built (e.g. dnn without model files) are
+reported with an "error".
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+import cv2
+import numpy as np
+import face_recognition
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from gallery import FaceGallery                              # noqa: E402
+from detection import DetectionPipeline, make_detector       # noqa: E402
+from http_load import KNOWN_FACES_DIR, IMAGE_EXTS, latency_summary   # noqa: E402
+
+
+def reference_gallery(faces_dir: str):
+    names, encodings, images = [], [], {}
+    for fname in sorted(os.listdir(faces_dir)):
+        if not fname.lower().endswith(IMAGE_EXTS):
+            continue
+        path = os.path.join(faces_dir, fname)
+        encs = face_recognition.face_encodings(face_recognition.load_image_file(path))
+        if encs:
+            names.append(fname)
+            encodings.append(encs[0])
+            images[fname] = cv2.imread(path)
+    gallery = FaceGallery()
+    gallery.load(names, encodings)
+    return gallery, images
+
+
+def kiosk_frames(image: np.ndarray, face_fractions, size=(640, 480)):
+    """The photo placed on a 640x480 canvas at each height fraction, plain and mirrored."""
+    w, h = size
+    frames = []
+    for fraction in face_fractions:
+        scale = min(fraction * h / image.shape[0], w / image.shape[1])
+        resized = cv2.resize(image, (max(1, int(image.shape[1] * scale)), max(1, int(image.shape[0] * scale))))
+        for variant in (resized, cv2.flip(resized, 1)):
+            canvas = np.full((h, w, 3), 90, dtype=np.uint8)
+            y, x = (h - variant.shape[0]) // 2, (w - variant.shape[1]) // 2
+            canvas[y:y + variant.shape[0], x:x + variant.shape[1]] = variant
+            ok, buf = cv2.imencode(".jpg", canvas, [cv2.IMWRITE_JPEG_QUALITY, 80])
+            frames.append(cv2.imdecode(buf, cv2.IMREAD_COLOR))
+    return frames
+
+
+def run(setting: dict, gallery: FaceGallery, frames, tolerance: float, args):
+    try:
+        detector = make_detector(setting["model"], setting["upsample"], args.dnn_prototxt, args.dnn_model)
+    except Exception as e:
+        return {**setting, "error": str(e)}
+    pipeline = DetectionPipeline(detector, detect_width=setting["detect_width"], encode_size=setting["encode_size"])
+
+    latencies, detected, identified, distances = [], 0, 0, []
+    for truth, frame in frames:
+        started = time.perf_counter()
+        result = pipeline.run(frame)
+        latencies.append(time.perf_counter() - started)
+        if result["status"] != "ok":
+            continue
+        detected += 1
+        matches = gallery.match_names(result["encodings"], tolerance)
+        if any(name == truth for name, _ in matches):
+            identified += 1
+        ref = gallery.matrix[gallery.names.index(truth)]
+        distances.append(min(float(np.linalg.norm(np.asarray(e) - ref)) for e in result["encodings"]))
+
+    n = len(frames)
+    summary = latency_summary(latencies)
+    return {
+        **setting,
+        "frames": n,
+        "detection_rate": round(detected / n, 4),
+        "identification_rate": round(identified / n, 4),
+        "mean_distance": round(float(np.mean(distances)), 4) if distances else None,
+        "p50_ms": summary.get("p50_ms"),
+        "p95_ms": summary.get("p95_ms"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--models", nargs="+", default=["hog", "haar"])
+    parser.add_argument("--widths", nargs="+", type=int, default=[160, 240, 320, 480, 0],
+                        help="detection widths in px (0 = full frame)")
+    parser.add_argument("--upsample", nargs="+", type=int, default=[0, 1], help="dlib upsample counts (hog/cnn)")
+    parser.add_argument("--encode-sizes", nargs="+", type=int, default=[160])
+    parser.add_argument("--face-fractions", nargs="+", type=float, default=[0.9, 0.6, 0.4, 0.25],
+                        help="face photo height as a fraction of the 480 px frame")
+    parser.add_argument("--tolerance", type=float, default=0.5)
+    parser.add_argument("--faces-dir", default=KNOWN_FACES_DIR)
+    parser.add_argument("--dnn-prototxt", default=os.path.join("models", "deploy.prototxt"))
+    parser.add_argument("--dnn-model", default=os.path.join("models", "res10_300x300_ssd_iter_140000.caffemodel"))
+    parser.add_argument("--out", help="also write the JSON report here")
+    args = parser.parse_args()
+
+    gallery, images = reference_gallery(args.faces_dir)
+    frames = [(name, frame) for name, image in images.items()
+              for frame in kiosk_frames(image, args.face_fractions)]
+
+    results = []
+    for model in args.models:
+        for width in args.widths:
+            for upsample in (args.upsample if model in ("hog", "cnn") else [0]):
+                for encode_size in args.encode_sizes:
+                    setting = {"model": model, "detect_width": width, "upsample": upsample,
+                               "encode_size": encode_size}
+                    results.append(run(setting, gallery, frames, args.tolerance, args))
+
+    report = {"students": len(gallery), "frames": len(frames), "tolerance": args.tolerance, "results": results}
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
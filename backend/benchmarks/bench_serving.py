@@ -0,0 +1,140 @@
+# backend/benchmarks/bench_serving.py
+"""p50/p99 latency of the WSGI (gunicorn gthread) vs ASGI (uvicorn) serving modes.
+
+Usage (from backend/):
+    python benchmarks/bench_serving.py --modes wsgi asgi --kiosks 20 --dashboards 10 --duration 60
+    python benchmarks/bench_serving.py --url http://127.0.0.1:5000 --duration 30
+
+Each mode is started on a scratch copy of backend/ (real attendance data is
+never touched). Kiosk threads post known_faces frames as raw JPEG every
+`--kiosk-interval` seconds (the kiosk page's 3 s cadence by default, with a
+random phase); dashboard threads poll /get_students, /analytics_data (with
+If-None-Match, like the analytics page) and /student_photo in a loop.
+Prints per-endpoint latency / error stats per mode as JSON.
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import threading
+import urllib.parse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import http_load   # noqa: E402
+
+SERVER_CMDS = {
+    "wsgi": lambda port, workers=1: ["gunicorn", "app:app", "--workers", str(workers), "--worker-class", "gthread",
+                                     "--threads", "16", "--bind", f"127.0.0.1:{port}"],
+    "asgi": lambda port, workers=1: ["uvicorn", "asgi:app", "--host", "127.0.0.1", "--port", str(port),
+                                     "--workers", str(workers), "--log-level", "warning"],
+}
+
+
+def kiosk_loop(base_url, frames, interval, stop, recorder, kiosk_id, seed):
+    rng = random.Random(seed)
+    stop.wait(rng.uniform(0, interval))
+    while not stop.is_set():
+        started = time.monotonic()
+        res = http_load.post_frame(base_url, rng.choice(frames), kiosk_id)
+        recorder.record("mark_attendance", res.status, res.seconds)
+        stop.wait(max(0.0, interval - (time.monotonic() - started)))
+
+
+def dashboard_loop(base_url, photos, interval, stop, recorder, seed):
+    rng = random.Random(seed)
+    etag = None
+    while not stop.is_set():
+        res = http_load.timed_request(base_url + "/get_students")
+        recorder.record("get_students", res.status, res.seconds)
+
+        res = http_load.timed_request(base_url + "/analytics_data",
+                                      headers={"If-None-Match": etag} if etag else {})
+        recorder.record("analytics_data", res.status, res.seconds)
+        if res.status == 200:
+            etag = res.headers.get("ETag")
+
+        if photos:
+            res = http_load.timed_request(base_url + "/student_photo/" + urllib.parse.quote(rng.choice(photos)))
+            recorder.record("student_photo", res.status, res.seconds)
+        stop.wait(interval)
+
+
+def run_load(base_url, frames, photos, kiosks, dashboards, duration, kiosk_interval, dashboard_interval):
+    recorder = http_load.LatencyRecorder()
+    stop = threading.Event()
+    threads = [
+        threading.Thread(target=kiosk_loop, daemon=True,
+                         args=(base_url, frames, kiosk_interval, stop, recorder, f"kiosk-{i}", i))
+        for i in range(kiosks)
+    ] + [
+        threading.Thread(target=dashboard_loop, daemon=True,
+                         args=(base_url, photos, dashboard_interval, stop, recorder, 1000 + i))
+        for i in range(dashboards)
+    ]
+    started = time.monotonic()
+    for t in threads:
+        t.start()
+    stop.wait(duration)
+    stop.set()
+    for t in threads:
+        t.join(timeout=60)
+    return recorder.report(time.monotonic() - started)
+
+
+def run_mode(mode, port, args, frames, photos):
+    workdir = http_load.scratch_backend()
+    proc = http_load.start_server(SERVER_CMDS[mode](port), cwd=workdir,
+                                  env={"RECOGNITION_PROCESSES": str(args.processes)})
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        if not http_load.wait_ready(base_url, timeout=args.startup_timeout):
+            return {"error": "server did not become ready"}
+        return run_load(base_url, frames, photos, args.kiosks, args.dashboards, args.duration,
+                        args.kiosk_interval, args.dashboard_interval)
+    finally:
+        http_load.stop_server(proc)
+        shutil.rmtree(os.path.dirname(workdir), ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", nargs="+", choices=sorted(SERVER_CMDS), default=["wsgi", "asgi"])
+    parser.add_argument("--url", help="benchmark an already running server instead of starting one")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--kiosks", type=int, default=20)
+    parser.add_argument("--dashboards", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=60.0)
+    parser.add_argument("--kiosk-interval", type=float, default=3.0)
+    parser.add_argument("--dashboard-interval", type=float, default=0.5)
+    parser.add_argument("--processes", default="0", help="RECOGNITION_PROCESSES for started servers")
+    parser.add_argument("--startup-timeout", type=float, default=120.0)
+    parser.add_argument("--out", help="also write the JSON report here")
+    args = parser.parse_args()
+
+    faces = http_load.load_frames()
+    frames = faces["known"] + faces["no_face"]
+    photos = sorted(f for f in os.listdir(http_load.KNOWN_FACES_DIR)
+                    if f.lower().endswith(http_load.IMAGE_EXTS))
+    config = {k: getattr(args, k) for k in ("kiosks", "dashboards", "duration",
+                                            "kiosk_interval", "dashboard_interval", "processes")}
+
+    if args.url:
+        results = {"external": run_load(args.url.rstrip("/"), frames, photos, args.kiosks, args.dashboards,
+                                        args.duration, args.kiosk_interval, args.dashboard_interval)}
+    else:
+        results = {mode: run_mode(mode, args.port + i, args, frames, photos) for i, mode in enumerate(args.modes)}
+
+    report = {"config": config, "results": results}
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+# backend/benchmarks/bench_suite.py
+"""Stage-by-stage benchmark of the recognition and storage hot paths (offline).
+
+Usage (from backend/):
+    python benchmarks/bench_suite.py --out results.json
+    python benchmarks/bench_suite.py --gallery-sizes 1000 100000 --history-rows 10000 10000000
+    python benchmarks/bench_suite.py --baseline old.json        # adds p50 ratios vs an earlier run
+
+Sections:
+  mark_attendance   per-stage latency on kiosk frames built from known_faces/:
+                    base64 decode, JPEG decode, gate probe, frame hash, resize,
+                    detection, encoding (or detect+encode for backends without a
+                    separate pipeline), gallery match, attendance commit
+  matching          gallery match of 1 and 8 queries against synthetic galleries
+  storage           per synthetic attendance history: log replay into the
+                    duplicate index and analytics aggregates, commit, analytics
+                    snapshot/etag/incremental update, CSV export, one page read,
+                    date-range analytics, then compaction into the columnar
+                    archive and the same startup/range/export on archive + tail
+Everything runs in a temporary directory; no server and no network needed.
+The 10^7-row history needs a few GB of RAM for the in-memory indexes.
+"""
+import io
+import os
+import sys
+import csv
+import json
+import time
+import base64
+import shutil
+import platform
+import argparse
+import tempfile
+from datetime import date, timedelta
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from http_load import KNOWN_FACES_DIR, IMAGE_EXTS, kiosk_frame, latency_summary   # noqa: E402
+from bench_ann import synthetic_gallery                                          # noqa: E402
+from gallery import FaceGallery                                                  # noqa: E402
+from attendance_store import AttendanceLog, AttendanceIndex                     # noqa: E402
+from attendance_archive import AttendanceArchive, AttendanceColumns              # noqa: E402
+from student_directory import StudentDirectory                                  # noqa: E402
+from analytics import AttendanceAggregates, range_analytics                     # noqa: E402
+from frame_gate import FrameProbe                                               # noqa: E402
+from recognition_cache import frame_hash                                        # noqa: E402
+from embeddings import get_backend, spec_from_env                               # noqa: E402
+
+
+def timed(fn, repeat: int):
+    """latency_summary of `repeat` calls (the last result is returned too)."""
+    samples, result = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - started)
+    return latency_summary(samples), result
+
+
+def once(fn):
+    started = time.perf_counter()
+    result = fn()
+    return round((time.perf_counter() - started) * 1000.0, 2), result
+
+
+# -------------------------
+# mark_attendance stages
+# -------------------------
+def bench_mark_attendance(workdir: str, repeat: int, gallery_size: int):
+    backend = get_backend(spec_from_env(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+    pipeline = getattr(backend, "pipeline", None)
+    photos = [cv2.imread(os.path.join(KNOWN_FACES_DIR, f)) for f in sorted(os.listdir(KNOWN_FACES_DIR))
+              if f.lower().endswith(IMAGE_EXTS)]
+    jpegs = [kiosk_frame(p) for p in photos if p is not None]
+    data_urls = ["data:image/jpeg;base64," + base64.b64encode(j).decode() for j in jpegs]
+
+    gallery = FaceGallery(dim=backend.dim)
+    gallery.load([f"S{i}" for i in range(gallery_size)], synthetic_gallery(gallery_size, dim=backend.dim))
+
+    log = AttendanceLog(os.path.join(workdir, "mark.jsonl"))
+    index = AttendanceIndex()
+    log.subscribe(index)
+    counter = iter(range(10 ** 9))
+
+    def commit():
+        reg = f"S{next(counter)}"
+        with log.transaction():
+            if not index.has(reg, "2025-01-01"):
+                log.append({"name": reg, "reg_no": reg, "date": "2025-01-01", "time": "09:00:00"})
+
+    stages = {}
+    per_frame = {k: [] for k in ("b64_decode", "jpeg_decode", "gate_probe", "frame_hash", "resize",
+                                 "detect", "encode", "detect_encode", "match")}
+    faces = 0
+    for url, jpeg in zip(data_urls, jpegs):
+        matched = len(per_frame["match"])
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            raw = base64.b64decode(url.split(",", 1)[1])
+            t1 = time.perf_counter()
+            frame = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+            t2 = time.perf_counter()
+            FrameProbe(frame)
+            t3 = time.perf_counter()
+            frame_hash(frame)
+            t4 = time.perf_counter()
+            per_frame["b64_decode"].append(t1 - t0)
+            per_frame["jpeg_decode"].append(t2 - t1)
+            per_frame["gate_probe"].append(t3 - t2)
+            per_frame["frame_hash"].append(t4 - t3)
+
+            if pipeline is not None:
+                rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                h, w = rgb.shape[:2]
+                scale = pipeline.detect_width / float(w) if 0 < pipeline.detect_width < w else 1.0
+                t5 = time.perf_counter()
+                small = cv2.resize(rgb, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+                t6 = time.perf_counter()
+                pipeline.detector.detect(small)
+                t7 = time.perf_counter()
+                boxes = pipeline.detect(rgb)
+                t8 = time.perf_counter()
+                encodings = pipeline.encode(rgb, boxes) if boxes else []
+                t9 = time.perf_counter()
+                per_frame["resize"].append(t6 - t5)
+                per_frame["detect"].append(t7 - t6)
+                per_frame["encode"].append(t9 - t8)
+            else:
+                t5 = time.perf_counter()
+                result = backend.detect_and_encode(frame)
+                per_frame["detect_encode"].append(time.perf_counter() - t5)
+                encodings = result.get("encodings", [])
+            if encodings:
+                t10 = time.perf_counter()
+                gallery.match_names(encodings, backend.default_tolerance)
+                per_frame["match"].append(time.perf_counter() - t10)
+        faces += len(per_frame["match"]) > matched
+
+    for name, samples in per_frame.items():
+        if samples:
+            stages[name] = latency_summary(samples)
+    stages["commit"], _ = timed(commit, max(50, repeat * 10))
+    log.close()
+    return {"backend": backend.name, "frames": len(jpegs), "frames_with_face": faces,
+            "gallery_size": gallery_size, "stages": stages}
+
+
+# -------------------------
+# Gallery matching
+# -------------------------
+def bench_matching(sizes, repeat: int):
+    out = {}
+    rng = np.random.default_rng(1)
+    for size in sizes:
+        data = synthetic_gallery(size)
+        gallery = FaceGallery()
+        load_ms, _ = once(lambda: gallery.load([f"S{i}" for i in range(size)], data))
+        queries = data[rng.integers(0, size, 8)] + rng.normal(0, 0.02, (8, 128)).astype(np.float32)
+        single, _ = timed(lambda: gallery.match_names([queries[0]], 0.5), repeat * 10)
+        batch, _ = timed(lambda: gallery.match_names(list(queries), 0.5), repeat * 10)
+        out[str(size)] = {"load_ms": load_ms, "match_1": single, "match_8": batch}
+    return out
+
+
+# -------------------------
+# Attendance storage + analytics + export
+# -------------------------
+def write_history(path: str, rows: int, students: int, seed: int = 0):
+    """Synthetic attendance log: one mark per (student, day) at most, chronological."""
+    rng = np.random.default_rng(seed)
+    per_day = max(1, min(students, int(students * 0.8)))
+    days = -(-rows // per_day)
+    start = date(2020, 1, 1)
+    written = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for d in range(days):
+            day = (start + timedelta(days=d)).isoformat()
+            n = min(per_day, rows - written)
+            regs = rng.choice(students, size=n, replace=False)
+            secs = np.sort(rng.integers(8 * 3600, 17 * 3600, size=n))
+            f.write("".join(
+                f'{{"name":"Student {r}","reg_no":"R{r:07d}","date":"{day}",'
+                f'"time":"{s // 3600:02d}:{s % 3600 // 60:02d}:{s % 60:02d}"}}\n'
+                for r, s in zip(regs.tolist(), secs.tolist())))
+            written += n
+    return days
+
+
+def write_students(path: str, students: int):
+    depts = ["CSE", "ECE", "EEE", "MECH", "CIVIL", "IT"]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump([{"name": f"Student {i}", "reg_no": f"R{i:07d}", "dept": depts[i % len(depts)],
+                    "photo": f"R{i:07d}.jpg", "registered_on": ""} for i in range(students)], f)
+
+
+def bench_storage(workdir: str, rows_list, students: int, repeat: int):
+    out = {}
+    students_file = os.path.join(workdir, "students.json")
+    write_students(students_file, students)
+    for rows in rows_list:
+        path = os.path.join(workdir, f"history-{rows}.jsonl")
+        gen_ms, days = once(lambda: write_history(path, rows, students))
+        result = {"rows": rows, "days": days, "bytes": os.path.getsize(path), "generate_ms": gen_ms}
+
+        directory = StudentDirectory(students_file, lambda s: s)
+        archive_dir = os.path.join(workdir, f"archive-{rows}")
+        log = AttendanceLog(path, archive=AttendanceArchive(archive_dir))
+        index = AttendanceIndex()
+        aggregates = AttendanceAggregates(directory)
+        # startup: one scan to the end of the log, then each subscriber is replayed (parse + apply)
+        result["log_scan_ms"], _ = once(log.refresh)
+        result["replay_index_ms"], _ = once(lambda: log.subscribe(index))
+        result["replay_aggregates_ms"], _ = once(lambda: log.subscribe(aggregates))
+        result["rows_per_s_replay"] = round(rows / max(1e-9, result["replay_aggregates_ms"] / 1000.0))
+
+        counter = iter(range(10 ** 9))
+        today = (date(2020, 1, 1) + timedelta(days=days)).isoformat()
+
+        def commit():
+            reg = f"R{next(counter) % students:07d}"
+            with log.transaction():
+                if not index.has(reg, today):
+                    log.append({"name": reg, "reg_no": reg, "date": today, "time": "09:00:00"})
+
+        result["commit"], _ = timed(commit, max(50, repeat * 10))
+        result["analytics_snapshot"], _ = timed(aggregates.snapshot, repeat)
+        result["analytics_etag"], _ = timed(lambda: aggregates.etag(log.offset), repeat * 10)
+        record = {"name": "x", "reg_no": "R0000001", "date": today, "time": "10:00:00"}
+        result["analytics_apply_1"], _ = timed(lambda: aggregates.apply([record]), repeat * 10)
+
+        def export():
+            si = io.StringIO()
+            writer = csv.writer(si)
+            n = 0
+            for _, a in log.iter_records():
+                writer.writerow([a.get("name", ""), a.get("reg_no", ""), a.get("date", ""), a.get("time", "")])
+                n += 1
+                if n % 500 == 0:
+                    si.seek(0)
+                    si.truncate(0)
+            return n
+
+        result["csv_export_ms"], exported = once(export)
+        result["csv_rows_per_s"] = round(exported / max(1e-9, result["csv_export_ms"] / 1000.0))
+
+        middle = log.size() // 2   # a mid-line start: the torn first line is skipped like a bad record
+
+        def page():
+            items = []
+            for _, a in log.iter_records(middle):
+                items.append(a)
+                if len(items) >= 1000:
+                    break
+            return items
+
+        result["page_1000"], _ = timed(page, repeat)
+
+        columns = AttendanceColumns()
+        log.subscribe(columns)
+        first_day = date(2020, 1, 1).isoformat()
+        result["range_analytics"], _ = timed(lambda: range_analytics(columns, directory, first_day, today), repeat)
+
+        # archive every closed day, then start a second "worker" on archive + tail
+        result["compact_ms"], _ = once(lambda: log.compact(today))
+        result["archive_bytes"] = sum(os.path.getsize(os.path.join(archive_dir, f)) for f in os.listdir(archive_dir))
+        result["log_bytes_after_compact"] = os.path.getsize(path)
+        log.close()
+        log = AttendanceLog(path, archive=AttendanceArchive(archive_dir))
+        aggregates, columns = AttendanceAggregates(directory), AttendanceColumns()
+        result["archived_log_scan_ms"], _ = once(log.refresh)
+        result["archived_replay_aggregates_ms"], _ = once(lambda: log.subscribe(aggregates))
+        log.subscribe(columns)
+        result["archived_range_analytics"], _ = timed(
+            lambda: range_analytics(columns, directory, first_day, today), repeat)
+        result["archived_csv_export_ms"], _ = once(export)
+        log.close()
+        os.remove(path)
+        shutil.rmtree(archive_dir, ignore_errors=True)
+        out[str(rows)] = result
+    return out
+
+
+# -------------------------
+# Comparison
+# -------------------------
+def compare(current, baseline, path=()):
+    """{dotted.path: current_p50 / baseline_p50} for every latency summary present in both."""
+    ratios = {}
+    if isinstance(current, dict) and isinstance(baseline, dict):
+        if "p50_ms" in current and "p50_ms" in baseline and baseline["p50_ms"]:
+            ratios[".".join(path)] = round(current["p50_ms"] / baseline["p50_ms"], 3)
+        for k in current:
+            if k in baseline:
+                ratios.update(compare(current[k], baseline[k], path + (k,)))
+    return ratios
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--gallery-sizes", nargs="+", type=int, default=[1000, 10000, 100000])
+    parser.add_argument("--history-rows", nargs="+", type=int, default=[10000, 100000, 1000000])
+    parser.add_argument("--students", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--sections", nargs="+", default=["mark_attendance", "matching", "storage"],
+                        choices=["mark_attendance", "matching", "storage"])
+    parser.add_argument("--baseline", help="earlier JSON report to compare against")
+    parser.add_argument("--out", help="also write the JSON report here")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="attendance-bench-")
+    report = {"meta": {"python": platform.python_version(), "numpy": np.__version__, "opencv": cv2.__version__,
+                       "platform": platform.platform(), "cpu_count": os.cpu_count(),
+                       "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")}}
+    try:
+        if "mark_attendance" in args.sections:
+            report["mark_attendance"] = bench_mark_attendance(workdir, args.repeat, min(args.gallery_sizes))
+        if "matching" in args.sections:
+            report["matching"] = bench_matching(args.gallery_sizes, args.repeat)
+        if "storage" in args.sections:
+            report["storage"] = bench_storage(workdir, args.history_rows, args.students, args.repeat)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            report["vs_baseline_p50"] = compare(report, json.load(f))
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+# backend/benchmarks/http_load.py
+"""Shared helpers for the HTTP benchmarks: kiosk frames, timed requests, latency stats.
+
+Only the standard library (urllib) is used on the client side, so the load
+generator doesn't compete with the server for the same event loop.
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+import threading
+import subprocess
+import urllib.error
+import urllib.request
+from typing import Dict, List, NamedTuple, Optional
+
+import cv2
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+KNOWN_FACES_DIR = os.path.join(BACKEND_DIR, "known_faces")
+IMAGE_EXTS = (".jpg", ".jpeg", ".png")
+
+# -------------------------
+# Frames (same 640x480 JPEG @ 0.8 the kiosk page sends)
+# -------------------------
+def kiosk_frame(image: np.ndarray, size=(640, 480), quality: int = 80) -> bytes:
+    w, h = size
+    canvas = np.zeros((h, w, 3), dtype=np.uint8)
+    scale = min(w / image.shape[1], h / image.shape[0])
+    resized = cv2.resize(image, (int(image.shape[1] * scale), int(image.shape[0] * scale)))
+    y, x = (h - resized.shape[0]) // 2, (w - resized.shape[1]) // 2
+    canvas[y:y + resized.shape[0], x:x + resized.shape[1]] = resized
+    return cv2.imencode(".jpg", canvas, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes()
+
+
+def read_faces(faces_dir: str) -> List[np.ndarray]:
+    """Every readable photo in `faces_dir`, in file order."""
+    images = []
+    for fname in sorted(os.listdir(faces_dir)):
+        if fname.lower().endswith(IMAGE_EXTS):
+            img = cv2.imread(os.path.join(faces_dir, fname))
+            if img is not None:
+                images.append(img)
+    return images
+
+
+def load_frames(faces_dir: str = KNOWN_FACES_DIR, seed: int = 0,
+                unknown_dir: Optional[str] = None) -> Dict[str, List[bytes]]:
+    """{"known": [...], "no_face": [...], "unknown": [...]} kiosk frames.
+
+    "known" frames are the enrolled photos in `faces_dir`; "unknown" frames are
+    the photos in `unknown_dir`, which must show people who are not enrolled
+    (empty without one).
+    """
+    rng = np.random.default_rng(seed)
+    known = [kiosk_frame(img) for img in read_faces(faces_dir)]
+    blank = np.full((480, 640, 3), 40, dtype=np.uint8)
+    noise = rng.integers(0, 255, size=(480, 640, 3), dtype=np.uint8)
+    no_face = [kiosk_frame(blank), kiosk_frame(cv2.GaussianBlur(noise, (31, 31), 0))]
+    unknown = [kiosk_frame(img) for img in read_faces(unknown_dir)] if unknown_dir else []
+    return {"known": known, "no_face": no_face, "unknown": unknown}
+
+# -------------------------
+# Requests
+# -------------------------
+class Timed(NamedTuple):
+    status: int          # 0 means a connection error / timeout
+    seconds: float
+    body: bytes
+    headers: dict
+
+
+def timed_request(url: str, data: Optional[bytes] = None, headers: Optional[dict] = None,
+                  method: Optional[str] = None, timeout: float = 30.0) -> Timed:
+    req = urllib.request.Request(url, data=data, headers=headers or {}, method=method)
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            body = resp.read()
+            return Timed(resp.status, time.perf_counter() - started, body, dict(resp.headers))
+    except urllib.error.HTTPError as e:
+        return Timed(e.code, time.perf_counter() - started, e.read(), dict(e.headers or {}))
+    except Exception:
+        return Timed(0, time.perf_counter() - started, b"", {})
+
+
+def post_frame(base_url: str, frame: bytes, kiosk_id: Optional[str] = None) -> Timed:
+    headers = {"Content-Type": "image/jpeg"}
+    if kiosk_id:
+        headers["X-Kiosk-Id"] = kiosk_id
+    return timed_request(base_url + "/mark_attendance", data=frame, headers=headers)
+
+
+def wait_ready(base_url: str, path: str = "/readyz", timeout: float = 120.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if timed_request(base_url + path, timeout=2.0).status == 200:
+            return True
+        time.sleep(0.5)
+    return False
+
+# -------------------------
+# Stats
+# -------------------------
+def latency_summary(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {"count": 0}
+    arr = np.asarray(samples) * 1000.0
+    return {
+        "count": int(arr.size),
+        "p50_ms": round(float(np.percentile(arr, 50)), 2),
+        "p95_ms": round(float(np.percentile(arr, 95)), 2),
+        "p99_ms": round(float(np.percentile(arr, 99)), 2),
+        "mean_ms": round(float(arr.mean()), 2),
+        "max_ms": round(float(arr.max()), 2),
+    }
+
+
+class LatencyRecorder:
+    """Thread-safe per-endpoint latency and error counts."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    def record(self, endpoint: str, status: int, seconds: float):
+        with self._lock:
+            self.samples.setdefault(endpoint, []).append(seconds)
+            if status == 0 or status >= 500:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def report(self, duration: float) -> Dict[str, dict]:
+        with self._lock:
+            out = {}
+            for endpoint, samples in sorted(self.samples.items()):
+                summary = latency_summary(samples)
+                summary["errors"] = self.errors.get(endpoint, 0)
+                summary["error_rate"] = round(summary["errors"] / max(1, len(samples)), 4)
+                summary["throughput_rps"] = round(len(samples) / duration, 2) if duration else 0.0
+                out[endpoint] = summary
+            return out
+
+# -------------------------
+# Server under test (runs on a scratch copy of backend/ so real data is untouched)
+# -------------------------
+def scratch_backend() -> str:
+    workdir = tempfile.mkdtemp(prefix="attendance-bench-")
+    target = os.path.join(workdir, "backend")
+    shutil.copytree(BACKEND_DIR, target, ignore=shutil.ignore_patterns(
+        "__pycache__", "snapshots", "thumb_cache", "attendance.jsonl", "archive"))
+    shutil.copytree(os.path.join(os.path.dirname(BACKEND_DIR), "frontend"), os.path.join(workdir, "frontend"))
+    return target
+
+
+def start_server(cmd: List[str], cwd: str, env: Optional[dict] = None) -> subprocess.Popen:
+    return subprocess.Popen(cmd, cwd=cwd, env={**os.environ, **(env or {})},
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def stop_server(proc: subprocess.Popen):
+    proc.terminate()
+    try:
+        proc.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+PYTHON = sys.executable
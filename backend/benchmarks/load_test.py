@@ -0,0 +1,318 @@
+# backend/benchmarks/load_test.py
+"""Kiosk traffic replay: N kiosks + dashboards against one server, then a consistency check.
+
+Usage (from backend/):
+    python benchmarks/load_test.py --kiosks 30 --dashboards 5 --duration 120
+    python benchmarks/load_test.py --mode asgi --workers 4 --mix known=0.5,unknown=0.3,no_face=0.2
+    python benchmarks/load_test.py --url http://127.0.0.1:5000 --duration 60
+
+Each kiosk posts a raw JPEG to /mark_attendance every `--kiosk-interval`
+seconds (3 s, the kiosk page's cadence, with a random phase). Frames are
+drawn from the --mix of enrolled faces, faces of people who are not enrolled
+("unknown") and frames without a face. A started server enrolls all but the
+last --holdout photo(s) of known_faces/, and the held-out ones are the
+unknown faces; --unknown-faces DIR supplies them instead (needed with --url,
+where the unknown kind is otherwise skipped). Dashboards poll /analytics_data (with
+If-None-Match, like the analytics page) and page through /get_attendance
+(limit=1000, like the admin page's fallback).
+
+The report has throughput, error rate and p50/p95/p99 latency per endpoint,
+and the mark_attendance statuses per frame kind. At the end the attendance
+appended during the run is read back and checked:
+  duplicates      (reg_no, date) marked more than once that day
+  lost            "success" answers with no matching record
+  phantom_exists  "exists" answers for a student with no record that day
+  misidentified   "success"/"exists" answers to an unknown or no-face frame
+  unconfirmed     records whose request got no answer (e.g. timed out); not an error
+A started server is stopped after the run and its attendance log is re-read
+from disk to check that every record seen over HTTP was persisted.
+The exit status is 1 if any check fails.
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import threading
+from collections import Counter
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import http_load                                    # noqa: E402
+from bench_serving import SERVER_CMDS              # noqa: E402
+from attendance_archive import AttendanceArchive   # noqa: E402
+from attendance_store import AttendanceLog         # noqa: E402
+
+FRAME_KINDS = ("known", "unknown", "no_face")
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    mix = {}
+    for part in text.split(","):
+        kind, _, weight = part.partition("=")
+        if kind.strip() not in FRAME_KINDS:
+            raise argparse.ArgumentTypeError(f"unknown frame kind {kind!r} (use {', '.join(FRAME_KINDS)})")
+        mix[kind.strip()] = float(weight)
+    return mix
+
+
+class MarkLog:
+    """Thread-safe tally of /mark_attendance answers for the consistency check."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.statuses: Dict[str, Counter] = {kind: Counter() for kind in FRAME_KINDS}
+        self.success: Counter = Counter()       # reg_no -> "success" answers
+        self.exists: Counter = Counter()        # reg_no -> "exists" answers
+        self.misidentified: Counter = Counter()  # (kind, reg_no) -> marks for a frame with no enrolled face
+        self.unanswered = 0
+
+    def record(self, kind: str, res: http_load.Timed):
+        status = "http_%d" % res.status if res.status != 200 else "invalid_json"
+        data = {}
+        if res.status == 200:
+            try:
+                data = json.loads(res.body)
+                status = data.get("status", "missing_status")
+            except ValueError:
+                pass
+        with self._lock:
+            self.statuses[kind][status] += 1
+            if res.status == 0:
+                self.unanswered += 1
+            if status == "success":
+                self.success[data.get("reg_no")] += 1
+            elif status == "exists":
+                self.exists[data.get("reg_no")] += 1
+            if status in ("success", "exists") and kind != "known":
+                self.misidentified[(kind, data.get("reg_no"))] += 1
+
+
+# -------------------------
+# Load
+# -------------------------
+def kiosk_loop(base_url, frames, mix, interval, stop, recorder, marks, kiosk_id, seed):
+    rng = random.Random(seed)
+    kinds = [k for k in FRAME_KINDS if frames.get(k) and mix.get(k, 0) > 0]
+    weights = [mix[k] for k in kinds]
+    stop.wait(rng.uniform(0, interval))
+    while not stop.is_set():
+        started = time.monotonic()
+        kind = rng.choices(kinds, weights)[0]
+        res = http_load.post_frame(base_url, rng.choice(frames[kind]), kiosk_id)
+        recorder.record("mark_attendance", res.status, res.seconds)
+        marks.record(kind, res)
+        stop.wait(max(0.0, interval - (time.monotonic() - started)))
+
+
+def dashboard_loop(base_url, interval, stop, recorder, seed):
+    rng = random.Random(seed)
+    etag = None
+    stop.wait(rng.uniform(0, interval))
+    while not stop.is_set():
+        res = http_load.timed_request(base_url + "/analytics_data",
+                                      headers={"If-None-Match": etag} if etag else {})
+        recorder.record("analytics_data", res.status, res.seconds)
+        if res.status == 200:
+            etag = res.headers.get("ETag")
+
+        cursor = 0
+        while cursor is not None and not stop.is_set():
+            res = http_load.timed_request(f"{base_url}/get_attendance?limit=1000&cursor={cursor}")
+            recorder.record("get_attendance", res.status, res.seconds)
+            if res.status != 200:
+                break
+            cursor = json.loads(res.body)["next_cursor"]
+        stop.wait(interval)
+
+
+def run_load(base_url, frames, mix, args):
+    recorder = http_load.LatencyRecorder()
+    marks = MarkLog()
+    stop = threading.Event()
+    threads = [
+        threading.Thread(target=kiosk_loop, daemon=True,
+                         args=(base_url, frames, mix, args.kiosk_interval, stop, recorder, marks,
+                               f"kiosk-{i}", args.seed + i))
+        for i in range(args.kiosks)
+    ] + [
+        threading.Thread(target=dashboard_loop, daemon=True,
+                         args=(base_url, args.dashboard_interval, stop, recorder, args.seed + 1000 + i))
+        for i in range(args.dashboards)
+    ]
+    started = time.monotonic()
+    for t in threads:
+        t.start()
+    stop.wait(args.duration)
+    stop.set()
+    for t in threads:
+        t.join(timeout=60)
+    duration = time.monotonic() - started
+    return recorder.report(duration), marks, duration
+
+# -------------------------
+# Consistency
+# -------------------------
+def log_cursor(base_url: str) -> int:
+    """End of the attendance log as the server sees it."""
+    res = http_load.timed_request(base_url + "/analytics_data")
+    if res.status != 200:
+        raise RuntimeError(f"/analytics_data answered {res.status}")
+    return int(res.headers.get("X-Attendance-Cursor", 0))
+
+
+def fetch_records(base_url: str, query: str = "", cursor: int = 0) -> List[dict]:
+    records = []
+    while cursor is not None:
+        res = http_load.timed_request(f"{base_url}/get_attendance?limit=1000&cursor={cursor}{query}")
+        if res.status != 200:
+            raise RuntimeError(f"/get_attendance answered {res.status}")
+        page = json.loads(res.body)
+        records.extend(page["items"])
+        cursor = page["next_cursor"]
+    return records
+
+
+def check_consistency(base_url: str, start_cursor: int, marks: MarkLog, run_dates: List[str]) -> dict:
+    new = fetch_records(base_url, cursor=start_cursor)
+    dates = sorted({r.get("date", "") for r in new} | set(run_dates))
+    # every record on the run's dates, so marks made before the run count towards duplicates too
+    per_day = Counter((r.get("reg_no"), r.get("date"))
+                      for r in fetch_records(base_url, f"&from={dates[0]}&to={dates[-1]}"))
+    marked_regs = {reg for reg, _ in per_day}
+    new_per_reg = Counter(r.get("reg_no") for r in new)
+
+    duplicates = sorted([reg, date, n] for (reg, date), n in per_day.items() if n > 1)
+    lost = sorted([reg, n - new_per_reg.get(reg, 0)] for reg, n in marks.success.items()
+                  if n > new_per_reg.get(reg, 0))
+    phantom = sorted(reg for reg in marks.exists if reg not in marked_regs)
+    unconfirmed = sorted([reg, n - marks.success.get(reg, 0)] for reg, n in new_per_reg.items()
+                         if n > marks.success.get(reg, 0))
+    misidentified = sorted([kind, reg, n] for (kind, reg), n in marks.misidentified.items())
+    return {
+        "new_records": len(new),
+        "success_answers": sum(marks.success.values()),
+        "duplicates": duplicates,
+        "lost": lost,
+        "phantom_exists": phantom,
+        "misidentified": misidentified,
+        "unconfirmed": unconfirmed,
+        "unanswered_requests": marks.unanswered,
+        "ok": not (duplicates or lost or phantom or misidentified),
+    }
+
+
+def check_on_disk(backend_dir: str, start_cursor: int, expected: int) -> dict:
+    """Re-read the stopped server's attendance log (and archive) from disk."""
+    log = AttendanceLog(os.path.join(backend_dir, "attendance.jsonl"),
+                        archive=AttendanceArchive(os.path.join(backend_dir, "archive")))
+    try:
+        on_disk = sum(1 for _ in log.iter_records(start_cursor))
+    finally:
+        log.close()
+    return {"records": on_disk, "expected": expected, "ok": on_disk == expected}
+
+def hold_out_faces(backend_dir: str, count: int) -> str:
+    """Un-enroll the last `count` photos of a scratch backend: move them out of known_faces/
+    and drop their students from students.json. Returns the directory they were moved to."""
+    faces_dir = os.path.join(backend_dir, "known_faces")
+    unknown_dir = os.path.join(os.path.dirname(backend_dir), "unknown_faces")
+    os.makedirs(unknown_dir, exist_ok=True)
+    photos = sorted(f for f in os.listdir(faces_dir) if f.lower().endswith(http_load.IMAGE_EXTS))
+    held = photos[len(photos) - count:] if count > 0 else []
+    if len(held) >= len(photos):
+        raise ValueError(f"--holdout {count} would leave no enrolled photo (known_faces/ has {len(photos)})")
+    for fname in held:
+        shutil.move(os.path.join(faces_dir, fname), os.path.join(unknown_dir, fname))
+    students_file = os.path.join(backend_dir, "students.json")
+    with open(students_file, "r", encoding="utf-8") as f:
+        students = json.load(f)
+    with open(students_file, "w", encoding="utf-8") as f:
+        json.dump([s for s in students if s.get("photo") not in held], f, indent=2)
+    return unknown_dir
+
+# -------------------------
+# Main
+# -------------------------
+def run(base_url: str, frames, mix, args, backend_dir: Optional[str] = None, proc=None) -> dict:
+    if not http_load.wait_ready(base_url, timeout=args.startup_timeout):
+        return {"error": "server did not become ready"}
+    start_cursor = log_cursor(base_url)
+    run_dates = [time.strftime("%Y-%m-%d")]
+    endpoints, marks, duration = run_load(base_url, frames, mix, args)
+    run_dates.append(time.strftime("%Y-%m-%d"))
+    consistency = check_consistency(base_url, start_cursor, marks, run_dates)
+    report = {
+        "duration_s": round(duration, 2),
+        "endpoints": endpoints,
+        "mark_statuses": {kind: dict(c) for kind, c in marks.statuses.items() if c},
+        "consistency": consistency,
+    }
+    if proc is not None:
+        http_load.stop_server(proc)
+        consistency["on_disk"] = check_on_disk(backend_dir, start_cursor, consistency["new_records"])
+        consistency["ok"] = consistency["ok"] and consistency["on_disk"]["ok"]
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="load an already running server instead of starting one")
+    parser.add_argument("--mode", choices=sorted(SERVER_CMDS), default="wsgi")
+    parser.add_argument("--workers", type=int, default=1, help="server worker processes")
+    parser.add_argument("--port", type=int, default=5057)
+    parser.add_argument("--kiosks", type=int, default=20)
+    parser.add_argument("--dashboards", type=int, default=3)
+    parser.add_argument("--duration", type=float, default=60.0)
+    parser.add_argument("--kiosk-interval", type=float, default=3.0)
+    parser.add_argument("--dashboard-interval", type=float, default=5.0)
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("known=0.6,unknown=0.2,no_face=0.2"),
+                        help="frame kind weights, e.g. known=0.6,unknown=0.2,no_face=0.2")
+    parser.add_argument("--holdout", type=int, default=1,
+                        help="photos of known_faces/ a started server does not enroll; they are the unknown faces")
+    parser.add_argument("--unknown-faces", help="directory of photos of people who are not enrolled")
+    parser.add_argument("--processes", default="0", help="RECOGNITION_PROCESSES for a started server")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--startup-timeout", type=float, default=120.0)
+    parser.add_argument("--out", help="also write the JSON report here")
+    args = parser.parse_args()
+
+    config = {k: getattr(args, k) for k in ("mode", "workers", "kiosks", "dashboards", "duration",
+                                            "kiosk_interval", "dashboard_interval", "mix", "processes")}
+
+    if args.url:
+        frames = http_load.load_frames(seed=args.seed, unknown_dir=args.unknown_faces)
+        config["mode"] = config["workers"] = None
+        config["frames"] = {kind: len(frames[kind]) for kind in FRAME_KINDS}
+        report = run(args.url.rstrip("/"), frames, args.mix, args)
+    else:
+        workdir = http_load.scratch_backend()
+        try:
+            unknown_dir = args.unknown_faces or hold_out_faces(workdir, args.holdout)
+        except ValueError as e:
+            shutil.rmtree(os.path.dirname(workdir), ignore_errors=True)
+            parser.error(str(e))
+        frames = http_load.load_frames(os.path.join(workdir, "known_faces"), args.seed, unknown_dir)
+        config["frames"] = {kind: len(frames[kind]) for kind in FRAME_KINDS}
+        proc = http_load.start_server(SERVER_CMDS[args.mode](args.port, args.workers), cwd=workdir,
+                                      env={"RECOGNITION_PROCESSES": str(args.processes)})
+        try:
+            report = run(f"http://127.0.0.1:{args.port}", frames, args.mix, args, workdir, proc)
+        finally:
+            http_load.stop_server(proc)
+            shutil.rmtree(os.path.dirname(workdir), ignore_errors=True)
+
+    text = json.dumps({"config": config, **report}, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    if not report.get("consistency", {}).get("ok", False):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+# backend/detection.py
+"""Configurable face detection + encoding pipeline.
+
+Detection runs on an aggressively downscaled copy of the frame (detection
+cost grows with pixel count; a kiosk face stays large enough at ~320 px
+width). Boxes are mapped back to full resolution and only the face crops are
+encoded, each resized so the face is about `encode_size` pixels (dlib aligns
+faces to a 150 px chip, so more resolution is wasted and less loses detail).
+
+Detectors:
+  hog   dlib HOG (face_recognition default, CPU)
+  cnn   dlib MMOD CNN (accurate, needs a GPU to be fast)
+  haar  OpenCV Haar cascade (fastest, least accurate)
+  dnn   OpenCV DNN res10 SSD (Caffe model files supplied by the deployment)
+"""
+import os
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+Box = Tuple[int, int, int, int]   # (top, right, bottom, left), face_recognition order
+
+DETECTORS = ("hog", "cnn", "haar", "dnn")
+
+
+def load_face_recognition():
+    """face_recognition, imported on first use (importing it loads dlib and its models, the bulk of startup time)."""
+    import face_recognition
+    return face_recognition
+
+
+class Detector:
+    name = ""
+
+    def detect(self, rgb: np.ndarray) -> List[Box]:
+        raise NotImplementedError
+
+
+class DlibDetector(Detector):
+    def __init__(self, model: str = "hog", upsample: int = 1):
+        self.name = model
+        self.upsample = upsample
+
+    def detect(self, rgb):
+        return load_face_recognition().face_locations(rgb, number_of_times_to_upsample=self.upsample, model=self.name)
+
+
+class HaarDetector(Detector):
+    name = "haar"
+
+    def __init__(self, cascade: Optional[str] = None, min_neighbors: int = 5):
+        if not hasattr(cv2, "CascadeClassifier"):
+            # OpenCV 5 moved Haar cascades to opencv-contrib
+            raise ValueError("Haar detector needs OpenCV 4.x or opencv-contrib-python")
+        cascade = cascade or os.path.join(cv2.data.haarcascades, "haarcascade_frontalface_default.xml")
+        self.classifier = cv2.CascadeClassifier(cascade)
+        if self.classifier.empty():
+            raise ValueError(f"Cannot load Haar cascade: {cascade}")
+        self.min_neighbors = min_neighbors
+
+    def detect(self, rgb):
+        gray = cv2.equalizeHist(cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY))
+        found = self.classifier.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=self.min_neighbors,
+                                                 minSize=(24, 24))
+        return [(int(y), int(x + w), int(y + h), int(x)) for (x, y, w, h) in found]
+
+
+class DnnDetector(Detector):
+    name = "dnn"
+
+    def __init__(self, prototxt: str, model: str, confidence: float = 0.6):
+        if not (os.path.exists(prototxt) and os.path.exists(model)):
+            raise ValueError(f"DNN detector needs {prototxt} and {model}")
+        self.net = cv2.dnn.readNetFromCaffe(prototxt, model)
+        self.confidence = confidence
+
+    def detect(self, rgb):
+        h, w = rgb.shape[:2]
+        bgr = cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
+        blob = cv2.dnn.blobFromImage(cv2.resize(bgr, (300, 300)), 1.0, (300, 300), (104.0, 177.0, 123.0))
+        self.net.setInput(blob)
+        out = self.net.forward()[0, 0]
+        boxes = []
+        for row in out[out[:, 2] >= self.confidence]:
+            left, top, right, bottom = (row[3:7] * np.array([w, h, w, h])).astype(int)
+            left, top = max(0, left), max(0, top)
+            right, bottom = min(w, right), min(h, bottom)
+            if right - left > 4 and bottom - top > 4:
+                boxes.append((int(top), int(right), int(bottom), int(left)))
+        return boxes
+
+
+def make_detector(model: str = "hog", upsample: int = 1, dnn_prototxt: str = "", dnn_model: str = "",
+                  dnn_confidence: float = 0.6) -> Detector:
+    if model in ("hog", "cnn"):
+        return DlibDetector(model, upsample)
+    if model == "haar":
+        return HaarDetector()
+    if model == "dnn":
+        return DnnDetector(dnn_prototxt, dnn_model, dnn_confidence)
+    raise ValueError(f"Unknown detector {model!r} (expected one of {', '.join(DETECTORS)})")
+
+
+class DetectionPipeline:
+    def __init__(self, detector: Detector, detect_width: int = 320, encode_size: int = 160,
+                 margin: float = 0.3):
+        self.detector = detector
+        self.detect_width = detect_width      # 0 = detect at full resolution
+        self.encode_size = encode_size        # 0 = encode crops at full resolution
+        self.margin = margin
+
+    def detect(self, rgb: np.ndarray) -> List[Box]:
+        """Face boxes in full-frame pixels, found on the downscaled image."""
+        h, w = rgb.shape[:2]
+        scale = self.detect_width / float(w) if 0 < self.detect_width < w else 1.0
+        small = cv2.resize(rgb, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale != 1.0 else rgb
+        boxes = []
+        for top, right, bottom, left in self.detector.detect(small):
+            top, right, bottom, left = (int(round(v / scale)) for v in (top, right, bottom, left))
+            top, left = max(0, top), max(0, left)
+            bottom, right = min(h, bottom), min(w, right)
+            if bottom > top and right > left:
+                boxes.append((top, right, bottom, left))
+        return boxes
+
+    def encode(self, rgb: np.ndarray, boxes: Sequence[Box]) -> List[np.ndarray]:
+        """One encoding per full-frame box, each computed on its own (resized) crop."""
+        encodings = (self.encode_one(rgb, box) for box in boxes)
+        return [enc for enc in encodings if enc is not None]
+
+    def encode_one(self, rgb: np.ndarray, box: Box) -> Optional[np.ndarray]:
+        h, w = rgb.shape[:2]
+        top, right, bottom, left = box
+        side = max(bottom - top, right - left)
+        pad = int(side * self.margin)
+        y0, x0 = max(0, top - pad), max(0, left - pad)
+        y1, x1 = min(h, bottom + pad), min(w, right + pad)
+        crop = rgb[y0:y1, x0:x1]
+        box = (top - y0, right - x0, bottom - y0, left - x0)
+        scale = self.encode_size / float(side) if 0 < self.encode_size < side else 1.0
+        if scale != 1.0:
+            crop = cv2.resize(crop, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            box = tuple(int(round(v * scale)) for v in box)
+        found = load_face_recognition().face_encodings(np.ascontiguousarray(crop), [box])
+        return found[0] if found else None
+
+    def run(self, frame: np.ndarray, partial: bool = False) -> Dict[str, Any]:
+        """Detect and encode faces in a BGR frame (same result shape as recognition.detect_and_encode).
+
+        With `partial`, faces that cannot be encoded are dropped instead of failing the frame.
+        """
+        started = time.perf_counter()
+        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        try:
+            locations = self.detect(rgb)
+        except Exception as e:
+            return {"status": "error", "message": "Face detection error", "detail": str(e)}
+        detected = time.perf_counter()
+        timings = {"detect": detected - started}
+
+        if not locations:
+            return {"status": "no_face", "message": "No face detected", "timings": timings}
+
+        if partial:
+            pairs = [(box, self.encode_one(rgb, box)) for box in locations]
+            locations = [box for box, enc in pairs if enc is not None]
+            encodings = [enc for _, enc in pairs if enc is not None]
+        else:
+            encodings = self.encode(rgb, locations)
+        timings["encode"] = time.perf_counter() - detected
+        if partial and not locations:
+            return {"status": "no_face", "message": "No face detected", "timings": timings}
+        if len(encodings) != len(locations):
+            return {"status": "error", "message": "Encoding failed"}
+        return {"status": "ok", "locations": locations, "encodings": encodings, "timings": timings}
@@ -0,0 +1,201 @@
+# backend/embeddings.py
+"""Pluggable face embedding backends.
+
+A backend turns an enrollment photo into one embedding and a kiosk frame into
+located + embedded faces (the detect_and_encode result shape). Encoding
+stores are kept per backend (encodings/<name>/), since embeddings of
+different models are not comparable, and galleries use the backend's `dim`
+and default match tolerance.
+
+  dlib          face_recognition (dlib ResNet, 128-d); kiosk frames go through
+                the configurable DetectionPipeline
+  insightface   InsightFace model pack via ONNX Runtime (default buffalo_l:
+                SCRFD detector + ArcFace, 512-d, L2-normalized). Optional:
+                pip install insightface onnxruntime
+"""
+import os
+import json
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from detection import DetectionPipeline, load_face_recognition, make_detector
+
+BACKENDS = ("dlib", "insightface")
+
+
+def _largest(boxes):
+    return max(boxes, key=lambda b: (b[2] - b[0]) * (b[1] - b[3]))
+
+
+class EmbeddingBackend:
+    name = ""
+    dim = 0
+    default_tolerance = 0.0   # Euclidean distance under which two embeddings are the same person
+
+    def warm_up(self):
+        """Load whatever the first request would otherwise wait for."""
+
+    def encode_photo(self, image: np.ndarray) -> Tuple[Optional[np.ndarray], Optional[str]]:
+        """(embedding of the largest face in a BGR photo, None) or (None, reason)."""
+        raise NotImplementedError
+
+    def detect_and_encode(self, frame: np.ndarray) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def detect_and_encode_group(self, frame: np.ndarray) -> Dict[str, Any]:
+        """Every face of a high-resolution (classroom) photo; faces that cannot be encoded are dropped."""
+        return self.detect_and_encode(frame)
+
+
+class DlibBackend(EmbeddingBackend):
+    name = "dlib"
+    dim = 128
+    default_tolerance = 0.5
+
+    def __init__(self, detection: Optional[dict] = None):
+        detection = dict(detection or {})
+        detect_width = detection.pop("detect_width", 320)
+        encode_size = detection.pop("encode_size", 160)
+        group_width = detection.pop("group_width", 1600)
+        self.pipeline = DetectionPipeline(make_detector(**detection), detect_width=detect_width,
+                                          encode_size=encode_size)
+        # group photos: detected on a much larger image, so small faces at the back are found
+        # (own detector instance; OpenCV DNN nets must not run forward passes concurrently)
+        self.group_pipeline = DetectionPipeline(make_detector(**detection), detect_width=group_width,
+                                                encode_size=encode_size)
+
+    def warm_up(self):
+        load_face_recognition()
+
+    def encode_photo(self, image):
+        rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        face_recognition = load_face_recognition()
+        try:
+            locations = face_recognition.face_locations(rgb)
+            if not locations:
+                return None, "no face detected"
+            encodings = face_recognition.face_encodings(rgb, [_largest(locations)])
+        except Exception as e:
+            return None, f"encoding error: {e}"
+        if not encodings:
+            return None, "no face detected"
+        return np.asarray(encodings[0], dtype=np.float32), None
+
+    def detect_and_encode(self, frame):
+        return self.pipeline.run(frame)
+
+    def detect_and_encode_group(self, frame):
+        return self.group_pipeline.run(frame, partial=True)
+
+
+class InsightFaceBackend(EmbeddingBackend):
+    name = "insightface"
+    dim = 512
+    default_tolerance = 1.0   # normalized embeddings: cosine similarity >= 0.5
+
+    def __init__(self, model: str = "buffalo_l", det_size: int = 640, ctx_id: int = -1):
+        try:
+            from insightface.app import FaceAnalysis
+        except ImportError as e:
+            raise ValueError("insightface backend needs `pip install insightface onnxruntime`") from e
+        self.app = FaceAnalysis(name=model, allowed_modules=["detection", "recognition"])
+        self.app.prepare(ctx_id=ctx_id, det_size=(det_size, det_size))
+
+    def _faces(self, image):
+        # InsightFace works on BGR images, as read by OpenCV
+        faces = self.app.get(image)
+        boxes = []
+        for face in faces:
+            left, top, right, bottom = (int(round(v)) for v in face.bbox)
+            boxes.append(((max(0, top), right, bottom, max(0, left)), face))
+        return boxes
+
+    def encode_photo(self, image):
+        try:
+            faces = self._faces(image)
+        except Exception as e:
+            return None, f"encoding error: {e}"
+        if not faces:
+            return None, "no face detected"
+        box = _largest([b for b, _ in faces])
+        face = next(f for b, f in faces if b == box)
+        return np.asarray(face.normed_embedding, dtype=np.float32), None
+
+    def detect_and_encode(self, frame):
+        started = time.perf_counter()
+        try:
+            faces = self._faces(frame)
+        except Exception as e:
+            return {"status": "error", "message": "Face detection error", "detail": str(e)}
+        # detection and embedding run together inside FaceAnalysis.get()
+        timings = {"detect_encode": time.perf_counter() - started}
+        if not faces:
+            return {"status": "no_face", "message": "No face detected", "timings": timings}
+        return {"status": "ok", "locations": [b for b, _ in faces],
+                "encodings": [np.asarray(f.normed_embedding, dtype=np.float32) for _, f in faces],
+                "timings": timings}
+
+
+def backend_class(name: str = "dlib"):
+    """Backend class by name; its name/dim/default_tolerance are known without loading any model."""
+    if name == "dlib":
+        return DlibBackend
+    if name == "insightface":
+        return InsightFaceBackend
+    raise ValueError(f"Unknown embedding backend {name!r} (expected one of {', '.join(BACKENDS)})")
+
+
+def make_backend(name: str = "dlib", detection: Optional[dict] = None, model: str = "buffalo_l",
+                 det_size: int = 640, ctx_id: int = -1) -> EmbeddingBackend:
+    if name == "insightface":
+        return InsightFaceBackend(model, det_size, ctx_id)
+    return backend_class(name)(detection)
+
+
+_backends: Dict[str, EmbeddingBackend] = {}
+
+
+def get_backend(spec: Optional[dict] = None) -> EmbeddingBackend:
+    """Backend for a make_backend() spec, built once per process (models are loaded once)."""
+    key = json.dumps(spec or {}, sort_keys=True)
+    backend = _backends.get(key)
+    if backend is None:
+        backend = _backends[key] = make_backend(**(spec or {}))
+    return backend
+
+
+def spec_from_env(base_dir: str) -> dict:
+    """make_backend() spec from the environment (shared by app.py, encode_faces.py, import_students.py).
+
+    EMBEDDING_BACKEND: "dlib" (default) or "insightface"
+    dlib kiosk detection: DETECTOR_MODEL ("hog" | "cnn" | "haar" | "dnn"), DETECTOR_WIDTH,
+      DETECTOR_UPSAMPLE, ENCODE_FACE_SIZE, DETECTOR_DNN_PROTOTXT / _MODEL / _CONFIDENCE;
+      GROUP_DETECT_WIDTH for group photos
+    insightface: INSIGHTFACE_MODEL (model pack), INSIGHTFACE_DET_SIZE, INSIGHTFACE_CTX_ID (-1 = CPU)
+    """
+    name = os.environ.get("EMBEDDING_BACKEND", "dlib").lower()
+    if name == "insightface":
+        return {
+            "name": name,
+            "model": os.environ.get("INSIGHTFACE_MODEL", "buffalo_l"),
+            "det_size": int(os.environ.get("INSIGHTFACE_DET_SIZE", "640")),
+            "ctx_id": int(os.environ.get("INSIGHTFACE_CTX_ID", "-1")),
+        }
+    models_dir = os.path.join(base_dir, "models")
+    return {
+        "name": name,
+        "detection": {
+            "model": os.environ.get("DETECTOR_MODEL", "hog").lower(),
+            "upsample": int(os.environ.get("DETECTOR_UPSAMPLE", "1")),
+            "detect_width": int(os.environ.get("DETECTOR_WIDTH", "320")),
+            "encode_size": int(os.environ.get("ENCODE_FACE_SIZE", "160")),
+            "group_width": int(os.environ.get("GROUP_DETECT_WIDTH", "1600")),
+            "dnn_prototxt": os.environ.get("DETECTOR_DNN_PROTOTXT", os.path.join(models_dir, "deploy.prototxt")),
+            "dnn_model": os.environ.get("DETECTOR_DNN_MODEL",
+                                        os.path.join(models_dir, "res10_300x300_ssd_iter_140000.caffemodel")),
+            "dnn_confidence": float(os.environ.get("DETECTOR_DNN_CONFIDENCE", "0.6")),
+        },
+    }
@@ -1,49 +1,53 @@
 # backend/encode_faces.py
+"""Precompute the gallery of known_faces/ for an embedding backend.
+
+    python encode_faces.py                            # EMBEDDING_BACKEND (default dlib)
+    python encode_faces.py --backend insightface --processes 4
+
+Writes encodings/<backend>/ (encodings-<gen>.npy + index.json), the same store the
+server syncs at startup, so a server started with that EMBEDDING_BACKEND
+loads it directly and only encodes photos added or changed since.
+"""
 import os
-import cv2
-import numpy as np
-import json
-from insightface.app import FaceAnalysis
+import argparse
+
+from embeddings import BACKENDS, backend_class, spec_from_env
+from enrollment import encode_entries
+from face_store import backend_store
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 KNOWN_FACES_DIR = os.path.join(BASE_DIR, "known_faces")
-STUDENTS_FILE = os.path.join(BASE_DIR, "students.json")
+ENCODINGS_DIR = os.path.join(BASE_DIR, "encodings")
 
-def frame_rgb_from_bgr(frame_bgr):
-    import cv2
-    return cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2RGB)
 
 def main():
-    fa = FaceAnalysis(name='buffalo_l')
-    fa.prepare(ctx_id=-1)
-    students = []
-    for fname in sorted(os.listdir(KNOWN_FACES_DIR)):
-        if not fname.lower().endswith((".jpg", ".jpeg", ".png")):
-            continue
-        path = os.path.join(KNOWN_FACES_DIR, fname)
-        img = cv2.imread(path)
-        if img is None:
-            print("Cannot read", path)
-            continue
-        rgb = frame_rgb_from_bgr(img)
-        faces = fa.get(rgb)
-        if not faces:
-            print("No face:", fname)
-            continue
-        emb = np.array(faces[0].embedding).tolist()
-        reg = os.path.splitext(fname)[0]
-        students.append({
-            "name": reg,
-            "reg_no": reg,
-            "dept": "",
-            "photo": fname,
-            "registered_on": ""
-        })
-        # optionally save embedding to file if you need
-        print("Processed", fname)
-    # Save students.json if you want to overwrite (be careful)
-    # with open(STUDENTS_FILE, "w", encoding="utf-8") as f:
-    #     json.dump(students, f, indent=2, ensure_ascii=False)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=BACKENDS, help="overrides EMBEDDING_BACKEND")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--max-side", type=int, default=int(os.environ.get("ENROLL_MAX_SIDE", "1024")))
+    args = parser.parse_args()
+
+    if args.backend:
+        os.environ["EMBEDDING_BACKEND"] = args.backend
+    spec = spec_from_env(BASE_DIR)
+    backend = backend_class(spec["name"])   # name/dim only: the models load in the encoding processes
+    store = backend_store(ENCODINGS_DIR, backend.name, backend.dim)
+
+    def encode_many(paths):
+        # paths only: each photo is read by the process that encodes it
+        entries = [{"photo": os.path.basename(path), "path": path} for path in paths]
+        for fail in encode_entries(entries, spec, args.processes, args.max_side):
+            print("No face:", fail["photo"], f"({fail['reason']})")
+        for e in entries:
+            if e["encoding"] is not None:
+                print("Processed", e["photo"])
+        return [e["encoding"] for e in entries]
+
+    encoded = store.sync(KNOWN_FACES_DIR, None, encode_many=encode_many)
+    faces = sum(1 for e in store.entries.values() if e["row"] >= 0)
+    print(f"{backend.name}: encoded {encoded} new/changed photo(s); "
+          f"{faces} face(s) of {len(store.entries)} photo(s) in {store.directory}")
+
 
 if __name__ == "__main__":
     main()
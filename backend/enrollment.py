@@ -0,0 +1,245 @@
+# backend/enrollment.py
+"""Student enrollment: photo encoding and bulk import from a roster.
+
+A roster is either a ZIP holding one CSV plus the photos, or a CSV on disk
+whose photo cells are paths relative to it (CLI). Columns: name, reg_no,
+dept and optionally photo; an empty/missing photo cell means
+<reg_no>.jpg/.jpeg/.png.
+
+Photos are encoded in a process pool (spawned workers, like the recognition
+pool). Rows that fail (missing fields, duplicate or already registered
+reg_no, unreadable photo, no face) are reported and skipped. The rest are
+committed together by commit_enrollment(): photos, encoding store and
+students.json are written in one step and rolled back together on error, so
+the caller can apply the whole batch to the gallery in one update.
+"""
+import io
+import os
+import csv
+import json
+import zipfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import BinaryIO, Callable, Dict, List, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+from werkzeug.utils import secure_filename
+
+from embeddings import EmbeddingBackend, get_backend
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png")
+REQUIRED_COLUMNS = ("name", "reg_no", "dept")
+
+
+# -------------------------
+# Encoding
+# -------------------------
+def encode_image_bytes(data: bytes, backend: EmbeddingBackend,
+                       max_side: int = 1024) -> Tuple[Optional[np.ndarray], Optional[str]]:
+    """(encoding of the largest face, None) or (None, reason). Photos are shrunk to `max_side` first."""
+    if not data:
+        return None, "empty photo"
+    image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        return None, "unreadable photo"
+    h, w = image.shape[:2]
+    if max_side and max(h, w) > max_side:
+        scale = max_side / float(max(h, w))
+        image = cv2.resize(image, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return backend.encode_photo(image)
+
+
+def _encode_task(args: Tuple[Optional[bytes], Optional[str], Optional[dict], int]):
+    data, path, spec, max_side = args
+    if data is None:
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError as e:
+            return None, str(e)
+    return encode_image_bytes(data, get_backend(spec), max_side)
+
+
+def encode_entries(entries: List[dict], backend: Optional[dict] = None, processes: int = 0,
+                   max_side: int = 1024) -> List[dict]:
+    """Set entry["encoding"] for every roster entry; returns failures for the ones without a face.
+
+    `backend` is an embeddings.make_backend spec; workers build it once each.
+    An entry with a "path" instead of "data" is read by the worker that encodes
+    it, so the caller never holds every photo in memory.
+    """
+    tasks = [(e.get("data"), e.get("path"), backend, max_side) for e in entries]
+    if processes > 0 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn")) as pool:
+            results = list(pool.map(_encode_task, tasks, chunksize=max(1, len(tasks) // (processes * 8))))
+    else:
+        results = [_encode_task(t) for t in tasks]
+    failures = []
+    for entry, (encoding, error) in zip(entries, results):
+        entry["encoding"] = encoding
+        if encoding is None:
+            failures.append(failure(entry, error))
+    return failures
+
+
+# -------------------------
+# Roster parsing
+# -------------------------
+def failure(entry: dict, reason: str) -> dict:
+    return {"row": entry.get("row"), "reg_no": entry.get("reg_no"), "photo": entry.get("photo"), "reason": reason}
+
+
+def parse_roster(csv_text: str, load_photo: Callable[[str], Optional[bytes]],
+                 find_photo: Callable[[str], Optional[str]]) -> Tuple[List[dict], List[dict]]:
+    """Roster rows -> (entries with photo bytes, failures)."""
+    reader = csv.DictReader(io.StringIO(csv_text.lstrip("\ufeff")))
+    columns = {c.strip().lower() for c in (reader.fieldnames or [])}
+    missing = [c for c in REQUIRED_COLUMNS if c not in columns]
+    if missing:
+        raise ValueError(f"Roster is missing column(s): {', '.join(missing)}")
+
+    entries, failures, seen = [], [], set()
+    for i, raw in enumerate(reader, start=2):       # row 1 is the header
+        row = {(k or "").strip().lower(): (v or "").strip() for k, v in raw.items()}
+        entry = {"row": i, "name": row.get("name"), "reg_no": row.get("reg_no"), "dept": row.get("dept"),
+                 "photo": row.get("photo") or None}
+        if not (entry["name"] and entry["reg_no"] and entry["dept"]):
+            failures.append(failure(entry, "name, reg_no and dept are required"))
+            continue
+        if secure_filename(entry["reg_no"]) != entry["reg_no"]:
+            failures.append(failure(entry, "reg_no must be usable as a file name"))
+            continue
+        if entry["reg_no"] in seen:
+            failures.append(failure(entry, "duplicate reg_no in roster"))
+            continue
+        seen.add(entry["reg_no"])
+        entry["photo"] = entry["photo"] or find_photo(entry["reg_no"])
+        data = load_photo(entry["photo"]) if entry["photo"] else None
+        if data is None:
+            failures.append(failure(entry, "photo not found"))
+            continue
+        entry["data"] = data
+        entries.append(entry)
+    return entries, failures
+
+
+def read_roster_zip(source: Union[str, BinaryIO]) -> Tuple[List[dict], List[dict]]:
+    with zipfile.ZipFile(source) as zf:
+        names = [n for n in zf.namelist() if not n.endswith("/") and not n.startswith("__MACOSX/")]
+        rosters = [n for n in names if n.lower().endswith(".csv")]
+        if len(rosters) != 1:
+            raise ValueError("ZIP must contain exactly one .csv roster")
+        by_base = {os.path.basename(n): n for n in names}
+        by_stem = {os.path.splitext(os.path.basename(n))[0].lower(): n
+                   for n in names if n.lower().endswith(IMAGE_EXTS)}
+
+        def load_photo(name):
+            member = name if name in names else by_base.get(os.path.basename(name))
+            return zf.read(member) if member else None
+
+        def find_photo(reg_no):
+            return by_stem.get(reg_no.lower())
+
+        return parse_roster(zf.read(rosters[0]).decode("utf-8-sig"), load_photo, find_photo)
+
+
+def read_roster_csv(csv_text: str, photos: Dict[str, bytes]) -> Tuple[List[dict], List[dict]]:
+    """Roster CSV plus photos given as {filename: bytes} (multipart upload).
+
+    Uploads are stored under secure_filename(), so CSV photo names are matched
+    the same way ("Jane Doe.jpg" finds "Jane_Doe.jpg").
+    """
+    photos = {secure_filename(name): data for name, data in photos.items()}
+    by_stem = {os.path.splitext(name)[0].lower(): name for name in photos}
+    return parse_roster(csv_text,
+                        lambda name: photos.get(secure_filename(os.path.basename(name.replace("\\", "/")))),
+                        lambda reg_no: by_stem.get(reg_no.lower()))
+
+
+def read_roster_file(path: str) -> Tuple[List[dict], List[dict]]:
+    """Roster from a .zip or a .csv on disk (photo paths relative to the CSV)."""
+    if zipfile.is_zipfile(path):
+        return read_roster_zip(path)
+    base = os.path.dirname(os.path.abspath(path))
+
+    def load_photo(name):
+        full = os.path.join(base, name)
+        if not os.path.isfile(full):
+            return None
+        with open(full, "rb") as f:
+            return f.read()
+
+    def find_photo(reg_no):
+        for ext in IMAGE_EXTS:
+            if os.path.isfile(os.path.join(base, reg_no + ext)):
+                return reg_no + ext
+        return None
+
+    with open(path, "r", encoding="utf-8-sig") as f:
+        return parse_roster(f.read(), load_photo, find_photo)
+
+
+# -------------------------
+# Commit
+# -------------------------
+def _write_atomic(path: str, data: bytes):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def commit_enrollment(entries: List[dict], faces_dir: str, students_file: str, store) -> Tuple[List[dict], List[dict]]:
+    """Write photos, encodings and students.json for encoded entries as one unit.
+
+    Entries whose reg_no is already registered are reported, not written.
+    Returns (added entries, failures). On error everything written here is
+    rolled back and the exception re-raised. Callers hold the students and
+    gallery locks.
+    """
+    try:
+        with open(students_file, "r", encoding="utf-8") as f:
+            students = json.load(f)
+    except (OSError, ValueError):
+        students = []
+    registered = {s.get("reg_no") for s in students}
+    failures = [failure(e, "already registered") for e in entries if e["reg_no"] in registered]
+    added = [e for e in entries if e["reg_no"] not in registered and e.get("encoding") is not None]
+    if not added:
+        return [], failures
+
+    written: List[str] = []
+    stored = False
+    try:
+        items = []
+        for e in added:
+            ext = os.path.splitext(e["photo"])[1].lower()
+            e["filename"] = f"{e['reg_no']}{ext if ext in IMAGE_EXTS else '.jpg'}"
+            path = os.path.join(faces_dir, e["filename"])
+            _write_atomic(path, e["data"])
+            written.append(path)
+            items.append((e["filename"], e["encoding"], path))
+
+        store.put_many(items)
+        store.save()
+        stored = True
+
+        now = datetime.utcnow().isoformat()
+        students.extend({"name": e["name"], "reg_no": e["reg_no"], "dept": e["dept"],
+                         "photo": e["filename"], "registered_on": now} for e in added)
+        _write_atomic(students_file, json.dumps(students, indent=2, ensure_ascii=False).encode("utf-8"))
+    except Exception:
+        for path in written:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        store.load()
+        if stored:
+            for e in added:
+                store.remove(e["filename"])
+            store.save()
+        raise
+    return added, failures
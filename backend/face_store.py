@@ -0,0 +1,237 @@
+# backend/face_store.py
+"""On-disk cache of face encodings so startup doesn't re-encode every photo.
+
+Layout inside the store directory:
+  encodings-<gen>.npy  float32 matrix (N x dim), one row per encoded photo
+  index.json           {"dim": dim, "matrix": "encodings-<gen>.npy",
+                        "entries": [{file, mtime, size, sha1, row}]}
+
+Every save writes a new matrix generation, then swaps in the index that
+names it, so a reader never pairs one save's rows with another's index.
+The previous generation is kept for readers that are still opening it.
+
+Each embedding backend has its own store directory (encodings/<backend>/),
+see backend_store().
+
+Entries with row == -1 record photos in which no face was found, so they are
+not retried on every boot either. A photo is re-encoded only when its
+mtime/size changed and its sha1 no longer matches.
+"""
+import os
+import json
+import time
+import hashlib
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png")
+LEGACY_MATRIX = "encodings.npy"   # matrix of an index without a "matrix" field
+
+
+def file_sha1(path: str) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class EncodingStore:
+    def __init__(self, directory: str, dim: int = 128):
+        self.directory = directory
+        self.dim = dim
+        self.index_path = os.path.join(directory, "index.json")
+        self.matrix_file: Optional[str] = None   # generation the loaded/saved index names
+        self.entries: Dict[str, dict] = {}   # file -> entry
+        self.matrix = np.zeros((0, dim), dtype=np.float32)
+        os.makedirs(directory, exist_ok=True)
+
+    # -------------------------
+    # Load / save
+    # -------------------------
+    def load(self) -> bool:
+        """Load index + memory-mapped matrix. Returns False if the cache is missing or invalid."""
+        self.entries = {}
+        self.matrix = np.zeros((0, self.dim), dtype=np.float32)
+        self.matrix_file = None
+        for _ in range(3):
+            try:
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    index = json.load(f)
+                matrix_file = index.get("matrix", LEGACY_MATRIX)
+                path = os.path.join(self.directory, matrix_file)
+                try:
+                    matrix = np.load(path, mmap_mode="r")
+                except ValueError:   # empty matrix: nothing to map
+                    matrix = np.load(path)
+                break
+            except FileNotFoundError:
+                continue   # a concurrent save swapped the index and pruned its matrix: re-read
+            except Exception:
+                return False
+        else:
+            return False
+        if index.get("dim") != self.dim or matrix.ndim != 2 or matrix.shape[1] != self.dim:
+            return False
+        entries = index.get("entries", [])
+        if any(e.get("row", -1) >= matrix.shape[0] for e in entries):
+            return False
+        self.entries = {e["file"]: e for e in entries}
+        self.matrix = matrix
+        self.matrix_file = matrix_file
+        return True
+
+    def save(self):
+        """Write a new matrix generation, then atomically swap in the index naming it."""
+        suffix = f".{os.getpid()}.tmp"
+        matrix_file = f"encodings-{time.time_ns():016x}-{os.getpid()}.npy"
+        matrix_path = os.path.join(self.directory, matrix_file)
+        with open(matrix_path + suffix, "wb") as f:
+            np.save(f, np.ascontiguousarray(self.matrix, dtype=np.float32))
+        os.replace(matrix_path + suffix, matrix_path)
+        tmp_index = self.index_path + suffix
+        with open(tmp_index, "w", encoding="utf-8") as f:
+            json.dump({"dim": self.dim, "matrix": matrix_file, "entries": list(self.entries.values())}, f)
+        os.replace(tmp_index, self.index_path)
+        previous, self.matrix_file = self.matrix_file, matrix_file
+        self._prune(matrix_file, previous)
+
+    def _prune(self, current: str, previous: Optional[str]):
+        """Remove matrices older than the previous generation (mapped ones stay readable on POSIX).
+        Newer ones are left alone: they may belong to a concurrent save not yet committed."""
+        oldest_kept = previous if previous and previous.startswith("encodings-") else current
+        for fname in os.listdir(self.directory):
+            old_generation = fname.startswith("encodings-") and fname.endswith(".npy") and fname < oldest_kept
+            if old_generation or (fname == LEGACY_MATRIX and previous != LEGACY_MATRIX):
+                try:
+                    os.remove(os.path.join(self.directory, fname))
+                except OSError:
+                    pass
+
+    # -------------------------
+    # Mutation
+    # -------------------------
+    def _stat(self, path: str) -> Tuple[float, int]:
+        st = os.stat(path)
+        return st.st_mtime, st.st_size
+
+    def put(self, file: str, encoding: Optional[np.ndarray], path: str):
+        """Insert or replace the encoding for `file` (None records 'no face')."""
+        mtime, size = self._stat(path)
+        entry = {"file": file, "mtime": mtime, "size": size, "sha1": file_sha1(path), "row": -1}
+        old = self.entries.get(file)
+        if encoding is not None:
+            vec = np.asarray(encoding, dtype=np.float32).reshape(1, self.dim)
+            if old is not None and old["row"] >= 0:
+                matrix = np.array(self.matrix, dtype=np.float32)
+                matrix[old["row"]] = vec
+                entry["row"] = old["row"]
+            else:
+                matrix = np.vstack([self.matrix, vec])
+                entry["row"] = matrix.shape[0] - 1
+            self.matrix = matrix
+        elif old is not None and old["row"] >= 0:
+            self.remove(file)
+        self.entries[file] = entry
+
+    def put_many(self, items: Sequence[Tuple[str, Optional[np.ndarray], str]]):
+        """put() for many (file, encoding, path) items with a single matrix copy."""
+        items = list(items)
+        # drop rows that become 'no face' first, so the row numbers below stay valid
+        for file, encoding, _ in items:
+            old = self.entries.get(file)
+            if encoding is None and old is not None and old["row"] >= 0:
+                self.remove(file)
+        matrix = np.array(self.matrix, dtype=np.float32)
+        new_rows = []
+        for file, encoding, path in items:
+            mtime, size = self._stat(path)
+            entry = {"file": file, "mtime": mtime, "size": size, "sha1": file_sha1(path), "row": -1}
+            if encoding is not None:
+                vec = np.asarray(encoding, dtype=np.float32).reshape(self.dim)
+                old = self.entries.get(file)
+                if old is not None and old["row"] >= 0:
+                    entry["row"] = old["row"]
+                    matrix[old["row"]] = vec
+                else:
+                    entry["row"] = matrix.shape[0] + len(new_rows)
+                    new_rows.append(vec)
+            self.entries[file] = entry
+        if new_rows:
+            matrix = np.vstack([matrix, np.stack(new_rows)])
+        self.matrix = matrix
+
+    def remove(self, file: str) -> bool:
+        entry = self.entries.pop(file, None)
+        if entry is None:
+            return False
+        row = entry["row"]
+        if row >= 0:
+            keep = np.ones(self.matrix.shape[0], dtype=bool)
+            keep[row] = False
+            self.matrix = np.array(self.matrix[keep], dtype=np.float32)
+            for e in self.entries.values():
+                if e["row"] > row:
+                    e["row"] -= 1
+        return True
+
+    def sync(self, faces_dir: str, encode_fn: Callable[[str], Optional[np.ndarray]],
+             encode_many: Optional[Callable[[List[str]], List[Optional[np.ndarray]]]] = None) -> int:
+        """Bring the store in line with `faces_dir`; only new/changed photos go through encode_fn
+        (or, all at once, through `encode_many`, e.g. a process pool).
+
+        Returns the number of photos that were (re-)encoded.
+        """
+        self.load()
+        files = [f for f in sorted(os.listdir(faces_dir)) if f.lower().endswith(IMAGE_EXTS)]
+        changed = False
+        for stale in set(self.entries) - set(files):
+            self.remove(stale)
+            changed = True
+
+        todo = []
+        for file in files:
+            path = os.path.join(faces_dir, file)
+            mtime, size = self._stat(path)
+            entry = self.entries.get(file)
+            if entry is not None and entry["mtime"] == mtime and entry["size"] == size:
+                continue
+            if entry is not None and entry["size"] == size and entry.get("sha1") == file_sha1(path):
+                entry["mtime"] = mtime   # touched, contents identical
+                changed = True
+                continue
+            todo.append((file, path))
+
+        encoded = len(todo)
+        if todo:
+            paths = [path for _, path in todo]
+            encodings = encode_many(paths) if encode_many is not None else [encode_fn(p) for p in paths]
+            self.put_many([(file, enc, path) for (file, path), enc in zip(todo, encodings)])
+            changed = True
+
+        if changed:
+            self.save()
+        return encoded
+
+    # -------------------------
+    # Read
+    # -------------------------
+    def items(self) -> List[Tuple[str, np.ndarray]]:
+        """(file, encoding) pairs for every photo with a face, in file order."""
+        return [(f, self.matrix[e["row"]]) for f, e in sorted(self.entries.items()) if e["row"] >= 0]
+
+
+def backend_store(encodings_dir: str, backend: str, dim: int, legacy_backend: str = "dlib") -> EncodingStore:
+    """The store for one embedding backend; a store left at the top level of
+    `encodings_dir` (from before stores were per backend) is moved into the
+    `legacy_backend` directory."""
+    directory = os.path.join(encodings_dir, backend)
+    if backend == legacy_backend and not os.path.exists(os.path.join(directory, "index.json")):
+        legacy_index = os.path.join(encodings_dir, "index.json")
+        legacy_matrix = os.path.join(encodings_dir, LEGACY_MATRIX)
+        if os.path.exists(legacy_index) and os.path.exists(legacy_matrix):
+            os.makedirs(directory, exist_ok=True)
+            os.replace(legacy_matrix, os.path.join(directory, LEGACY_MATRIX))
+            os.replace(legacy_index, os.path.join(directory, "index.json"))
+    return EncodingStore(directory, dim=dim)
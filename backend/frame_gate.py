@@ -0,0 +1,178 @@
+# backend/frame_gate.py
+"""Per-kiosk gating ahead of face detection.
+
+Kiosks post a frame every few seconds whether or not anything changed. Two
+cheap checks run on a small blurred grayscale copy of the frame before it is
+queued for detection:
+  - motion: if no part of the frame differs from the kiosk's previous one, the
+    previous answer is replayed (an empty doorway stays "no_face", a marked
+    student stays "exists"). The change is measured per block, not averaged
+    over the frame: one face replacing another barely moves the frame mean.
+  - tracks: every face identified recently is remembered with its box and a
+    small template of the face region; if a tracked region still looks the
+    same, the student is still standing there and is answered from the track
+    without detection.
+Both expire after a short TTL, and track answers are only given while the
+student is still marked for today, so a reset or a new day always falls
+through to full recognition.
+"""
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+# answers that are safe to replay for an unchanged frame ("success" replays as "exists")
+REPLAYABLE = ("success", "exists", "unknown", "no_face")
+
+
+class FrameProbe:
+    """Downscaled, blurred grayscale copy of a frame (and the factor back to full size)."""
+    BLOCK = 8   # probe pixels per side of a difference block (32 px of a 640 px frame)
+
+    def __init__(self, frame: np.ndarray, width: int = 160):
+        h, w = frame.shape[:2]
+        self.scale = width / float(w)
+        small = cv2.resize(frame, (width, max(1, int(round(h * self.scale)))), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+        self.gray = cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def difference(self, other: "FrameProbe") -> float:
+        """Largest mean absolute grey-level difference over BLOCK x BLOCK blocks (inf if the sizes differ)."""
+        if other is None or other.gray.shape != self.gray.shape:
+            return float("inf")
+        diff = cv2.absdiff(self.gray, other.gray).astype(np.float32)
+        h, w = diff.shape
+        blocks = (max(1, w // self.BLOCK), max(1, h // self.BLOCK))
+        return float(cv2.resize(diff, blocks, interpolation=cv2.INTER_AREA).max())
+
+    def crop(self, box: Sequence[int], size: int = 24) -> Optional[np.ndarray]:
+        """Template of a full-frame (top, right, bottom, left) box, or None if it falls outside."""
+        top, right, bottom, left = (int(round(v * self.scale)) for v in box)
+        h, w = self.gray.shape
+        top, left = max(0, top), max(0, left)
+        bottom, right = min(h, bottom), min(w, right)
+        if bottom - top < 4 or right - left < 4:
+            return None
+        return cv2.resize(self.gray[top:bottom, left:right], (size, size), interpolation=cv2.INTER_AREA)
+
+
+class _KioskState:
+    __slots__ = ("probe", "payload", "payload_at", "tracks")
+
+    def __init__(self):
+        self.probe: Optional[FrameProbe] = None
+        self.payload: Optional[dict] = None
+        self.payload_at = 0.0
+        self.tracks: List[dict] = []     # {"box", "template", "reg_no", "name", "expires"}
+
+
+class FrameGate:
+    def __init__(self, motion_threshold: float = 6.0, replay_ttl: float = 10.0,
+                 track_threshold: float = 10.0, track_ttl: float = 30.0, max_kiosks: int = 256):
+        self.motion_threshold = motion_threshold
+        self.replay_ttl = replay_ttl
+        self.track_threshold = track_threshold
+        self.track_ttl = track_ttl
+        self.max_kiosks = max_kiosks
+        self._lock = threading.Lock()
+        self._kiosks: "OrderedDict[str, _KioskState]" = OrderedDict()
+        self._counts = {"unchanged": 0, "track": 0, "miss": 0}
+
+    def _state(self, kiosk: str) -> _KioskState:
+        state = self._kiosks.get(kiosk)
+        if state is None:
+            state = self._kiosks[kiosk] = _KioskState()
+            while len(self._kiosks) > self.max_kiosks:
+                self._kiosks.popitem(last=False)
+        else:
+            self._kiosks.move_to_end(kiosk)
+        return state
+
+    def lookup(self, kiosk: str, probe: FrameProbe, is_marked) -> Optional[dict]:
+        """Answer for this frame without detection, or None.
+
+        `is_marked(reg_no)` tells whether a tracked student is still marked today.
+        """
+        now = time.monotonic()
+        with self._lock:
+            state = self._state(kiosk)
+            previous, state.probe = state.probe, probe
+
+            if (state.payload is not None and now - state.payload_at <= self.replay_ttl
+                    and probe.difference(previous) <= self.motion_threshold):
+                payload = state.payload
+                if payload["status"] in ("success", "exists") and not is_marked(payload["reg_no"]):
+                    payload = None
+                if payload is not None:
+                    self._counts["unchanged"] += 1
+                    return dict(payload)
+
+            state.tracks = [t for t in state.tracks if t["expires"] > now]
+            for track in state.tracks:
+                template = probe.crop(track["box"])
+                if template is None:
+                    continue
+                if float(cv2.absdiff(template, track["template"]).mean()) <= self.track_threshold:
+                    if not is_marked(track["reg_no"]):
+                        continue
+                    self._counts["track"] += 1
+                    return {"status": "exists", "message": "Attendance already marked today",
+                            "name": track["name"], "reg_no": track["reg_no"]}
+
+            self._counts["miss"] += 1
+            return None
+
+    def record(self, kiosk: str, probe: FrameProbe, payload: dict,
+               faces: Sequence[Tuple[Sequence[int], Optional[str]]] = ()):
+        """Remember the answer for `probe` and start tracks for identified faces [(box, reg_no)]."""
+        if payload.get("status") not in REPLAYABLE:
+            return
+        now = time.monotonic()
+        replay = dict(payload)
+        if replay["status"] == "success":
+            replay.update(status="exists", message="Attendance already marked today")
+        with self._lock:
+            state = self._state(kiosk)
+            if state.probe is not probe:
+                return   # a newer frame from this kiosk was gated meanwhile
+            state.payload, state.payload_at = replay, now
+            for box, reg_no in faces:
+                if reg_no is None or reg_no != payload.get("reg_no"):
+                    continue
+                template = probe.crop(box)
+                if template is None:
+                    continue
+                state.tracks = [t for t in state.tracks if t["reg_no"] != reg_no]
+                state.tracks.append({"box": tuple(box), "template": template, "reg_no": reg_no,
+                                     "name": payload.get("name"), "expires": now + self.track_ttl})
+
+    def forget(self, reg_no: Optional[str] = None):
+        """Drop cached answers (all, or those naming `reg_no`), e.g. after a delete or reset."""
+        with self._lock:
+            for state in self._kiosks.values():
+                if reg_no is None or (state.payload or {}).get("reg_no") == reg_no:
+                    state.payload = None
+                state.tracks = [t for t in state.tracks if reg_no is not None and t["reg_no"] != reg_no]
+
+    def forget_unmatched(self):
+        """Drop replayed "unknown"/"no_face" answers, e.g. after an enrollment makes a face known."""
+        with self._lock:
+            for state in self._kiosks.values():
+                if (state.payload or {}).get("status") in ("unknown", "no_face"):
+                    state.payload = None
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            total = sum(self._counts.values())
+            skipped = self._counts["unchanged"] + self._counts["track"]
+            return {
+                "kiosks": len(self._kiosks),
+                "frames": total,
+                "unchanged_hits": self._counts["unchanged"],
+                "track_hits": self._counts["track"],
+                "misses": self._counts["miss"],
+                "skip_rate": round(skipped / total, 4) if total else 0.0,
+            }
@@ -0,0 +1,203 @@
+# backend/gallery.py
+"""Matrix-backed face gallery used for recognition.
+
+Encodings live in one contiguous float32 (capacity x dim) matrix with their
+squared norms precomputed, so all faces of a frame are matched against the
+gallery with a single matrix product:
+    |q - g|^2 = |q|^2 + |g|^2 - 2 q.g
+Adds grow the matrix by doubling (amortized O(1)); deletes swap the last row
+into the freed slot (O(1) per row).
+
+An optional ANN index (see ann_index.IVFIndex) narrows each query to a
+candidate set once the gallery is large; candidates are re-ranked with exact
+distances so the tolerance check is unchanged.
+"""
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+
+class FaceGallery:
+    def __init__(self, dim: int = 128, capacity: int = 64, index=None, exact_on_miss: bool = False):
+        self.dim = dim
+        self.index = index                  # optional ANN index (IVFIndex)
+        self.exact_on_miss = exact_on_miss  # re-run an exact scan when the ANN best is out of tolerance
+        self._matrix = np.zeros((capacity, dim), dtype=np.float32)
+        self._sq_norms = np.zeros(capacity, dtype=np.float32)
+        self._names: List[str] = []
+        self._rows: Dict[str, Set[int]] = {}
+        self._size = 0
+
+    @classmethod
+    def view(cls, names: Sequence[str], matrix: np.ndarray) -> "FaceGallery":
+        """Read-only gallery over an existing (e.g. memory-mapped) matrix, without copying it."""
+        gallery = cls(dim=matrix.shape[1], capacity=0)
+        gallery._matrix = matrix
+        gallery._sq_norms = np.einsum("ij,ij->i", matrix, matrix).astype(np.float32)
+        gallery._names = list(names)
+        for i, name in enumerate(gallery._names):
+            gallery._rows.setdefault(name, set()).add(i)
+        gallery._size = matrix.shape[0]
+        return gallery
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def names(self) -> List[str]:
+        return list(self._names)
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """Read-only view of the active rows."""
+        view = self._matrix[:self._size]
+        view.flags.writeable = False
+        return view
+
+    def name_at(self, idx: int) -> str:
+        return self._names[idx]
+
+    # -------------------------
+    # Mutation
+    # -------------------------
+    def _grow(self, needed: int):
+        capacity = self._matrix.shape[0]
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity = max(1, capacity * 2)
+        matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+        matrix[:self._size] = self._matrix[:self._size]
+        sq_norms = np.zeros(capacity, dtype=np.float32)
+        sq_norms[:self._size] = self._sq_norms[:self._size]
+        self._matrix, self._sq_norms = matrix, sq_norms
+
+    def load(self, names: Sequence[str], encodings: np.ndarray):
+        """Replace the whole gallery in one vectorized copy."""
+        encodings = np.asarray(encodings, dtype=np.float32).reshape(-1, self.dim)
+        n = encodings.shape[0]
+        self._matrix = np.zeros((max(64, n), self.dim), dtype=np.float32)
+        self._sq_norms = np.zeros(self._matrix.shape[0], dtype=np.float32)
+        self._size = 0
+        self._names = []
+        self._rows = {}
+        self._grow(n)
+        self._matrix[:n] = encodings
+        self._sq_norms[:n] = np.einsum("ij,ij->i", encodings, encodings)
+        self._names = list(names)
+        for i, name in enumerate(self._names):
+            self._rows.setdefault(name, set()).add(i)
+        self._size = n
+        if self.index is not None:
+            self.index.build(self._matrix[:n])
+
+    def _maybe_rebuild_index(self):
+        if self.index is not None and self.index.needs_rebuild(self._size):
+            self.index.build(self._matrix[:self._size])
+
+    def add(self, name: str, encoding: np.ndarray) -> int:
+        """Append one encoding; returns its row index."""
+        self._grow(self._size + 1)
+        row = self._size
+        vec = np.asarray(encoding, dtype=np.float32).reshape(self.dim)
+        self._matrix[row] = vec
+        self._sq_norms[row] = float(vec @ vec)
+        self._names.append(name)
+        self._rows.setdefault(name, set()).add(row)
+        self._size += 1
+        if self.index is not None:
+            self.index.add(row, vec)
+            self._maybe_rebuild_index()
+        return row
+
+    def add_many(self, names: Sequence[str], encodings: np.ndarray) -> range:
+        """Append a block of encodings in one copy; returns their row indices."""
+        encodings = np.asarray(encodings, dtype=np.float32).reshape(-1, self.dim)
+        n = encodings.shape[0]
+        self._grow(self._size + n)
+        start = self._size
+        self._matrix[start:start + n] = encodings
+        self._sq_norms[start:start + n] = np.einsum("ij,ij->i", encodings, encodings)
+        for i, name in enumerate(names):
+            self._names.append(name)
+            self._rows.setdefault(name, set()).add(start + i)
+        self._size += n
+        if self.index is not None:
+            if self.index.needs_rebuild(self._size):
+                self.index.build(self._matrix[:self._size])
+            else:
+                for i in range(n):
+                    self.index.add(start + i, encodings[i])
+        return range(start, start + n)
+
+    def remove(self, name: str) -> int:
+        """Drop every row stored under `name`; returns the number removed."""
+        rows = self._rows.pop(name, set())
+        for row in sorted(rows, reverse=True):
+            last = self._size - 1
+            if self.index is not None:
+                self.index.remove(row)
+            if row != last:
+                moved = self._names[last]
+                self._matrix[row] = self._matrix[last]
+                self._sq_norms[row] = self._sq_norms[last]
+                self._names[row] = moved
+                moved_rows = self._rows[moved]
+                moved_rows.discard(last)
+                moved_rows.add(row)
+                if self.index is not None:
+                    self.index.move(last, row)
+            self._names.pop()
+            self._size -= 1
+        return len(rows)
+
+    # -------------------------
+    # Matching
+    # -------------------------
+    def match(self, encodings: Sequence[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """Best gallery row and its euclidean distance for each query encoding (batched)."""
+        queries = np.asarray(encodings, dtype=np.float32).reshape(-1, self.dim)
+        if self._size == 0 or queries.shape[0] == 0:
+            return np.full(queries.shape[0], -1, dtype=np.int64), np.full(queries.shape[0], np.inf)
+        if self.index is not None and self.index.ready and self._size >= self.index.min_size:
+            return self._match_ann(queries)
+        return self.match_exact(queries)
+
+    def match_exact(self, queries: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Brute-force scan over every row."""
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        gallery = self._matrix[:self._size]
+        q_sq = np.einsum("ij,ij->i", queries, queries)
+        d2 = q_sq[:, None] + self._sq_norms[None, :self._size] - 2.0 * (queries @ gallery.T)
+        best = np.argmin(d2, axis=1)
+        # recompute the winning distances directly; the expanded form loses precision near 0
+        dist = np.linalg.norm(queries - gallery[best], axis=1)
+        return best.astype(np.int64), dist.astype(np.float64)
+
+    def _match_ann(self, queries: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        best = np.full(queries.shape[0], -1, dtype=np.int64)
+        dist = np.full(queries.shape[0], np.inf)
+        for qi, rows in enumerate(self.index.candidates(queries)):
+            if len(rows) == 0:
+                continue
+            # exact re-rank of the candidate rows
+            d = np.linalg.norm(self._matrix[rows] - queries[qi], axis=1)
+            j = int(np.argmin(d))
+            best[qi], dist[qi] = rows[j], d[j]
+        return best, dist
+
+    def match_confirmed(self, queries: np.ndarray, tolerance: float) -> Tuple[np.ndarray, np.ndarray]:
+        """match(), plus an exact scan for queries the ANN left outside tolerance (if enabled)."""
+        best, dist = self.match(queries)
+        if self.exact_on_miss and self.index is not None and self.index.ready:
+            miss = np.flatnonzero(dist > tolerance)
+            if len(miss):
+                best[miss], dist[miss] = self.match_exact(np.asarray(queries, dtype=np.float32)[miss])
+        return best, dist
+
+    def match_names(self, encodings: Sequence[np.ndarray],
+                    tolerance: float) -> List[Tuple[Optional[str], float]]:
+        """(name or None, distance) per query; None when the best match is beyond tolerance."""
+        best, dist = self.match_confirmed(encodings, tolerance)
+        return [(self._names[i] if i >= 0 and d <= tolerance else None, float(d))
+                for i, d in zip(best.tolist(), dist.tolist())]
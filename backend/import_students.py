@@ -0,0 +1,95 @@
+# backend/import_students.py
+"""Bulk-enroll students from a roster (ZIP with CSV + photos, or a CSV next to its photos).
+
+    python import_students.py roster.zip                     # write files directly (server stopped)
+    python import_students.py roster.csv --processes 8
+    python import_students.py roster.zip --url http://localhost:5000 --username admin --password admin
+
+Without --url the photos, encoding store and students.json are updated in
+place; a running server only picks them up on restart, so use --url (the
+/bulk_import API) while it is serving. Prints the import report as JSON and
+exits non-zero if any row failed.
+"""
+import io
+import os
+import sys
+import json
+import uuid
+import zipfile
+import argparse
+import http.cookiejar
+import urllib.request
+
+from enrollment import encode_entries, read_roster_file, commit_enrollment
+from embeddings import backend_class, spec_from_env
+from face_store import backend_store
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+KNOWN_FACES_DIR = os.path.join(BASE_DIR, "known_faces")
+STUDENTS_FILE = os.path.join(BASE_DIR, "students.json")
+ENCODINGS_DIR = os.path.join(BASE_DIR, "encodings")
+
+
+def import_local(path: str, processes: int, max_side: int) -> dict:
+    entries, failures = read_roster_file(path)
+    spec = spec_from_env(BASE_DIR)
+    failures += encode_entries(entries, spec, processes, max_side)
+    os.makedirs(KNOWN_FACES_DIR, exist_ok=True)
+    backend = backend_class(spec["name"])   # name/dim only: encoding ran in encode_entries
+    store = backend_store(ENCODINGS_DIR, backend.name, backend.dim)
+    store.load()
+    added, skipped = commit_enrollment(entries, KNOWN_FACES_DIR, STUDENTS_FILE, store)
+    failed = sorted(failures + skipped, key=lambda f: f["row"] or 0)
+    return {"ok": True, "rows": len(entries) + len(failures), "imported": len(added), "failed": failed}
+
+
+def roster_zip_bytes(path: str) -> bytes:
+    """The roster as ZIP bytes (a CSV is packed together with the photos it references)."""
+    if zipfile.is_zipfile(path):
+        with open(path, "rb") as f:
+            return f.read()
+    entries, failures = read_roster_file(path)
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_STORED) as zf:
+        zf.write(path, "roster.csv")
+        for e in entries:
+            zf.writestr(os.path.basename(e["photo"]), e["data"])
+    return buf.getvalue()
+
+
+def import_remote(path: str, url: str, username: str, password: str) -> dict:
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+    login = urllib.request.Request(url + "/admin_login", method="POST",
+                                   data=json.dumps({"username": username, "password": password}).encode(),
+                                   headers={"Content-Type": "application/json"})
+    opener.open(login).read()
+
+    boundary = uuid.uuid4().hex
+    body = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"roster\"; filename=\"roster.zip\"\r\n"
+            f"Content-Type: application/zip\r\n\r\n").encode() + roster_zip_bytes(path) + f"\r\n--{boundary}--\r\n".encode()
+    req = urllib.request.Request(url + "/bulk_import", data=body, method="POST",
+                                 headers={"Content-Type": f"multipart/form-data; boundary={boundary}"})
+    with opener.open(req, timeout=3600) as resp:
+        return json.loads(resp.read())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("roster", help=".zip (CSV + photos) or .csv with photos alongside")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--max-side", type=int, default=int(os.environ.get("ENROLL_MAX_SIDE", "1024")))
+    parser.add_argument("--url", help="import through a running server's /bulk_import instead")
+    parser.add_argument("--username", default="admin")
+    parser.add_argument("--password", default="admin")
+    args = parser.parse_args()
+
+    if args.url:
+        report = import_remote(args.roster, args.url.rstrip("/"), args.username, args.password)
+    else:
+        report = import_local(args.roster, args.processes, args.max_side)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    sys.exit(1 if report.get("failed") else 0)
+
+
+if __name__ == "__main__":
+    main()
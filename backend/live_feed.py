@@ -0,0 +1,107 @@
+# backend/live_feed.py
+"""Server-Sent Events feed of attendance commits.
+
+LiveFeed subscribes to the AttendanceLog and wakes waiting SSE streams when
+records are appended (or the log is reset). Streams read new records from
+the log starting at their cursor (a byte offset, sent as the SSE event id),
+so a client that reconnects with Last-Event-ID resumes exactly where it
+stopped. Appends made by other workers are noticed by the periodic
+refresh() each stream does while waiting.
+"""
+import json
+import time
+import asyncio
+import threading
+from typing import List, Optional, Tuple
+
+
+def sse_event(event: str, data, event_id: Optional[int] = None) -> str:
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append("data: " + json.dumps(data, ensure_ascii=False, separators=(",", ":")))
+    return "\n".join(lines) + "\n\n"
+
+
+class LiveFeed:
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._seq = 0          # bumps on every change, so waiters can tell they missed nothing
+
+    def apply(self, records: List[dict]):
+        with self._cond:
+            self._seq += 1
+            self._cond.notify_all()
+
+    def reset(self):
+        self.apply([])
+
+    def seed(self, archive):
+        """No history needed: streams read records from the log themselves."""
+
+    @property
+    def seq(self) -> int:
+        return self._seq
+
+    def wait(self, seq: int, timeout: float) -> bool:
+        """Block until something changes after `seq` or timeout; True if changed."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._seq != seq, timeout=timeout)
+
+    @staticmethod
+    def collect(log, aggregates, cursor: int) -> Tuple[List[str], int]:
+        """SSE events for everything after `cursor`, and the new cursor."""
+        events = []
+        log.refresh()
+        if cursor > log.size():
+            # log was reset under us: tell the client to reload
+            cursor = 0
+            events.append(sse_event("reset", {}, event_id=0))
+        batch = []
+        for offset, record in log.iter_records(cursor):
+            cursor = offset
+            batch.append(record)
+            events.append(sse_event("attendance", record, event_id=offset))
+        if batch:
+            events.append(sse_event("aggregates", aggregates.delta(batch), event_id=cursor))
+        return events, cursor
+
+    def stream(self, log, aggregates, cursor: int, poll_interval: float = 1.0,
+               heartbeat: float = 15.0, max_duration: float = 300.0):
+        """Generator of SSE text for records after `cursor`.
+
+        Ends after `max_duration` so long-lived connections release their
+        worker thread; EventSource reconnects with Last-Event-ID.
+        """
+        yield "retry: 3000\n\n"
+        started = last_sent = time.monotonic()
+        while time.monotonic() - started < max_duration:
+            seq = self.seq
+            events, cursor = self.collect(log, aggregates, cursor)
+            if events:
+                yield "".join(events)
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent >= heartbeat:
+                yield ": keepalive\n\n"
+                last_sent = time.monotonic()
+            self.wait(seq, poll_interval)
+
+    async def astream(self, log, aggregates, cursor: int, poll_interval: float = 1.0,
+                      heartbeat: float = 15.0, max_duration: float = 300.0, tick: float = 0.1):
+        """Async variant of stream() for the ASGI mode; never blocks the event loop."""
+        yield "retry: 3000\n\n"
+        started = last_sent = time.monotonic()
+        while time.monotonic() - started < max_duration:
+            seq = self.seq
+            events, cursor = await asyncio.to_thread(self.collect, log, aggregates, cursor)
+            if events:
+                yield "".join(events)
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent >= heartbeat:
+                yield ": keepalive\n\n"
+                last_sent = time.monotonic()
+            waited = 0.0
+            while self.seq == seq and waited < poll_interval:
+                await asyncio.sleep(tick)
+                waited += tick
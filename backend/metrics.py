@@ -0,0 +1,261 @@
+# backend/metrics.py
+"""Request timing metrics, exposed in the Prometheus text format.
+
+Each instrumented request runs inside Metrics.request(endpoint), which
+returns a RequestTrace. Code on the request path calls stage(name) (or
+add_stages) to time its steps. Those helpers find the active trace through
+a context variable, so they do nothing outside a request, and they still
+work in executor threads that Starlette runs with a copy of the context.
+When the request finishes, the total and every stage go into histograms.
+Requests slower than `slow_threshold` are logged with their per-stage
+breakdown.
+
+TimedLock (and Metrics.observe_lock, for other locks) records how long
+callers wait for a lock and how long they hold it.
+
+Metrics are kept per process. Under gunicorn, each worker reports its own
+numbers.
+"""
+import time
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, Optional, Sequence, Tuple, Union
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_current: ContextVar[Optional["RequestTrace"]] = ContextVar("request_trace", default=None)
+
+
+def _labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join('{}="{}"'.format(n, str(v).replace("\\", "\\\\").replace('"', '\\"'))
+                     for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[str, ...], list] = {}   # labels -> [bucket counts..., count, sum]
+
+    def observe(self, value: float, *label_values: str):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            series = sorted((k, list(v)) for k, v in self._series.items())
+        for values, counts in series:
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                yield f"{self.name}_bucket{_labels(self.labels + ('le',), values + (repr(bound),))} {cumulative}"
+            yield f"{self.name}_bucket{_labels(self.labels + ('le',), values + ('+Inf',))} {counts[-2]}"
+            yield f"{self.name}_count{_labels(self.labels, values)} {counts[-2]}"
+            yield f"{self.name}_sum{_labels(self.labels, values)} {counts[-1]:.6f}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1.0):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            yield f"{self.name}{_labels(self.labels, label_values)} {value:g}"
+
+
+class Collected:
+    """A gauge or counter read from a callback at scrape time.
+
+    The callback returns a number, or {label value: number} for a single `label`.
+    """
+    def __init__(self, name: str, help: str, fn: Callable[[], Union[float, Dict[str, float]]],
+                 kind: str = "gauge", label: str = ""):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.kind = kind
+        self.label = label
+
+    def render(self) -> Iterator[str]:
+        value = self.fn()
+        if value is None:
+            return
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        if isinstance(value, dict):
+            for key, v in sorted(value.items()):
+                yield f"{self.name}{_labels((self.label,), (key,))} {float(v):g}"
+        else:
+            yield f"{self.name} {float(value):g}"
+
+
+class RequestTrace:
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.status: Optional[int] = None
+
+    def add(self, name: str, seconds: float):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def breakdown(self) -> str:
+        return " ".join(f"{name}={seconds * 1000.0:.1f}ms" for name, seconds in self.stages.items())
+
+
+class Metrics:
+    def __init__(self, prefix: str = "attendance", slow_threshold: float = 0.0,
+                 slow_log: Optional[Callable[[str], None]] = None):
+        self.prefix = prefix
+        self.slow_threshold = slow_threshold   # seconds; 0 = no slow-request log
+        self.slow_log = slow_log
+        self._metrics = []
+        self.requests = self.histogram("request_seconds", "Request latency", ("endpoint",))
+        self.stages = self.histogram("stage_seconds", "Time spent per request stage", ("endpoint", "stage"))
+        self.responses = self.counter("responses_total", "Responses by status code", ("endpoint", "code"))
+        self.slow = self.counter("slow_requests_total", "Requests over the slow-request threshold", ("endpoint",))
+        self.lock_wait = self.histogram("lock_wait_seconds", "Time waiting to acquire a lock", ("lock",))
+        self.lock_hold = self.histogram("lock_hold_seconds", "Time a lock was held", ("lock",))
+
+    # -------------------------
+    # Registration
+    # -------------------------
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(f"{self.prefix}_{name}", help, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        metric = Counter(f"{self.prefix}_{name}", help, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def collect(self, name: str, help: str, fn, kind: str = "gauge", label: str = ""):
+        self._metrics.append(Collected(f"{self.prefix}_{name}", help, fn, kind, label))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    # -------------------------
+    # Requests and locks
+    # -------------------------
+    @contextmanager
+    def request(self, endpoint: str):
+        trace = RequestTrace(endpoint)
+        token = _current.set(trace)
+        try:
+            yield trace
+        except Exception:
+            trace.status = 500
+            raise
+        finally:
+            _current.reset(token)
+            self.finish(trace)
+
+    def finish(self, trace: RequestTrace):
+        total = time.perf_counter() - trace.started
+        self.requests.observe(total, trace.endpoint)
+        for name, seconds in trace.stages.items():
+            self.stages.observe(seconds, trace.endpoint, name)
+        self.responses.inc(trace.endpoint, str(trace.status or 0))
+        if self.slow_threshold and total >= self.slow_threshold:
+            self.slow.inc(trace.endpoint)
+            if self.slow_log is not None:
+                self.slow_log(f"slow request {trace.endpoint} {total * 1000.0:.1f}ms "
+                              f"status={trace.status} {trace.breakdown()}")
+
+    def observe_lock(self, name: str, wait: float, hold: float):
+        self.lock_wait.observe(wait, name)
+        self.lock_hold.observe(hold, name)
+        trace = _current.get()
+        if trace is not None:
+            trace.add(f"{name}_lock_wait", wait)
+
+
+@contextmanager
+def stage(name: str):
+    """Time a block as stage `name` of the current request (no-op outside one)."""
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(name, time.perf_counter() - started)
+
+
+def add_stages(timings: Optional[Dict[str, float]]):
+    """Add stage durations measured elsewhere (e.g. in a recognition worker) to the current request."""
+    trace = _current.get()
+    if trace is not None and timings:
+        for name, seconds in timings.items():
+            trace.add(name, seconds)
+
+
+class TimedLock:
+    """threading.Lock that reports (wait, hold) seconds to `observe(name, wait, hold)`."""
+    def __init__(self, name: str, observe: Callable[[str, float, float], None]):
+        self.name = name
+        self.observe = observe
+        self._lock = threading.Lock()
+        self._wait = 0.0
+        self._acquired = 0.0
+
+    def acquire(self, blocking: bool = True, timeout: float = -1) -> bool:
+        requested = time.perf_counter()
+        if not self._lock.acquire(blocking, timeout):
+            return False
+        self._acquired = time.perf_counter()
+        self._wait = self._acquired - requested
+        return True
+
+    def release(self):
+        wait, hold = self._wait, time.perf_counter() - self._acquired
+        self._lock.release()
+        self.observe(self.name, wait, hold)
+
+    def locked(self) -> bool:
+        return self._lock.locked()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
@@ -0,0 +1,282 @@
+# backend/recognition.py
+"""Recognition stage: face detection/encoding and cross-request micro-batching.
+
+Detection/encoding goes through the embedding backend set up by
+configure_backend() (dlib with the configurable DetectionPipeline, or
+InsightFace).
+
+Requests submit decoded frames to a RecognitionBatcher. Worker threads pull
+up to `max_batch` frames (waiting at most `max_wait_ms` after the first one)
+and hand the whole batch to a process function, which detects and encodes
+every frame and matches all faces of the batch against the gallery in one
+matrix operation. The queue is bounded; a full queue is reported as busy
+instead of piling up latency.
+
+ProcessRecognitionEngine moves detection/encoding/matching into a pool of
+worker processes (no GIL contention). The gallery is published as a .npy
+snapshot plus a CURRENT pointer file; workers memory-map it, so every process
+shares the same page-cache copy, and they re-map whenever CURRENT changes
+(register/delete publishes a new snapshot). The snapshot directory has a
+single writer: only one server worker (gunicorn/uvicorn --workers 1) may run
+an engine, since another worker's gallery would miss this one's registrations
+and overwrite CURRENT with it. Scale with RECOGNITION_PROCESSES instead.
+"""
+import os
+import json
+import time
+import queue
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:   # Windows: no flock, the single-worker rule is not enforced
+    fcntl = None
+
+from gallery import FaceGallery
+from embeddings import EmbeddingBackend, get_backend
+
+_backend: Optional[EmbeddingBackend] = None
+
+
+def configure_backend(spec: Optional[dict] = None) -> EmbeddingBackend:
+    """Select the embedding backend (embeddings.make_backend spec) used by detect_and_encode()."""
+    global _backend
+    _backend = get_backend(spec)
+    return _backend
+
+
+def detect_and_encode(frame: np.ndarray) -> Dict[str, Any]:
+    """Detect and encode faces in a BGR frame.
+
+    Returns {"status": "ok", "locations": [...], "encodings": [...]} with
+    locations in full-frame (top, right, bottom, left) pixels, or a
+    {"status": "no_face" | "error", "message": ...} result. Results may carry
+    "timings" ({stage: seconds}, e.g. detect/encode) for request metrics.
+    """
+    if _backend is None:
+        configure_backend()
+    return _backend.detect_and_encode(frame)
+
+
+def detect_and_encode_group(frame: np.ndarray) -> Dict[str, Any]:
+    """detect_and_encode() for a high-resolution group photo (every face, tuned for small faces)."""
+    if _backend is None:
+        configure_backend()
+    return _backend.detect_and_encode_group(frame)
+
+
+class RecognitionBatcher:
+    def __init__(self, process_fn: Callable[[List[Any]], List[Any]], max_batch: int = 8,
+                 max_wait_ms: float = 20.0, queue_size: int = 64, workers: int = 1):
+        self.process_fn = process_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: "queue.Queue[Tuple[Any, Future, float]]" = queue.Queue(maxsize=queue_size)
+        self._stats_lock = threading.Lock()
+        self._batch_sizes: Dict[int, int] = {}
+        self._frames = 0
+        self._rejected = 0
+        self._queue_wait_total = 0.0
+        self._busy_total = 0.0
+        self._threads = [
+            threading.Thread(target=self._run, name=f"recognition-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for t in self._threads:
+            t.start()
+
+    def submit(self, item: Any) -> Future:
+        """Queue one item; raises queue.Full when the stage is saturated."""
+        future: Future = Future()
+        try:
+            self._queue.put_nowait((item, future, time.monotonic()))
+        except queue.Full:
+            with self._stats_lock:
+                self._rejected += 1
+            raise
+        return future
+
+    def _next_batch(self) -> List[Tuple[Any, Future, float]]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            started = time.monotonic()
+            try:
+                results = self.process_fn([item for item, _, _ in batch])
+                for (_, future, _), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            finished = time.monotonic()
+            with self._stats_lock:
+                self._batch_sizes[len(batch)] = self._batch_sizes.get(len(batch), 0) + 1
+                self._frames += len(batch)
+                self._queue_wait_total += sum(started - queued for _, _, queued in batch)
+                self._busy_total += finished - started
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            batches = sum(self._batch_sizes.values())
+            return {
+                "queue_depth": self._queue.qsize(),
+                "queue_capacity": self._queue.maxsize,
+                "max_batch": self.max_batch,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "batches": batches,
+                "frames": self._frames,
+                "rejected": self._rejected,
+                "batch_size_histogram": {str(k): v for k, v in sorted(self._batch_sizes.items())},
+                "mean_batch_size": round(self._frames / batches, 3) if batches else 0.0,
+                "mean_queue_wait_ms": round(self._queue_wait_total / self._frames * 1000.0, 3) if self._frames else 0.0,
+                "mean_batch_ms": round(self._busy_total / batches * 1000.0, 3) if batches else 0.0,
+            }
+
+
+# -------------------------
+# Process pool engine
+# -------------------------
+_worker: Dict[str, Any] = {}
+
+
+def _init_worker(snapshot_dir: str, tolerance: float, backend: Optional[dict] = None):
+    _worker.update(snapshot_dir=snapshot_dir, tolerance=tolerance, current=None, gallery=None)
+    configure_backend(backend).warm_up()
+
+
+def _worker_ping(_) -> int:
+    time.sleep(0.1)   # stay busy so the pool starts another process for the next ping
+    return os.getpid()
+
+
+def _worker_gallery() -> Optional[FaceGallery]:
+    """Gallery over the current snapshot, re-mapped only when CURRENT points elsewhere."""
+    for _ in range(2):
+        try:
+            with open(os.path.join(_worker["snapshot_dir"], "CURRENT"), "r", encoding="utf-8") as f:
+                current = f.read().strip()
+        except OSError:
+            break
+        if current == _worker["current"]:
+            break
+        base = os.path.join(_worker["snapshot_dir"], current)
+        try:
+            with open(base + ".json", "r", encoding="utf-8") as f:
+                names = json.load(f)
+            try:
+                matrix = np.load(base + ".npy", mmap_mode="r")
+            except ValueError:   # empty gallery: nothing to map
+                matrix = np.load(base + ".npy")
+        except OSError:
+            continue   # pruned by a newer publish after CURRENT was read: read CURRENT again
+        _worker["gallery"] = FaceGallery.view(names, matrix)
+        _worker["current"] = current
+        break
+    return _worker["gallery"]   # the previously mapped gallery if the new one could not be opened
+
+
+def _worker_recognize(frame: np.ndarray, group: bool = False) -> Dict[str, Any]:
+    result = detect_and_encode_group(frame) if group else detect_and_encode(frame)
+    if result["status"] == "ok":
+        started = time.perf_counter()
+        gallery = _worker_gallery()
+        if gallery is None or len(gallery) == 0:
+            result["matches"] = [(None, float("inf"))] * len(result["encodings"])
+        else:
+            result["matches"] = gallery.match_names(result["encodings"], _worker["tolerance"])
+        result.setdefault("timings", {})["match"] = time.perf_counter() - started
+    return result
+
+
+class ProcessRecognitionEngine:
+    def __init__(self, snapshot_dir: str, processes: int, tolerance: float, backend: Optional[dict] = None):
+        self.snapshot_dir = snapshot_dir
+        self.processes = processes
+        os.makedirs(snapshot_dir, exist_ok=True)
+        self._owner = self._claim(snapshot_dir)
+        self._lock = threading.Lock()
+        self._version = 0
+        self._current: Optional[str] = None   # snapshot CURRENT points at; kept by the next prune
+        self._pool = ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(snapshot_dir, tolerance, backend),
+        )
+
+    @staticmethod
+    def _claim(snapshot_dir: str):
+        """Hold the snapshot directory for this process (released when it exits)."""
+        fh = open(os.path.join(snapshot_dir, "OWNER.lock"), "a")
+        if fcntl is not None:
+            try:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                fh.close()
+                raise RuntimeError(
+                    f"{snapshot_dir} is in use by another server worker: recognition processes "
+                    "support a single worker (run with --workers 1 and raise RECOGNITION_PROCESSES)")
+        return fh
+
+    def publish(self, names: Sequence[str], matrix: np.ndarray):
+        """Write a new gallery snapshot and point CURRENT at it."""
+        with self._lock:
+            self._version += 1
+            snap = f"gallery-{os.getpid()}-{self._version}"
+            base = os.path.join(self.snapshot_dir, snap)
+            with open(base + ".npy.tmp", "wb") as f:
+                np.save(f, np.ascontiguousarray(matrix, dtype=np.float32))
+            os.replace(base + ".npy.tmp", base + ".npy")
+            with open(base + ".json", "w", encoding="utf-8") as f:
+                json.dump(list(names), f)
+            tmp = os.path.join(self.snapshot_dir, f"CURRENT.{os.getpid()}.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(snap)
+            os.replace(tmp, os.path.join(self.snapshot_dir, "CURRENT"))
+            self._prune(keep=(snap, self._current))
+            self._current = snap
+
+    def _prune(self, keep: Sequence[Optional[str]]):
+        """Remove older snapshots, including a previous server's (mapped ones stay readable on POSIX).
+        The one before the current is kept for workers that read CURRENT just before it moved."""
+        keep = tuple(k + "." for k in keep if k)
+        for fname in os.listdir(self.snapshot_dir):
+            if fname.startswith("gallery-") and not fname.startswith(keep):
+                try:
+                    os.remove(os.path.join(self.snapshot_dir, fname))
+                except OSError:
+                    pass
+
+    def warm_up(self) -> int:
+        """Start the worker processes (and load their models) ahead of the first frame; returns how many answered."""
+        return len(set(self._pool.map(_worker_ping, range(self.processes))))
+
+    def recognize(self, frames: List[np.ndarray]) -> List[Dict[str, Any]]:
+        """Run a batch across the pool, one frame per task."""
+        return list(self._pool.map(_worker_recognize, frames))
+
+    def recognize_group(self, frame: np.ndarray) -> Dict[str, Any]:
+        """Recognize every face of a group photo in one pool process."""
+        return self._pool.submit(_worker_recognize, frame, True).result()
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self._owner.close()
@@ -0,0 +1,142 @@
+# backend/recognition_cache.py
+"""LRU + TTL cache of recognition results keyed by (kiosk, perceptual frame hash).
+
+A kiosk that resends a visually identical frame (student holding still,
+empty doorway) gets the previous detection/match result back instead of
+another dlib run. Frames are keyed by a 64-bit DCT perceptual hash of the
+whole frame. By default only an exact hash hit counts (`max_distance` > 0
+also accepts near-duplicates). A small face barely moves the whole-frame
+hash, so two students in the same kiosk scene can hash within a few bits of
+each other. Every hit is therefore also checked on the faces: each cached
+face box is cropped from the new frame and its hash must be within
+`face_max_distance` bits of the crop the result was computed from.
+Only the match result (locations, reg_no and distance per face) is cached:
+the attendance commit still runs for every request, so marking and the
+"already marked" check stay exact.
+"""
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+CACHEABLE = ("ok", "no_face")
+
+
+def frame_hash(frame: np.ndarray) -> int:
+    """64-bit pHash: low-frequency 8x8 DCT block of a 32x32 grey copy, thresholded at its median."""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    block = cv2.dct(small)[:8, :8].ravel()
+    bits = block > np.median(block[1:])
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def face_hashes(frame: np.ndarray, locations: Sequence[Sequence[int]]) -> List[Optional[int]]:
+    """frame_hash of each (top, right, bottom, left) face box; None for a box too small or outside the frame."""
+    h, w = frame.shape[:2]
+    out = []
+    for top, right, bottom, left in locations:
+        top, left = max(0, int(top)), max(0, int(left))
+        bottom, right = min(h, int(bottom)), min(w, int(right))
+        out.append(frame_hash(frame[top:bottom, left:right]) if bottom - top >= 8 and right - left >= 8 else None)
+    return out
+
+
+class RecognitionCache:
+    def __init__(self, max_entries: int = 1024, ttl: float = 30.0, max_distance: int = 0,
+                 face_max_distance: int = 4):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.face_max_distance = face_max_distance
+        self._lock = threading.Lock()
+        # (kiosk, hash) -> (expires, result, hash of each face crop)
+        self._entries: "OrderedDict[Tuple[str, int], Tuple[float, dict, list]]" = OrderedDict()
+        self._by_kiosk: Dict[str, set] = {}
+        self._counts = {"hits": 0, "near_hits": 0, "misses": 0, "face_mismatches": 0,
+                        "evictions": 0, "expired": 0}
+
+    def _drop(self, key: Tuple[str, int]):
+        self._entries.pop(key, None)
+        hashes = self._by_kiosk.get(key[0])
+        if hashes is not None:
+            hashes.discard(key[1])
+            if not hashes:
+                del self._by_kiosk[key[0]]
+
+    def _same_faces(self, frame: np.ndarray, result: dict, hashes: list) -> bool:
+        now = face_hashes(frame, result.get("locations") or [])
+        return all(a is not None and b is not None and hamming(a, b) <= self.face_max_distance
+                   for a, b in zip(hashes, now))
+
+    def get(self, kiosk: str, h: int, frame: np.ndarray) -> Optional[dict]:
+        """Cached result for this frame (hash hit whose face crops still match), or None."""
+        now = time.monotonic()
+        with self._lock:
+            key = (kiosk, h)
+            entry = self._entries.get(key)
+            near = False
+            if entry is None and self.max_distance > 0:
+                best = None
+                for other in self._by_kiosk.get(kiosk, ()):
+                    d = hamming(h, other)
+                    if d <= self.max_distance and (best is None or d < best[0]):
+                        best = (d, other)
+                if best is not None:
+                    key, near = (kiosk, best[1]), True
+                    entry = self._entries[key]
+            if entry is not None and entry[0] < now:
+                self._drop(key)
+                self._counts["expired"] += 1
+                entry = None
+            if entry is not None and not self._same_faces(frame, entry[1], entry[2]):
+                # a different face in the same scene: recognize it
+                self._counts["face_mismatches"] += 1
+                return None
+            if entry is None:
+                self._counts["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counts["near_hits" if near else "hits"] += 1
+            return dict(entry[1])
+
+    def put(self, kiosk: str, h: int, frame: np.ndarray, result: Dict[str, Any]):
+        if result.get("status") not in CACHEABLE:
+            return
+        cached = {k: v for k, v in result.items() if k not in ("encodings", "timings")}
+        hashes = face_hashes(frame, cached.get("locations") or [])
+        if None in hashes:
+            return   # a face we could not fingerprint must not be answered from the cache
+        with self._lock:
+            key = (kiosk, h)
+            self._entries[key] = (time.monotonic() + self.ttl, cached, hashes)
+            self._entries.move_to_end(key)
+            self._by_kiosk.setdefault(kiosk, set()).add(h)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self._counts["evictions"] += 1
+
+    def clear(self):
+        """Forget everything (the gallery changed, so cached matches may be stale)."""
+        with self._lock:
+            self._entries.clear()
+            self._by_kiosk.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = self._counts["hits"] + self._counts["near_hits"]
+            lookups = hits + self._counts["misses"] + self._counts["face_mismatches"]
+            return {
+                "entries": len(self._entries),
+                "capacity": self.max_entries,
+                "ttl_s": self.ttl,
+                **self._counts,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            }
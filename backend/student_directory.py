@@ -0,0 +1,105 @@
+# backend/student_directory.py
+"""Cached view of students.json for the hot paths.
+
+The file is parsed once and indexed by reg_no and by photo key. It is reloaded
+after invalidate() (called by register/delete in this process) or when its
+mtime/size changes (another worker wrote it); the stat() check is throttled to
+once per `check_interval` seconds.
+
+A reg_no listed more than once (re-registrations are appended) is looked
+up by its first entry, as the original next(...) name lookup did; the
+department and photo-key maps keep the last entry, as the original dict
+comprehension and photo loop did.
+"""
+import os
+import json
+import time
+import threading
+from typing import Callable, Dict, List, Optional
+
+
+class StudentDirectory:
+    def __init__(self, path: str, key_fn: Callable[[str], str], check_interval: float = 1.0):
+        self.path = path
+        self.key_fn = key_fn                  # photo filename -> photo key
+        self.check_interval = check_interval
+        self.version = 0                      # bumps on every reload
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._checked_at = 0.0
+        self._students: List[dict] = []
+        self._by_reg: Dict[str, dict] = {}
+        self._by_photo: Dict[str, dict] = {}
+        self._reg_to_dept: Dict[str, str] = {}
+
+    def invalidate(self):
+        with self._lock:
+            self._stamp = None
+            self._checked_at = 0.0
+
+    def _ensure(self):
+        now = time.monotonic()
+        if self._stamp is not None and now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            try:
+                st = os.stat(self.path)
+                stamp = (st.st_mtime_ns, st.st_size)
+            except OSError:
+                stamp = (0, 0)
+            self._checked_at = now
+            if stamp == self._stamp:
+                return
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    students = json.load(f)
+            except Exception:
+                students = []
+            # built aside and swapped in whole: the unlocked fast path may be reading the old maps
+            by_reg = {}
+            for s in students:
+                if s.get("reg_no"):
+                    by_reg.setdefault(s["reg_no"], s)   # first entry wins
+            by_photo = {self.key_fn(s["photo"]): s for s in students if s.get("photo")}
+            reg_to_dept = {s.get("reg_no"): s.get("dept", "Unknown") for s in students}
+            self._students, self._by_reg, self._by_photo, self._reg_to_dept = students, by_reg, by_photo, reg_to_dept
+            self._stamp = stamp
+            self.version += 1
+
+    # -------------------------
+    # Lookups
+    # -------------------------
+    @property
+    def stamp(self):
+        """(mtime_ns, size) of the loaded students.json."""
+        self._ensure()
+        return self._stamp
+
+    def all(self) -> List[dict]:
+        self._ensure()
+        return self._students
+
+    def get(self, reg_no: str) -> Optional[dict]:
+        self._ensure()
+        return self._by_reg.get(reg_no)
+
+    def by_photo_key(self, key: str) -> Optional[dict]:
+        self._ensure()
+        return self._by_photo.get(key)
+
+    def photo_to_reg(self) -> Dict[str, str]:
+        self._ensure()
+        return {k: s["reg_no"] for k, s in self._by_photo.items() if s.get("reg_no")}
+
+    def reg_to_dept(self) -> Dict[str, str]:
+        self._ensure()
+        return self._reg_to_dept
+
+    def display_name(self, reg_no: str) -> str:
+        """Name for a gallery label: by reg_no, then by photo key, else the cleaned label itself."""
+        self._ensure()
+        student = self._by_reg.get(reg_no) or {}
+        name = student.get("name")
+        if not name:
+            name = (self._by_photo.get(str(reg_no)) or {}).get("name")
+        return name or self.key_fn(str(reg_no))
@@ -0,0 +1,76 @@
+# backend/tests/test_frame_gate.py
+"""FrameGate must not replay one student's answer for another student's face.
+
+Run from backend/:  python -m pytest -q tests
+"""
+import os
+import sys
+
+import cv2
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from frame_gate import FrameGate, FrameProbe   # noqa: E402
+
+KNOWN_FACES = os.path.join(BACKEND_DIR, "known_faces")
+FACE_BOX = (180, 370, 300, 270)                # (top, right, bottom, left) in a 640x480 frame
+
+
+def _background(seed=0):
+    rng = np.random.default_rng(seed)
+    noise = rng.integers(0, 256, (480, 640, 3), dtype=np.uint8)
+    return cv2.GaussianBlur(noise, (0, 0), 12)
+
+
+def _faces():
+    faces = []
+    for name in sorted(os.listdir(KNOWN_FACES)):
+        img = cv2.imread(os.path.join(KNOWN_FACES, name))
+        if img is not None:
+            faces.append(img)
+    assert len(faces) >= 2, "known_faces/ needs two photos"
+    return faces
+
+
+def _scene(background, face, noise_seed=None):
+    """Background with `face` in FACE_BOX, JPEG round-tripped like a kiosk frame."""
+    top, right, bottom, left = FACE_BOX
+    frame = background.copy()
+    frame[top:bottom, left:right] = cv2.resize(face, (right - left, bottom - top), interpolation=cv2.INTER_AREA)
+    if noise_seed is not None:   # sensor noise between two shots of the same scene
+        noise = np.random.default_rng(noise_seed).normal(0, 2, frame.shape)
+        frame = np.clip(frame + noise, 0, 255).astype(np.uint8)
+    ok, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 80])
+    return cv2.imdecode(buf, cv2.IMREAD_COLOR)
+
+
+def _marked_a():
+    return {"status": "success", "message": "Attendance marked", "name": "A", "reg_no": "A"}
+
+
+def _gate_with_a(background, face_a):
+    gate = FrameGate()
+    probe = FrameProbe(_scene(background, face_a))
+    assert gate.lookup("k", probe, lambda reg: True) is None
+    gate.record("k", probe, _marked_a(), [(FACE_BOX, "A")])
+    return gate
+
+
+def test_same_scene_is_replayed():
+    background = _background()
+    face_a = _faces()[0]
+    gate = _gate_with_a(background, face_a)
+    answer = gate.lookup("k", FrameProbe(_scene(background, face_a, noise_seed=1)), lambda reg: True)
+    assert answer is not None and answer["reg_no"] == "A" and answer["status"] == "exists"
+
+
+def test_face_swap_on_same_background_is_not_replayed():
+    background = _background()
+    faces = _faces()
+    for face_b in faces[1:]:
+        gate = _gate_with_a(background, faces[0])
+        probe_b = FrameProbe(_scene(background, face_b))
+        assert probe_b.difference(gate._kiosks["k"].probe) > gate.motion_threshold
+        assert gate.lookup("k", probe_b, lambda reg: True) is None
@@ -0,0 +1,98 @@
+# backend/thumbnails.py
+"""Resized JPEG thumbnails of enrollment photos, cached on disk.
+
+Requested sizes are rounded up to a fixed set of buckets (the largest bucket
+caps them), so each photo has only a few cached variants.
+
+Layout inside the cache directory:
+  <bucket>/<photo name>.jpg   thumbnail that fits in a bucket x bucket box
+
+Each thumbnail gets the source photo's mtime. A thumbnail whose mtime differs
+from its source is stale and is rebuilt on the next request. register/delete
+call invalidate() as well. The ETag comes from the bucket and the source's
+mtime and size, so it changes exactly when the thumbnail would.
+"""
+import os
+import threading
+from typing import Optional, Sequence, Tuple
+
+import cv2
+from werkzeug.security import safe_join
+
+
+class ThumbnailCache:
+    def __init__(self, source_dir: str, cache_dir: str, sizes: Sequence[int] = (64, 128, 256),
+                 quality: int = 80):
+        self.source_dir = source_dir
+        self.cache_dir = cache_dir
+        self.sizes = tuple(sorted(sizes))
+        self.quality = quality
+        self._lock = threading.Lock()
+        self._counts = {"hits": 0, "generated": 0}
+
+    def bucket(self, size: int) -> int:
+        """Smallest bucket that covers `size` px (the largest bucket for anything bigger)."""
+        for b in self.sizes:
+            if size <= b:
+                return b
+        return self.sizes[-1]
+
+    def _thumb_path(self, filename: str, bucket: int) -> str:
+        return os.path.join(self.cache_dir, str(bucket), filename.replace("/", "__") + ".jpg")
+
+    def get(self, filename: str, size: int) -> Optional[Tuple[str, str]]:
+        """(thumbnail path, etag), building the thumbnail if needed; None if the photo is missing or unreadable."""
+        source = safe_join(self.source_dir, filename)
+        try:
+            st = os.stat(source) if source else None
+        except OSError:
+            st = None
+        if st is None:
+            return None
+        bucket = self.bucket(size)
+        path = self._thumb_path(filename, bucket)
+        etag = f"{bucket}-{st.st_mtime_ns:x}-{st.st_size:x}"
+        try:
+            if os.stat(path).st_mtime_ns == st.st_mtime_ns:
+                with self._lock:
+                    self._counts["hits"] += 1
+                return path, etag
+        except OSError:
+            pass
+        if not self._build(source, path, bucket, st.st_mtime_ns):
+            return None
+        with self._lock:
+            self._counts["generated"] += 1
+        return path, etag
+
+    def _build(self, source: str, path: str, bucket: int, mtime_ns: int) -> bool:
+        image = cv2.imread(source, cv2.IMREAD_COLOR)
+        if image is None:
+            return False
+        h, w = image.shape[:2]
+        scale = bucket / float(max(h, w))
+        if scale < 1.0:
+            image = cv2.resize(image, (max(1, round(w * scale)), max(1, round(h * scale))),
+                               interpolation=cv2.INTER_AREA)
+        ok, data = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ok:
+            return False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data.tobytes())
+        os.utime(tmp, ns=(mtime_ns, mtime_ns))
+        os.replace(tmp, path)
+        return True
+
+    def invalidate(self, filename: str):
+        """Drop every cached size of one photo (it was replaced or deleted)."""
+        for bucket in self.sizes:
+            try:
+                os.remove(self._thumb_path(filename, bucket))
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._counts, sizes=list(self.sizes))